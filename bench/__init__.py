@@ -0,0 +1,15 @@
+"""Event dispatch benchmarks
+
+Runs :class:`orcsome.wm.WM` against a headless Xvfb server and feeds it
+synthetic loads through ``WM._xevent_cb``::
+
+   python -m bench --output results.json
+   python -m bench --backend xlib --backend xcb --scale 2
+   python -m bench compare old.json new.json
+   python -m bench property
+   python -m bench replay session.log --profile
+
+Replay needs no X server, see :mod:`orcsome.record`.
+
+Requires ``Xvfb`` in PATH and built orcsome extensions.
+"""
@@ -0,0 +1,170 @@
+import sys
+import json
+import pstats
+import cProfile
+import argparse
+import platform
+
+import orcsome
+from orcsome import ev, xlib as X
+from orcsome.wm import WM
+from orcsome.actions import Actions
+from orcsome.record import replay as replay_log
+
+from .xvfb import Xvfb
+from .clients import ClientGenerator
+from .metrics import RoundTripCounter, LoadMetrics
+from .loads import LOADS, Driver, configure
+from . import property as property_bench
+
+COMPARED = (('events_per_sec', True), ('latency_us.p50', False),
+            ('latency_us.p99', False), ('round_trips_per_event', False))
+
+
+def run_backend(backend, loads, scale, rules):
+    X.use_backend(backend)
+    results = {}
+    with Xvfb():
+        gen = ClientGenerator()
+        loop = ev.Loop()
+        wm = WM(loop)
+        wm.mix(Actions)
+        orcsome._wm = wm
+        configure(wm, rules)
+        wm.init()
+
+        counter = RoundTripCounter()
+        counter.install()
+        try:
+            for load in loads:
+                metrics = LoadMetrics(wm, counter)
+                load(Driver(wm, gen, metrics), scale)
+                results[load.__name__] = metrics.finish()
+        finally:
+            counter.uninstall()
+            wm.stop(True)
+            gen.close()
+            X.XCloseDisplay(wm.dpy)
+
+    return results
+
+
+def run(args):
+    loads = [r for r in LOADS if not args.load or r.__name__ in args.load]
+    result = {
+        'version': orcsome.VERSION,
+        'python': platform.python_version(),
+        'scale': args.scale,
+        'rules': args.rules,
+        'backends': {},
+    }
+
+    for backend in args.backend or ['xlib']:
+        result['backends'][backend] = data = run_backend(
+            backend, loads, args.scale, args.rules)
+        for name, r in sorted(data.items()):
+            print('{:6} {:16} {:>10.1f} ev/s  p50 {:>8.1f}us  p99 {:>8.1f}us  '
+                  '{:.2f} rt/ev  rss {} KB'.format(
+                      backend, name, r['events_per_sec'], r['latency_us']['p50'],
+                      r['latency_us']['p99'], r['round_trips_per_event'],
+                      r['rss_kb'][-1][1]))
+            if 'retained' in r:
+                print('{:6} {:16} retained {} handlers, {:+d} objects'.format(
+                    backend, name, r['retained'], r['objects_growth']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+
+
+def get_value(data, path):
+    for p in path.split('.'):
+        data = data[p]
+    return data
+
+
+def compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print('{} -> {}'.format(base['version'], new['version']))
+    for backend, loads in sorted(new['backends'].items()):
+        for name, r in sorted(loads.items()):
+            try:
+                b = base['backends'][backend][name]
+            except KeyError:
+                continue
+
+            for path, higher_better in COMPARED:
+                old, cur = get_value(b, path), get_value(r, path)
+                ratio = float(cur) / old if old else 0
+                mark = ''
+                if ratio and abs(ratio - 1) > args.threshold:
+                    better = (ratio > 1) == higher_better
+                    mark = 'better' if better else 'WORSE'
+                print('{:6} {:16} {:22} {:>12} {:>12} {:>7.2f} {}'.format(
+                    backend, name, path, old, cur, ratio, mark))
+
+
+def replay(args):
+    profile = cProfile.Profile() if args.profile else None
+    r = replay_log(args.log, args.config, args.coalesce, profile)
+    print('{} events ({} dispatched) recorded in {:.1f}s replayed in {:.3f}s, '
+          '{:.1f} ev/s'.format(r['events'], r['dispatched'], r['recorded_sec'],
+                               r['replay_sec'], r['events'] / (r['replay_sec'] or 1)))
+
+    if profile:
+        if args.profile == '-':
+            pstats.Stats(profile).sort_stats('cumulative').print_stats(30)
+        else:
+            profile.dump_stats(args.profile)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m bench')
+    sub = parser.add_subparsers(dest='command')
+
+    p = sub.add_parser('run', help='run benchmarks (default)')
+    p.add_argument('--backend', action='append', choices=X.BACKENDS,
+        help='X backend to measure, can be repeated (xlib by default)')
+    p.add_argument('--load', action='append', choices=[r.__name__ for r in LOADS],
+        help='load to run, can be repeated (all by default)')
+    p.add_argument('--scale', type=int, default=1, help='load size multiplier')
+    p.add_argument('--rules', type=int, default=200, help='number of create rules')
+    p.add_argument('-o', '--output', metavar='FILE', help='save results as JSON')
+
+    p = sub.add_parser('compare', help='compare two result files')
+    p.add_argument('base')
+    p.add_argument('new')
+    p.add_argument('--threshold', type=float, default=0.1,
+        help='relative change to report, default is 0.1')
+
+    p = sub.add_parser('property', help='get_window_property microbenchmark')
+    p.add_argument('--calls', type=int, default=2000, help='calls per case')
+
+    p = sub.add_parser('replay', help='replay event log written by orcsome --record')
+    p.add_argument('log')
+    p.add_argument('-c', '--config', metavar='FILE', help='orcsome config to load')
+    p.add_argument('--coalesce', action='store_true', help='coalesce events')
+    p.add_argument('--profile', metavar='FILE', nargs='?', const='-',
+        help='run under cProfile, print top functions or save stats to FILE')
+
+    argv = sys.argv[1:]
+    if not argv or argv[0] not in ('run', 'compare', 'property', 'replay',
+                                   '-h', '--help'):
+        argv = ['run'] + argv
+
+    args = parser.parse_args(argv)
+    if args.command == 'compare':
+        compare(args)
+    elif args.command == 'property':
+        property_bench.run(args.calls)
+    elif args.command == 'replay':
+        replay(args)
+    else:
+        run(args)
+
+
+main()
@@ -0,0 +1,85 @@
+from orcsome import xlib as X
+from orcsome.utils import bstr
+
+
+class ClientGenerator(object):
+    """Synthetic clients created on a separate X connection
+
+    Also plays a minimal window manager and maintains root properties
+    orcsome reads: client lists, active window, current desktop and
+    workarea.
+    """
+    def __init__(self, desktops=4, size=(1920, 1080)):
+        self.dpy = X.XOpenDisplay(X.NULL)
+        if self.dpy == X.NULL:
+            raise Exception("Can't open display")
+
+        self.root = X.DefaultRootWindow(self.dpy)
+        self.atom = X.AtomCache(self.dpy)
+        self.atom.prefetch(X.KNOWN_ATOMS)
+        self.clients = []
+
+        self.set_root('_NET_NUMBER_OF_DESKTOPS', 'CARDINAL', [desktops])
+        self.set_root('_NET_CURRENT_DESKTOP', 'CARDINAL', [0])
+        self.set_root('_NET_WORKAREA', 'CARDINAL', [0, 0, size[0], size[1]] * desktops)
+        self.update_client_list()
+        self.sync()
+
+    def set_root(self, name, type, values):
+        X.set_window_property(self.dpy, self.root, self.atom[name],
+                              self.atom[type], 32, values)
+
+    def update_client_list(self):
+        self.set_root('_NET_CLIENT_LIST', 'WINDOW', self.clients)
+        self.set_root('_NET_CLIENT_LIST_STACKING', 'WINDOW', self.clients)
+
+    def create(self, name, cls, title, desktop=0, update=True):
+        window = X.XCreateSimpleWindow(self.dpy, self.root, 0, 0, 200, 100, 0, 0, 0)
+        X.set_window_property(self.dpy, window, self.atom['WM_CLASS'],
+            self.atom['STRING'], 8, bstr(name) + b'\x00' + bstr(cls) + b'\x00')
+        X.set_window_property(self.dpy, window, self.atom['_NET_WM_DESKTOP'],
+            self.atom['CARDINAL'], 32, [desktop])
+        self.set_title(window, title)
+        X.XMapWindow(self.dpy, window)
+
+        self.clients.append(window)
+        if update:
+            self.update_client_list()
+
+        return window
+
+    def destroy(self, window, update=True):
+        X.XDestroyWindow(self.dpy, window)
+        self.clients.remove(window)
+        if update:
+            self.update_client_list()
+
+    def set_title(self, window, title):
+        X.set_window_property(self.dpy, window, self.atom['_NET_WM_NAME'],
+            self.atom['UTF8_STRING'], 8, bstr(title, 'utf-8'))
+
+    def focus(self, window):
+        X.XSetInputFocus(self.dpy, window, X.RevertToPointerRoot, X.CurrentTime)
+        self.set_root('_NET_ACTIVE_WINDOW', 'WINDOW', [window])
+
+    def send_key(self, window, keycode, state):
+        event = X.ffi.new('XKeyEvent *', {
+            'type': X.KeyPress,
+            'window': window,
+            'root': self.root,
+            'time': X.CurrentTime,
+            'state': state,
+            'keycode': keycode,
+            'same_screen': True,
+        })
+        X.XSendEvent(self.dpy, window, False, X.KeyPressMask,
+                     X.ffi.cast('XEvent *', event))
+
+    def sync(self):
+        X.XSync(self.dpy, False)
+
+    def close(self):
+        for window in self.clients:
+            X.XDestroyWindow(self.dpy, window)
+        self.clients[:] = []
+        X.XCloseDisplay(self.dpy)
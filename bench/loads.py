@@ -0,0 +1,199 @@
+import gc
+from select import select
+
+from orcsome import xlib as X
+
+APPS = [('navigator', 'Firefox'), ('urxvt', 'URxvt'), ('gvim', 'Gvim'),
+        ('chromium', 'Chromium'), ('evince', 'Evince'), ('mpv', 'mpv'),
+        ('pidgin', 'Pidgin'), ('thunar', 'Thunar')]
+
+
+def configure(wm, rules=200):
+    """Register an rc.py-like set of handlers
+
+    Creates ``rules`` on_create/on_manage rules mixing literal, regex
+    and title matchers plus typical property, key and focus users.
+    """
+    calls = []
+    record = lambda: calls.append(1)
+
+    for i in range(rules):
+        name, cls = APPS[i % len(APPS)]
+        kind = i % 4
+        if kind == 0:
+            wm.on_create(cls=cls)(record)
+        elif kind == 1:
+            wm.on_manage(cls=cls[:3] + '.*', desktop=i % 4)(record)
+        elif kind == 2:
+            wm.on_create(name=name, role='dialog{}'.format(i))(record)
+        else:
+            wm.on_create(title='.*page {}$'.format(i))(record)
+
+    @wm.on_property_change('_NET_WM_NAME')
+    def title_changed():
+        wm.event_window.title
+
+    @wm.on_property_change('_NET_WM_STATE', '_NET_WM_DESKTOP')
+    def state_changed():
+        wm.event_window.state
+
+    @wm.on_create
+    def bind_keys():
+        wm.find_clients(wm.get_clients(), cls='URxvt')
+
+    return calls
+
+
+class Driver(object):
+    """Feeds generator requests to WM and drains resulting events"""
+    def __init__(self, wm, gen, metrics, chunk=50, idle=0.05):
+        self.wm = wm
+        self.gen = gen
+        self.metrics = metrics
+        self.chunk = chunk
+        self.idle = idle
+
+    def drain(self):
+        self.gen.sync()
+        while select([self.wm.fd], [], [], self.idle)[0] or X.XPending(self.wm.dpy):
+            self.metrics.process()
+        self.metrics.sample_rss()
+
+    def run(self, steps):
+        for i, _ in enumerate(steps, 1):
+            if i % self.chunk == 0:
+                self.drain()
+        self.drain()
+
+
+def create_destroy(driver, scale):
+    """Window create/destroy storm"""
+    gen = driver.gen
+    def steps():
+        for r in range(scale):
+            windows = []
+            for i in range(100):
+                name, cls = APPS[i % len(APPS)]
+                windows.append(gen.create(name, cls, 'page {}'.format(i), i % 4))
+                yield
+            for w in windows:
+                gen.destroy(w)
+                yield
+    driver.run(steps())
+
+
+def title_flood(driver, scale):
+    """Frequent _NET_WM_NAME changes on a few windows"""
+    gen = driver.gen
+    windows = [gen.create('navigator', 'Firefox', 'start', 0) for _ in range(10)]
+    driver.drain()
+
+    def steps():
+        for i in range(500 * scale):
+            gen.set_title(windows[i % len(windows)], 'page {} - Firefox'.format(i))
+            yield
+    driver.run(steps())
+
+    for w in windows:
+        gen.destroy(w)
+    driver.drain()
+
+
+def keypress_burst(driver, scale):
+    """Bound hotkey pressed many times in a row"""
+    gen, wm = driver.gen, driver.wm
+    window = gen.create('urxvt', 'URxvt', 'shell', 0)
+    driver.drain()
+
+    presses = []
+    wm.on_key(wm.window(window), 'Ctrl+x')(lambda: presses.append(1))
+    (code, mask), = wm.parse_keydef('Ctrl+x')
+    X.XSelectInput(wm.dpy, window, X.StructureNotifyMask | X.PropertyChangeMask
+                   | X.FocusChangeMask | X.KeyPressMask)
+    X.XSync(wm.dpy, False)
+
+    def steps():
+        for _ in range(1000 * scale):
+            gen.send_key(window, code, mask)
+            yield
+    driver.run(steps())
+
+    gen.destroy(window)
+    driver.drain()
+
+
+def focus_churn(driver, scale):
+    """Input focus cycling between many windows"""
+    gen = driver.gen
+    windows = [gen.create(*APPS[i % len(APPS)], title='w{}'.format(i),
+                          desktop=0, update=False) for i in range(20)]
+    gen.update_client_list()
+    driver.drain()
+
+    def steps():
+        for i in range(500 * scale):
+            gen.focus(windows[i % len(windows)])
+            yield
+    driver.run(steps())
+
+    for w in windows:
+        gen.destroy(w, False)
+    gen.update_client_list()
+    driver.drain()
+
+
+def retained(wm, windows):
+    """Count handler entries still referencing ``windows``"""
+    windows = set(windows)
+    count = sum(1 for w in wm.windows if w in windows)
+    for registry in (wm.key_handlers, wm.key_bindings, wm.destroy_handlers,
+                     wm.window_cleanups):
+        count += sum(1 for w in registry if w in windows)
+    for whandlers in wm.property_handlers.values():
+        count += sum(1 for w in whandlers if w in windows)
+    count += sum(1 for key in wm.grabs.grabs if key[0] in windows)
+    return count
+
+
+def soak(driver, scale):
+    """Long running window churn with per-window handlers
+
+    Every window gets key, property, destroy handlers and a timer. RSS
+    and Python object count must stay flat, ``retained`` must be zero.
+    """
+    gen, wm = driver.gen, driver.wm
+    destroyed = []
+    baseline = []
+
+    def bind(window):
+        wm.on_key(window, 'Ctrl+q')(lambda: None)
+        wm.on_property_change(window, '_NET_WM_NAME')(lambda: None)
+        wm.on_destroy(window)(lambda: None)
+        wm.on_timer(3600, window=window)(lambda: None)
+
+    def steps():
+        for r in range(20 * scale):
+            windows = []
+            for i in range(50):
+                name, cls = APPS[i % len(APPS)]
+                windows.append(gen.create(name, cls, 'soak {}'.format(i), i % 4))
+                yield
+            driver.drain()
+            for w in windows:
+                bind(wm.window(w))
+            for w in windows:
+                gen.destroy(w)
+                destroyed.append(w)
+                yield
+            if r == 1:
+                driver.drain()
+                gc.collect()
+                baseline.append(len(gc.get_objects()))
+
+    driver.run(steps())
+    gc.collect()
+    driver.metrics.extra['objects_growth'] = len(gc.get_objects()) - baseline[0]
+    driver.metrics.extra['retained'] = retained(wm, destroyed)
+
+
+LOADS = [create_destroy, title_flood, keypress_burst, focus_churn, soak]
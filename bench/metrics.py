@@ -0,0 +1,136 @@
+import os
+from time import perf_counter
+
+from orcsome import xlib as X
+
+#: Xlib calls which wait for a server reply
+ROUND_TRIP_CALLS = ('XGetWindowProperty', 'XGetGeometry', 'XInternAtom',
+                    'XInternAtoms', 'XGetAtomNames', 'XSync', 'XGrabKeyboard',
+                    'XGrabPointer', 'XGetKeyboardMapping', 'XGetModifierMapping',
+                    'XGetWindowAttributes', 'XkbGetState', 'XScreenSaverQueryInfo')
+
+PAGE_KB = os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+def rss_kb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * PAGE_KB
+
+
+def percentile(values, p):
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+class RoundTripCounter(object):
+    """Counts blocking X calls made while :attr:`active`
+
+    Patches ``orcsome.xlib`` module attributes, so it sees every call
+    made through ``X.<name>`` including ones inside xlib helpers.
+    xcb cookie replies are counted as well.
+    """
+    def __init__(self):
+        self.count = 0
+        self.active = False
+        self._patched = []
+
+    def install(self):
+        for name in ROUND_TRIP_CALLS:
+            if hasattr(X, name):
+                self._patch(X, name)
+
+        try:
+            from orcsome import xcb
+        except ImportError:
+            pass
+        else:
+            self._patch(xcb.Cookie, 'reply', lambda c: c.cookie is not None)
+
+    def _patch(self, obj, name, check=None):
+        orig = getattr(obj, name)
+
+        def counted(*args):
+            if self.active and (check is None or check(*args)):
+                self.count += 1
+            return orig(*args)
+
+        setattr(obj, name, counted)
+        self._patched.append((obj, name, orig))
+
+    def uninstall(self):
+        for obj, name, orig in reversed(self._patched):
+            setattr(obj, name, orig)
+        self._patched[:] = []
+
+
+class LoadMetrics(object):
+    """Measures WM event processing for a single load"""
+    def __init__(self, wm, counter):
+        self.wm = wm
+        self.counter = counter
+        self.latencies = []
+        self.busy = 0.0
+        self.requests = 0
+        self.rss = []
+        self.round_trips = 0
+        #: Load specific values merged into result
+        self.extra = {}
+        self._start = perf_counter()
+        self._handlers = dict(wm.handlers)
+
+        for etype, h in self._handlers.items():
+            wm.handlers[etype] = self._timed(h)
+
+    def _timed(self, h):
+        latencies = self.latencies
+        def inner(event):
+            start = perf_counter()
+            try:
+                return h(event)
+            finally:
+                latencies.append(perf_counter() - start)
+        return inner
+
+    def process(self):
+        """Run a single WM event queue drain"""
+        wm = self.wm
+        rt = self.counter.count
+        req = X.XNextRequest(wm.dpy)
+        self.counter.active = True
+        start = perf_counter()
+        try:
+            wm._xevent_cb(None, None, 0)
+        finally:
+            self.busy += perf_counter() - start
+            self.counter.active = False
+        self.round_trips += self.counter.count - rt
+        self.requests += X.XNextRequest(wm.dpy) - req
+
+    def sample_rss(self):
+        self.rss.append((round(perf_counter() - self._start, 3), rss_kb()))
+
+    def finish(self):
+        self.wm.handlers.update(self._handlers)
+        self.sample_rss()
+
+        events = len(self.latencies)
+        lat = sorted(self.latencies)
+        per_event = lambda v: round(float(v) / events, 3) if events else 0
+        result = dict(self.extra)
+        result.update({
+            'events': events,
+            'busy_sec': round(self.busy, 6),
+            'events_per_sec': round(events / self.busy, 1) if self.busy else 0,
+            'latency_us': {
+                'p50': round(percentile(lat, 50) * 1e6, 1),
+                'p90': round(percentile(lat, 90) * 1e6, 1),
+                'p99': round(percentile(lat, 99) * 1e6, 1),
+                'max': round(lat[-1] * 1e6, 1) if lat else 0,
+            },
+            'round_trips': self.round_trips,
+            'round_trips_per_event': per_event(self.round_trips),
+            'requests_per_event': per_event(self.requests),
+            'rss_kb': self.rss,
+        })
+        return result
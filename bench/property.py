@@ -0,0 +1,92 @@
+"""get_window_property microbenchmark
+
+Compares current implementation with the legacy one which allocated
+out-parameters per call, fetched 50 items and used a second request for
+longer properties.
+"""
+from array import array
+from time import perf_counter
+
+from orcsome import xlib as X
+from orcsome.utils import btype
+
+from .xvfb import Xvfb
+from .clients import ClientGenerator
+
+#: (name, type, format, value) of measured properties
+CASES = [
+    ('_NET_WM_DESKTOP', 'CARDINAL', 32, [1]),
+    ('_NET_WM_NAME', 'UTF8_STRING', 8, b'page - Firefox'),
+    ('_NET_WM_STATE', 'ATOM', 32, list(range(1, 11))),
+    ('_NET_CLIENT_LIST', 'WINDOW', 32, list(range(1, 301))),
+]
+
+
+def legacy_get_window_property(display, window, property, type=0, split=False, size=50):
+    type_return = X.ffi.new('Atom *')
+    fmt_return = X.ffi.new('int *')
+    nitems_return = X.ffi.new('unsigned long *')
+    bytes_after = X.ffi.new('unsigned long *')
+    data = X.ffi.new('unsigned char **')
+    X.XGetWindowProperty(display, window, property, 0, size, False, type,
+        type_return, fmt_return, nitems_return, bytes_after, data)
+
+    fmt = fmt_return[0]
+    bafter = bytes_after[0]
+    result = b''
+    if fmt == 32:
+        result += btype(X.ffi.buffer(data[0], nitems_return[0]*X.ITEM_SIZE))
+    elif fmt == 8:
+        result += btype(X.ffi.buffer(data[0], nitems_return[0]))
+    elif not fmt:
+        return None
+
+    if bafter:
+        X.XFree(data[0])
+        X.XGetWindowProperty(display, window, property, size, bafter // 4 + 1,
+            False, type, type_return, fmt_return, nitems_return, bytes_after, data)
+        if fmt_return[0] == 32:
+            result += btype(X.ffi.buffer(data[0], nitems_return[0]*X.ITEM_SIZE))
+        else:
+            result += btype(X.ffi.buffer(data[0], nitems_return[0]))
+
+    if fmt_return[0] == 32:
+        result = array('L', result)
+    else:
+        result = result.rstrip(b'\x00')
+        if split:
+            result = result.split(b'\x00')
+
+    X.XFree(data[0])
+    return result
+
+
+def measure(func, dpy, window, atom, calls):
+    func(dpy, window, atom)
+    start = perf_counter()
+    for _ in range(calls):
+        func(dpy, window, atom)
+    return (perf_counter() - start) / calls * 1e6
+
+
+def run(calls=2000):
+    """Print per call time in microseconds for each case"""
+    with Xvfb():
+        gen = ClientGenerator()
+        dpy = X.XOpenDisplay(X.NULL)
+        window = gen.create('bench', 'Bench', 'bench')
+        for name, type, fmt, value in CASES:
+            X.set_window_property(gen.dpy, window, gen.atom[name],
+                                  gen.atom[type], fmt, value)
+        gen.sync()
+
+        atom = X.AtomCache(dpy)
+        try:
+            for name, type, fmt, value in CASES:
+                old = measure(legacy_get_window_property, dpy, window, atom[name], calls)
+                new = measure(X.get_window_property, dpy, window, atom[name], calls)
+                print('{:20} {:>4} items  legacy {:>8.1f}us  current {:>8.1f}us  '
+                      'x{:.2f}'.format(name, len(value), old, new, old / new))
+        finally:
+            X.XCloseDisplay(dpy)
+            gen.close()
@@ -0,0 +1,42 @@
+import os
+import subprocess
+
+
+class Xvfb(object):
+    """Headless X server for the duration of ``with`` block
+
+    Picks a free display with ``-displayfd`` and exports it in ``DISPLAY``.
+    """
+    def __init__(self, screen='1920x1080x24'):
+        self.screen = screen
+        self.proc = None
+        self.display = None
+
+    def __enter__(self):
+        rfd, wfd = os.pipe()
+        self.proc = subprocess.Popen(
+            ['Xvfb', '-displayfd', str(wfd), '-screen', '0', self.screen,
+             '-nolisten', 'tcp'], pass_fds=(wfd, ),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        os.close(wfd)
+
+        with os.fdopen(rfd) as f:
+            num = f.readline().strip()
+
+        if not num:
+            self.proc.kill()
+            raise Exception("Can't start Xvfb")
+
+        self.display = ':' + num
+        self._old_display = os.environ.get('DISPLAY')
+        os.environ['DISPLAY'] = self.display
+        return self
+
+    def __exit__(self, *exc):
+        if self._old_display is None:
+            os.environ.pop('DISPLAY', None)
+        else:
+            os.environ['DISPLAY'] = self._old_display
+
+        self.proc.terminate()
+        self.proc.wait()
@@ -1,11 +1,12 @@
 import time
 
-from . import utils
+from . import process, xlib as X
 from .wm import RestartException
 
 class Actions(object):
     def __init__(self):
         self.spawn_queue = []
+        self.focus_cycle_state = None
 
     def create_spawn_hook(self):
         if not self.spawn_queue:
@@ -18,18 +19,24 @@ class Actions(object):
                 self.spawn_queue.remove(r)
             elif self.event_window.matches(**matchers):
                 self.spawn_queue.remove(r)
-                handler(cd, self.window(cw))
+                handler(cd, cw and self.window(cw))
 
-    def spawn(self, cmd, switch_to_desktop=None):
+    def spawn(self, cmd, switch_to_desktop=None, on_exit=None, capture=False):
         """Run specified cmd
 
+        Returns :class:`~orcsome.process.Process` handle or None if command
+        can't be started. Event loop is not blocked while command runs.
+
         :param cmd: shell command. Can include pipes, redirection and so on.
         :param switch_to_desktop: integer. Desktop number to activate after
            command start. Starts from zero.
+        :param on_exit: ``on_exit(process)`` callback called on command exit.
+        :param capture: collect command stdout into ``process.output``.
         """
-        utils.spawn(cmd)
+        proc = process.spawn(self.loop, cmd, on_exit, capture)
         if switch_to_desktop is not None:
             self.activate_desktop(switch_to_desktop)
+        return proc
 
     def spawn_or_raise(self, cmd, switch_to_desktop=None, bring_to_current=False,
             on_create=None, **matchers):
@@ -47,7 +54,8 @@ class Actions(object):
 
         Where ``wm`` is :class:`orcsome instance <orcsome.core.WM>`,
         ``desktop`` and ``window`` are active desktop and focused
-        window before spawn_or_raise call.
+        window before spawn_or_raise call. ``window`` is None if it was
+        destroyed meanwhile.
 
         :param cmd: same as in :func:`spawn`.
         :param switch_to_desktop: same as in :func:`spawn`.
@@ -69,13 +77,20 @@ class Actions(object):
         else:
             if on_create:
                 if not self.create_spawn_hook in self.create_handlers:
-                    self.on_create(self.create_spawn_hook)
+                    self.create_handlers.add(self.create_spawn_hook, {}, True)
 
-                self.spawn_queue.append((time.time(), on_create,
-                    int(self.current_window), self.current_desktop, matchers))
+                cw = self.current_window
+                hook = [time.time(), on_create, cw and int(cw),
+                        self.current_desktop, matchers]
+                self.spawn_queue.append(hook)
+                if cw:
+                    self.add_window_cleanup(cw, self._forget_spawn_window, hook)
 
             self.spawn(cmd, switch_to_desktop)
 
+    def _forget_spawn_window(self, window, hook):
+        hook[2] = None
+
     def _focus(self, window, direction):
         clients = self.find_clients(self.get_clients(), desktop=window.desktop)
         idx = clients.index(window)
@@ -96,10 +111,86 @@ class Actions(object):
         """
         self._focus(window or self.current_window, -1)
 
+    def _history(self, current_desktop, matchers):
+        if current_desktop:
+            desktop = self.current_desktop
+            return [r for r in self.get_focus_history(**matchers)
+                    if r.desktop in (desktop, -1)]
+
+        return self.get_focus_history(**matchers)
+
+    def focus_last(self, current_desktop=False, **matchers):
+        """Focus previously focused window
+
+        Focus history is tracked in memory, no X queries are made.
+
+        :param current_desktop: only consider windows on current desktop
+        :param \*\*matchers: see :meth:`~orcsome.core.WM.is_match`
+        """
+        windows = self._history(current_desktop, matchers)
+        if len(windows) > 1:
+            self.focus_and_raise(windows[1])
+
+    def focus_cycle(self, current_desktop=False, **matchers):
+        """Alt-tab like cycling through focus history
+
+        The first call focuses previous window, repeated presses of the
+        same key go deeper into history, Shift reverses the direction.
+        Cycle ends on release of binding modifier, only the final window
+        is moved to the top of history::
+
+           wm.on_key('Alt+Tab').focus_cycle(current_desktop=True)
+
+        Outside key handlers (e.g. called from timer) works as
+        :meth:`focus_last`.
+
+        :param current_desktop: only consider windows on current desktop
+        :param \*\*matchers: see :meth:`~orcsome.core.WM.is_match`
+        """
+        windows = self._history(current_desktop, matchers)
+        if len(windows) < 2:
+            return
+
+        if self.pressed_key and self.grab_keyboard(self._focus_cycle_key):
+            state, keycode = self.pressed_key
+            mods = state & ~self.ignored_mods
+            self.focus_cycle_state = [windows, 1, keycode, mods]
+
+        self.focus_and_raise(windows[1])
+
+    def _focus_cycle_key(self, is_press, state, code):
+        windows, idx, keycode, mods = self.focus_cycle_state
+        modifier = self.modifier_masks.get(code, 0)
+        if is_press and code == keycode:
+            idx += -1 if state & X.ShiftMask else 1
+            self.focus_cycle_state[1] = idx
+            self.focus_and_raise(windows[idx % len(windows)])
+        elif (is_press and not modifier) or (not is_press and modifier & mods):
+            self._end_focus_cycle(windows[idx % len(windows)], windows)
+
+    def _end_focus_cycle(self, window, windows):
+        self.focus_cycle_state = None
+        self.ungrab_keyboard()
+        self._flush()
+
+        # Windows passed during cycle were focused too, restore their order
+        history = self.focus_history
+        for w in reversed(windows):
+            if w != window and w in history:
+                history.touch(int(w))
+        history.touch(int(window))
+
     def restart(self):
         """Restart orcsome"""
         raise RestartException()
 
+    def reload(self):
+        """Reload config applying only changed bindings
+
+        See :meth:`~orcsome.wm.WM.reload_config`.
+        """
+        raise RestartException(incremental=True)
+
     def do(self, callable, *args, **kwargs):
         callable(*args, **kwargs)
 
@@ -0,0 +1,415 @@
+"""Minimal asynchronous D-Bus client
+
+Implements just enough of the wire protocol to call methods on the
+session bus from orcsome event loop: EXTERNAL auth, marshalling of basic
+types, arrays, structs, dicts and variants, method replies and errors.
+"""
+import os
+import errno
+import socket
+import struct
+import logging
+import binascii
+
+from . import ev
+from .utils import btype
+
+logger = logging.getLogger(__name__)
+
+METHOD_CALL = 1
+METHOD_RETURN = 2
+ERROR = 3
+SIGNAL = 4
+
+NO_REPLY_EXPECTED = 0x1
+
+DISCONNECTED = ('org.freedesktop.DBus.Error.Disconnected', 'Connection closed')
+
+F_PATH = 1
+F_INTERFACE = 2
+F_MEMBER = 3
+F_ERROR_NAME = 4
+F_REPLY_SERIAL = 5
+F_DESTINATION = 6
+F_SIGNATURE = 8
+
+FIXED = {
+    'y': ('B', 1), 'b': ('I', 4), 'n': ('h', 2), 'q': ('H', 2), 'i': ('i', 4),
+    'u': ('I', 4), 'x': ('q', 8), 't': ('Q', 8), 'd': ('d', 8), 'h': ('I', 4),
+}
+ALIGN = {'s': 4, 'o': 4, 'g': 1, 'v': 1, 'a': 4, '(': 8, '{': 8}
+
+
+class DBusError(Exception):
+    pass
+
+
+def split_signature(sig):
+    """Split signature into list of complete types"""
+    result = []
+    i = 0
+    while i < len(sig):
+        start = i
+        while sig[i] == 'a':
+            i += 1
+
+        if sig[i] in '({':
+            depth = 0
+            while True:
+                if sig[i] in '({':
+                    depth += 1
+                elif sig[i] in ')}':
+                    depth -= 1
+                i += 1
+                if not depth:
+                    break
+        else:
+            i += 1
+
+        result.append(sig[start:i])
+    return result
+
+
+def alignment(t):
+    return FIXED[t[0]][1] if t[0] in FIXED else ALIGN[t[0]]
+
+
+class Writer(object):
+    def __init__(self, endian='<'):
+        self.endian = endian
+        self.buf = bytearray()
+
+    def align(self, n):
+        self.buf.extend(b'\x00' * (-len(self.buf) % n))
+
+    def pack(self, fmt, *values):
+        self.buf.extend(struct.pack(self.endian + fmt, *values))
+
+    def write(self, t, value):
+        c = t[0]
+        if c in FIXED:
+            fmt, size = FIXED[c]
+            self.align(size)
+            self.pack(fmt, value)
+        elif c in 'so':
+            data = value if isinstance(value, btype) else value.encode('utf-8')
+            self.align(4)
+            self.pack('I', len(data))
+            self.buf.extend(data + b'\x00')
+        elif c == 'g':
+            data = value if isinstance(value, btype) else value.encode('ascii')
+            self.pack('B', len(data))
+            self.buf.extend(data + b'\x00')
+        elif c == 'v':
+            sig, value = value
+            self.write('g', sig)
+            self.write(sig, value)
+        elif c == 'a':
+            elem = t[1:]
+            self.align(4)
+            pos = len(self.buf)
+            self.pack('I', 0)
+            self.align(alignment(elem))
+            start = len(self.buf)
+            if elem[0] == '{':
+                for item in value.items():
+                    self.write(elem, item)
+            else:
+                for item in value:
+                    self.write(elem, item)
+            struct.pack_into(self.endian + 'I', self.buf, pos, len(self.buf) - start)
+        elif c in '({':
+            self.align(8)
+            for st, v in zip(split_signature(t[1:-1]), value):
+                self.write(st, v)
+        else:
+            raise DBusError('Unsupported type {}'.format(t))
+
+    def write_all(self, sig, values):
+        for t, v in zip(split_signature(sig), values):
+            self.write(t, v)
+
+
+class Reader(object):
+    def __init__(self, data, endian='<', offset=0):
+        self.data = data
+        self.endian = endian
+        self.pos = offset
+
+    def align(self, n):
+        self.pos += -self.pos % n
+
+    def unpack(self, fmt, size):
+        value, = struct.unpack_from(self.endian + fmt, self.data, self.pos)
+        self.pos += size
+        return value
+
+    def read(self, t):
+        c = t[0]
+        if c in FIXED:
+            fmt, size = FIXED[c]
+            self.align(size)
+            value = self.unpack(fmt, size)
+            return bool(value) if c == 'b' else value
+        elif c in 'so':
+            self.align(4)
+            size = self.unpack('I', 4)
+            value = bytes(self.data[self.pos:self.pos + size]).decode('utf-8')
+            self.pos += size + 1
+            return value
+        elif c == 'g':
+            size = self.unpack('B', 1)
+            value = bytes(self.data[self.pos:self.pos + size]).decode('ascii')
+            self.pos += size + 1
+            return value
+        elif c == 'v':
+            sig = self.read('g')
+            return sig, self.read(sig)
+        elif c == 'a':
+            elem = t[1:]
+            self.align(4)
+            size = self.unpack('I', 4)
+            self.align(alignment(elem))
+            end = self.pos + size
+            items = []
+            while self.pos < end:
+                items.append(self.read(elem))
+            return dict(items) if elem[0] == '{' else items
+        elif c in '({':
+            self.align(8)
+            return tuple(self.read(st) for st in split_signature(t[1:-1]))
+        else:
+            raise DBusError('Unsupported type {}'.format(t))
+
+    def read_all(self, sig):
+        return [self.read(t) for t in split_signature(sig)]
+
+
+def build_message(mtype, serial, fields, sig='', args=(), flags=0):
+    body = Writer()
+    body.write_all(sig, args)
+    if sig:
+        fields.append((F_SIGNATURE, ('g', sig)))
+
+    msg = Writer()
+    msg.buf.extend(b'l')
+    msg.pack('BBBII', mtype, flags, 1, len(body.buf), serial)
+    msg.write('a(yv)', fields)
+    msg.align(8)
+    msg.buf.extend(body.buf)
+    return bytes(msg.buf)
+
+
+def message_size(data):
+    """Return full size of message at the start of ``data`` or None"""
+    if len(data) < 16:
+        return None
+
+    endian = '<' if data[0:1] == b'l' else '>'
+    body_len, _, fields_len = struct.unpack_from(endian + 'III', data, 4)
+    return 16 + fields_len + (-fields_len % 8) + body_len
+
+
+def parse_message(data):
+    """Return (type, flags, serial, fields, args) of a complete message"""
+    endian = '<' if data[0:1] == b'l' else '>'
+    mtype, flags, _, _, serial = struct.unpack_from(endian + 'BBBII', data, 1)
+    r = Reader(data, endian, 12)
+    fields = dict((code, value) for code, (_, value) in r.read('a(yv)'))
+    r.align(8)
+    args = r.read_all(fields.get(F_SIGNATURE, ''))
+    return mtype, flags, serial, fields, args
+
+
+def parse_address(address):
+    """Return socket address for the first supported unix transport"""
+    for entry in address.split(';'):
+        transport, _, params = entry.partition(':')
+        if transport != 'unix':
+            continue
+
+        params = dict(r.split('=', 1) for r in params.split(',') if '=' in r)
+        if 'path' in params:
+            return params['path']
+        if 'abstract' in params:
+            return '\0' + params['abstract']
+
+    raise DBusError('Unsupported bus address {}'.format(address))
+
+
+class Connection(object):
+    """D-Bus connection driven by orcsome event loop
+
+    Connecting and authentication are synchronous, method calls are not:
+    replies are delivered to callbacks from the loop.
+    """
+    def __init__(self, address=None, sock=None):
+        if sock is None:
+            address = address or os.environ.get('DBUS_SESSION_BUS_ADDRESS')
+            if not address:
+                raise DBusError('Session bus address is not set')
+
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(parse_address(address))
+
+        self.sock = sock
+        self.serial = 0
+        self.pending = {}
+        self.loop = None
+        self.closed = False
+        self._rbuf = bytearray()
+        self._wbuf = bytearray()
+        self._reader = self._writer = None
+
+        self._auth()
+        self.unique_name = self.call_sync('org.freedesktop.DBus',
+            '/org/freedesktop/DBus', 'org.freedesktop.DBus', 'Hello')[0]
+
+    def _auth(self):
+        uid = str(os.getuid()).encode('ascii')
+        self.sock.sendall(b'\x00AUTH EXTERNAL ' + binascii.hexlify(uid) + b'\r\n')
+        line = b''
+        while not line.endswith(b'\r\n'):
+            chunk = self.sock.recv(256)
+            if not chunk:
+                raise DBusError('Connection closed during auth')
+            line += chunk
+
+        if not line.startswith(b'OK '):
+            raise DBusError('Auth failed: {!r}'.format(line.strip()))
+
+        self.sock.sendall(b'BEGIN\r\n')
+
+    def attach(self, loop):
+        """Start processing replies in ``loop``"""
+        self.loop = loop
+        self.sock.setblocking(False)
+        self._reader = ev.IOWatcher(self._on_read, self.sock.fileno(), ev.EV_READ)
+        self._writer = ev.IOWatcher(self._on_write, self.sock.fileno(), ev.EV_WRITE)
+        self._reader.start(loop)
+
+    def close(self):
+        """Close connection, pending calls get :data:`DISCONNECTED` error"""
+        if self.closed:
+            return
+
+        if self.loop:
+            self._reader.stop(self.loop)
+            self._writer.stop(self.loop)
+            self.loop = None
+        self.closed = True
+        self.sock.close()
+
+        pending, self.pending = self.pending, {}
+        for callback in pending.values():
+            try:
+                callback([], DISCONNECTED)
+            except Exception:
+                logger.exception('Error in D-Bus reply callback')
+
+    def _message(self, dest, path, iface, member, sig, args, flags):
+        self.serial += 1
+        fields = [(F_PATH, ('o', path)), (F_INTERFACE, ('s', iface)),
+                  (F_MEMBER, ('s', member)), (F_DESTINATION, ('s', dest))]
+        return build_message(METHOD_CALL, self.serial, fields, sig, args, flags)
+
+    def call(self, dest, path, iface, member, sig='', args=(), callback=None):
+        """Send method call
+
+        ``callback(args, error)`` receives reply arguments or error as
+        ``(name, message)`` tuple. Without callback no reply is requested.
+        """
+        if self.closed:
+            raise DBusError('Connection closed')
+
+        flags = 0 if callback else NO_REPLY_EXPECTED
+        data = self._message(dest, path, iface, member, sig, args, flags)
+        if callback:
+            self.pending[self.serial] = callback
+
+        self._wbuf.extend(data)
+        self._on_write()
+        return self.serial
+
+    def call_sync(self, dest, path, iface, member, sig='', args=()):
+        """Blocking call, only usable before :meth:`attach`"""
+        self.sock.sendall(self._message(dest, path, iface, member, sig, args, 0))
+        serial = self.serial
+        while True:
+            for mtype, fields, margs in self._read_messages(self.sock.recv(65536)):
+                if fields.get(F_REPLY_SERIAL) == serial:
+                    if mtype == ERROR:
+                        raise DBusError(fields.get(F_ERROR_NAME), *margs)
+                    return margs
+
+    def _read_messages(self, data):
+        if not data:
+            raise DBusError('Connection closed')
+
+        buf = self._rbuf
+        buf.extend(data)
+        while True:
+            size = message_size(buf)
+            if size is None or size > len(buf):
+                break
+
+            mtype, _, _, fields, args = parse_message(bytes(buf[:size]))
+            del buf[:size]
+            yield mtype, fields, args
+
+    def _on_write(self, *args):
+        if self.closed:
+            return
+
+        try:
+            if not self.loop:
+                self.sock.sendall(self._wbuf)
+                del self._wbuf[:]
+                return
+
+            sent = self.sock.send(self._wbuf) if self._wbuf else 0
+        except socket.error as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                logger.error('D-Bus connection lost: %s', e)
+                self.close()
+                return
+            sent = 0
+
+        del self._wbuf[:sent]
+
+        if self._wbuf:
+            self._writer.start(self.loop)
+        else:
+            self._writer.stop(self.loop)
+
+    def _on_read(self, loop, watcher, events):
+        try:
+            data = self.sock.recv(65536)
+        except socket.error as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            data = b''
+
+        try:
+            for mtype, fields, args in self._read_messages(data):
+                if mtype not in (METHOD_RETURN, ERROR):
+                    continue
+
+                callback = self.pending.pop(fields.get(F_REPLY_SERIAL), None)
+                if not callback:
+                    continue
+
+                error = None
+                if mtype == ERROR:
+                    error = fields.get(F_ERROR_NAME), args[0] if args else ''
+
+                try:
+                    callback(args, error)
+                except Exception:
+                    logger.exception('Error in D-Bus reply callback')
+        except DBusError:
+            logger.error('D-Bus connection closed')
+            self.close()
+        except (struct.error, ValueError, IndexError):
+            logger.exception('Malformed D-Bus message, closing connection')
+            self.close()
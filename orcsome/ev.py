@@ -5,9 +5,23 @@ NULL = ffi.NULL
 globals().update(lib.__dict__)
 
 
+BACKENDS = {
+    'auto': EVFLAG_AUTO,
+    'select': EVBACKEND_SELECT,
+    'poll': EVBACKEND_POLL,
+    'epoll': EVBACKEND_EPOLL,
+    'kqueue': EVBACKEND_KQUEUE,
+}
+
+
 class Loop(object):
-    def __init__(self):
-        self._loop = ev_loop_new(EVBACKEND_SELECT)
+    def __init__(self, backend='select'):
+        flags = BACKENDS[backend]
+        if flags and not flags & ev_supported_backends():
+            raise ValueError('libev backend {} is not supported'.format(backend))
+
+        # Child watchers work only on the default loop
+        self._loop = ev_default_loop(flags)
 
     def destroy(self):
         ev_loop_destroy(self._loop)
@@ -18,6 +32,20 @@ class Loop(object):
     def break_(self, flags=EVBREAK_ALL):
         ev_break(self._loop, flags)
 
+    @property
+    def backend(self):
+        flags = ev_backend(self._loop)
+        for name, value in BACKENDS.items():
+            if value == flags:
+                return name
+
+    def now(self):
+        """Loop time cached at the start of iteration"""
+        return ev_now(self._loop)
+
+    def now_update(self):
+        ev_now_update(self._loop)
+
 
 class IOWatcher(object):
     def __init__(self, cb, fd, flags):
@@ -54,9 +82,11 @@ class TimerWatcher(object):
         ev_timer_init(self._watcher, self._cb, after, repeat)
 
     def start(self, loop, after=None, repeat=None):
-        if after or repeat:
-            self._after = after or self._after
-            self._repeat = repeat or self._repeat
+        if after is not None or repeat is not None:
+            if after is not None:
+                self._after = after
+            if repeat is not None:
+                self._repeat = repeat
             ev_timer_set(self._watcher, self._after, self._repeat)
 
         self.next_stop = time() + self._after
@@ -77,3 +107,83 @@ class TimerWatcher(object):
 
     def overdue(self, timeout):
         return time() > self.next_stop + timeout
+
+
+class ChildWatcher(object):
+    def __init__(self, cb, pid, trace=0):
+        self._watcher = ffi.new('ev_child*')
+        self._cb = ffi.callback('child_cb', cb)
+        ev_child_init(self._watcher, self._cb, pid, trace)
+
+    def start(self, loop):
+        ev_child_start(loop._loop, self._watcher)
+
+    def stop(self, loop):
+        ev_child_stop(loop._loop, self._watcher)
+
+    @property
+    def pid(self):
+        return self._watcher.rpid
+
+    @property
+    def status(self):
+        return self._watcher.rstatus
+
+
+class PrepareWatcher(object):
+    """Called before the loop blocks for new events"""
+    def __init__(self, cb):
+        self._watcher = ffi.new('ev_prepare*')
+        self._cb = ffi.callback('prepare_cb', cb)
+        ev_prepare_init(self._watcher, self._cb)
+
+    def start(self, loop):
+        ev_prepare_start(loop._loop, self._watcher)
+
+    def stop(self, loop):
+        ev_prepare_stop(loop._loop, self._watcher)
+
+
+class CheckWatcher(object):
+    """Called after the loop woke up, before any other watcher"""
+    def __init__(self, cb):
+        self._watcher = ffi.new('ev_check*')
+        self._cb = ffi.callback('check_cb', cb)
+        ev_check_init(self._watcher, self._cb)
+
+    def start(self, loop):
+        ev_check_start(loop._loop, self._watcher)
+
+    def stop(self, loop):
+        ev_check_stop(loop._loop, self._watcher)
+
+
+class IdleWatcher(object):
+    """Called on each iteration while there are no other pending events"""
+    def __init__(self, cb):
+        self._watcher = ffi.new('ev_idle*')
+        self._cb = ffi.callback('idle_cb', cb)
+        ev_idle_init(self._watcher, self._cb)
+
+    def start(self, loop):
+        ev_idle_start(loop._loop, self._watcher)
+
+    def stop(self, loop):
+        ev_idle_stop(loop._loop, self._watcher)
+
+
+class AsyncWatcher(object):
+    """Wakes the loop up from other threads or signal handlers"""
+    def __init__(self, cb):
+        self._watcher = ffi.new('ev_async*')
+        self._cb = ffi.callback('async_cb', cb)
+        ev_async_init(self._watcher, self._cb)
+
+    def start(self, loop):
+        ev_async_start(loop._loop, self._watcher)
+
+    def stop(self, loop):
+        ev_async_stop(loop._loop, self._watcher)
+
+    def send(self, loop):
+        ev_async_send(loop._loop, self._watcher)
@@ -0,0 +1,589 @@
+"""In-memory X display for tests and benchmarks
+
+:class:`FakeDisplay` keeps windows, properties, grabs and the event queue
+in Python and replaces :mod:`orcsome.xlib` functions while installed, so
+:class:`~orcsome.wm.WM`, windows and actions run without X server::
+
+   fake = FakeDisplay()
+   fake.create_windows(1000, cls='XTerm', notify=False)
+   with fake:
+       wm = WM(ev.Loop())
+       wm.mix(Actions)
+       wm.init()
+
+       fake.create_window(cls='Firefox')
+       fake.press('Win+Return')
+       fake.dispatch(wm)
+
+It also acts as a minimal EWMH window manager: client messages sent by
+orcsome change focus, desktops, state and geometry of windows and
+produce notifications a real window manager would.
+"""
+from array import array
+from collections import deque
+
+from . import ev, xlib as X
+from .utils import bstr
+from .aliases import KEYS as KEY_ALIASES
+from .wm import MODIFICATORS
+from .record import StubDisplay
+
+ROOT = 0x100
+FIRST_CLIENT = 0x400001
+
+PropertyNewValue = 0
+PropertyDelete = 1
+GrabSuccess = 0
+AlreadyGrabbed = 1
+
+EVENT_SIZE = X.ffi.sizeof('XEvent')
+
+#: Atoms predefined by X protocol
+PREDEFINED_ATOMS = {
+    'ATOM': 4, 'CARDINAL': 6, 'STRING': 31, 'WINDOW': 33, 'WM_NAME': 39,
+    'WM_CLASS': 67, 'WM_TRANSIENT_FOR': 68,
+}
+
+#: Keyboard layout, keycodes are assigned in order starting from 8
+KEYS = tuple('abcdefghijklmnopqrstuvwxyz0123456789') + tuple(
+    'F{}'.format(i) for i in range(1, 13)) + (
+    'Return', 'Escape', 'Tab', 'space', 'BackSpace', 'Delete', 'Insert',
+    'Left', 'Right', 'Up', 'Down', 'Home', 'End', 'Prior', 'Next', 'Print',
+    'minus', 'equal', 'comma', 'period', 'slash', 'grave',
+    'Shift_L', 'Shift_R', 'Control_L', 'Control_R', 'Alt_L', 'Alt_R',
+    'Super_L', 'Super_R', 'Caps_Lock', 'Num_Lock', 'Scroll_Lock',
+    'XF86AudioRaiseVolume', 'XF86AudioLowerVolume', 'XF86AudioMute',
+)
+
+#: Keys of Shift, Lock, Control, Mod1 ... Mod5 modifiers
+MODIFIER_KEYS = (
+    ('Shift_L', 'Shift_R'), ('Caps_Lock', ), ('Control_L', 'Control_R'),
+    ('Alt_L', 'Alt_R'), ('Num_Lock', ), (), ('Super_L', 'Super_R'), (),
+)
+
+#: Flags of _NET_MOVERESIZE_WINDOW telling which values are present
+MOVERESIZE_FLAGS = ((1 << 8, 'x'), (1 << 9, 'y'), (1 << 10, 'width'),
+                    (1 << 11, 'height'))
+
+
+class FakeWindow(object):
+    __slots__ = ('id', 'parent', 'x', 'y', 'width', 'height', 'mapped',
+                 'props', 'event_mask')
+
+    def __init__(self, id, parent, x=0, y=0, width=1, height=1):
+        self.id = id
+        self.parent = parent
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.mapped = False
+        self.props = {}
+        self.event_mask = 0
+
+
+class FakeDisplay(StubDisplay):
+    """Single screen X server with one client connection
+
+    ``flushes`` counts explicit output flushes, ``client_messages`` keeps
+    all messages sent by client as ``(window, type name, data)``.
+    """
+    def __init__(self, width=1920, height=1080, desktops=4):
+        StubDisplay.__init__(self, PREDEFINED_ATOMS)
+
+        self.root = ROOT
+        self.windows = {ROOT: FakeWindow(ROOT, 0, 0, 0, width, height)}
+        self.windows[ROOT].mapped = True
+        self.clients = []
+        self.stacking = []
+        self.active = 0
+        self._next_window = FIRST_CLIENT
+
+        self.queue = deque()
+        self.serial = 0
+        self.flushes = 0
+        self.client_messages = []
+
+        self.key_grabs = set()
+        self.keyboard_grab = None
+        self.pointer_grab = None
+        self.kbd_group = 0
+
+        self.keysyms = [X.lib.XStringToKeysym(bstr(r)) for r in KEYS]
+        self.keycodes = {sym: code for code, sym in enumerate(self.keysyms, 8)}
+        self.modifiers = [[self.keycodes[self.keysym(r)] for r in keys]
+                          for keys in MODIFIER_KEYS]
+
+        self.message_handlers = {
+            '_NET_ACTIVE_WINDOW': self._net_active_window,
+            '_NET_CLOSE_WINDOW': self._net_close_window,
+            '_NET_CURRENT_DESKTOP': self._net_current_desktop,
+            '_NET_WM_DESKTOP': self._net_wm_desktop,
+            '_NET_WM_STATE': self._net_wm_state,
+            '_NET_MOVERESIZE_WINDOW': self._net_moveresize_window,
+        }
+
+        self.set_property(ROOT, '_NET_NUMBER_OF_DESKTOPS', [desktops], notify=False)
+        self.set_property(ROOT, '_NET_CURRENT_DESKTOP', [0], notify=False)
+        self.set_property(ROOT, '_NET_DESKTOP_GEOMETRY', [width, height], notify=False)
+        self.set_property(ROOT, '_NET_WORKAREA', [0, 0, width, height] * desktops,
+                          notify=False)
+        self.set_property(ROOT, '_NET_ACTIVE_WINDOW', [0], 'WINDOW', notify=False)
+        self._update_client_lists(notify=False)
+
+    def dispatch(self, wm):
+        """Process queued events by ``wm`` until queue is empty"""
+        while self.queue:
+            wm._xevent_cb(wm.loop, wm.xevent_watcher, ev.EV_READ)
+
+    # Server state
+
+    def keysym(self, name):
+        return X.lib.XStringToKeysym(bstr(KEY_ALIASES.get(name, name)))
+
+    def get_property(self, window, name):
+        """Return property value: int list or bytes, None if not set"""
+        prop = self.windows[window].props.get(self.intern(name))
+        return prop and prop[2]
+
+    def set_property(self, window, name, value, type=None, notify=True):
+        """Set property, ints are stored as CARDINAL and str as UTF8_STRING
+
+        ``value`` is an int list, str or bytes.
+        """
+        if isinstance(value, (bytes, str)):
+            fmt = 8
+            value = value.encode('utf-8') if isinstance(value, str) else value
+            type = type or 'UTF8_STRING'
+        else:
+            fmt = 32
+            type = type or 'CARDINAL'
+
+        self._set_property(window, self.intern(name), self.intern(type), fmt,
+                           value, notify)
+
+    def delete_property(self, window, name, notify=True):
+        atom = self.intern(name)
+        w = self.windows[window]
+        if w.props.pop(atom, None) and notify and w.event_mask & X.PropertyChangeMask:
+            self._event('xproperty', X.PropertyNotify, window=window, atom=atom,
+                        state=PropertyDelete)
+
+    def _set_property(self, window, atom, type, fmt, value, notify=True):
+        if fmt == 32:
+            value = [r & 0xffffffff for r in value]
+        else:
+            value = bytes(value)
+
+        w = self.windows[window]
+        w.props[atom] = type, fmt, value
+        if notify and w.event_mask & X.PropertyChangeMask:
+            self._event('xproperty', X.PropertyNotify, window=window, atom=atom,
+                        state=PropertyNewValue)
+
+    def _update_client_lists(self, notify=True):
+        self.set_property(ROOT, '_NET_CLIENT_LIST', self.clients, 'WINDOW', notify)
+        self.set_property(ROOT, '_NET_CLIENT_LIST_STACKING', self.stacking,
+                          'WINDOW', notify)
+
+    # Events
+
+    def _event(self, member, type, **fields):
+        event = X.ffi.new('XEvent *')
+        data = getattr(event, member)
+        data.type = type
+        self.serial += 1
+        data.serial = self.serial
+        for name, value in fields.items():
+            setattr(data, name, value)
+        self.queue.append(event)
+
+    def _structure_event(self, window, member, type, **fields):
+        """Queue event for window and its parent according to selected masks"""
+        w = self.windows[window]
+        if w.event_mask & X.StructureNotifyMask:
+            self._event(member, type, event=window, window=window, **fields)
+
+        parent = self.windows.get(w.parent)
+        if parent and parent.event_mask & X.SubstructureNotifyMask:
+            self._event(member, type, event=w.parent, window=window, **fields)
+
+    def create_window(self, cls='Fake', instance=None, name=None, desktop=0,
+                      role=None, geometry=None, props=None, notify=True,
+                      update_lists=True, frame=None):
+        """Create and map client window, return its id
+
+        Without ``notify`` no events are generated, useful to populate
+        display before WM is started. With ``frame`` (left, right, top,
+        bottom) window is reparented into a frame of that extents placed
+        at ``geometry`` position.
+        """
+        wid = self._next_window
+        self._next_window += 1
+
+        x, y, width, height = geometry or (0, 0, 640, 480)
+        if frame:
+            left, right, top, bottom = frame
+            fid = self._next_window
+            self._next_window += 1
+            f = self.windows[fid] = FakeWindow(fid, ROOT, x, y, width + left + right,
+                                               height + top + bottom)
+            f.mapped = True
+            w = self.windows[wid] = FakeWindow(wid, fid, left, top, width, height)
+            self.set_property(wid, '_NET_FRAME_EXTENTS', list(frame), notify=False)
+        else:
+            w = self.windows[wid] = FakeWindow(wid, ROOT, x, y, width, height)
+
+        instance = instance or cls.lower()
+        name = name or '{} {:#x}'.format(cls, wid)
+        self.set_property(wid, 'WM_CLASS', '{}\0{}\0'.format(instance, cls),
+                          'STRING', False)
+        self.set_property(wid, 'WM_NAME', name, 'STRING', False)
+        self.set_property(wid, '_NET_WM_NAME', name, notify=False)
+        self.set_property(wid, '_NET_WM_DESKTOP', [desktop], notify=False)
+        self.set_property(wid, '_NET_WM_WINDOW_TYPE',
+                          [self.intern('_NET_WM_WINDOW_TYPE_NORMAL')], 'ATOM', False)
+        if role:
+            self.set_property(wid, 'WM_WINDOW_ROLE', role, 'STRING', False)
+        for pname, value in (props or {}).items():
+            self.set_property(wid, pname, value, notify=False)
+
+        w.mapped = True
+        if notify:
+            parent = self.windows[ROOT]
+            if parent.event_mask & X.SubstructureNotifyMask:
+                self._event('xcreatewindow', X.CreateNotify, parent=ROOT,
+                            window=wid, x=x, y=y, width=width, height=height)
+            self._structure_event(wid, 'xmap', X.MapNotify)
+
+        self.clients.append(wid)
+        self.stacking.append(wid)
+        if update_lists:
+            self._update_client_lists(notify)
+        return wid
+
+    def create_windows(self, count, notify=True, **kwargs):
+        """Create ``count`` windows updating client lists once"""
+        result = [self.create_window(notify=notify, update_lists=False, **kwargs)
+                  for _ in range(count)]
+        self._update_client_lists(notify)
+        return result
+
+    def destroy_window(self, window):
+        window = int(window)
+        if window not in self.windows:
+            return
+
+        if self.windows[window].mapped:
+            self.unmap_window(window)
+        self._structure_event(window, 'xdestroywindow', X.DestroyNotify)
+        parent = self.windows.pop(window).parent
+        if parent != ROOT:
+            del self.windows[parent]
+        self.key_grabs = set(r for r in self.key_grabs if r[0] != window)
+
+        self.clients.remove(window)
+        self.stacking.remove(window)
+        self._update_client_lists()
+        if self.active == window:
+            self.focus(0)
+
+    def map_window(self, window):
+        self.windows[window].mapped = True
+        self._structure_event(window, 'xmap', X.MapNotify)
+
+    def unmap_window(self, window):
+        self.windows[window].mapped = False
+        self._structure_event(window, 'xunmap', X.UnmapNotify)
+
+    def move_resize(self, window, x=None, y=None, width=None, height=None):
+        """Configure window, ``x`` and ``y`` of reparented one place its frame"""
+        w = self.windows[window]
+        frame = self.windows[w.parent] if w.parent != ROOT else None
+        target = frame or w
+        target.x = target.x if x is None else x
+        target.y = target.y if y is None else y
+        w.width = w.width if width is None else max(1, width)
+        w.height = w.height if height is None else max(1, height)
+
+        if frame:
+            left, right, top, bottom = self.get_property(window, '_NET_FRAME_EXTENTS')
+            frame.width = w.width + left + right
+            frame.height = w.height + top + bottom
+            self._structure_event(frame.id, 'xconfigure', X.ConfigureNotify,
+                                  x=frame.x, y=frame.y, width=frame.width,
+                                  height=frame.height)
+
+        self._structure_event(window, 'xconfigure', X.ConfigureNotify,
+                              x=w.x, y=w.y, width=w.width, height=w.height)
+
+        if frame and w.event_mask & X.StructureNotifyMask:
+            # ICCCM synthetic notify with root coordinates
+            self._event('xconfigure', X.ConfigureNotify, send_event=True,
+                        event=window, window=window, x=frame.x + w.x,
+                        y=frame.y + w.y, width=w.width, height=w.height)
+
+    def restack(self, window, above=True):
+        self.stacking.remove(window)
+        if above:
+            self.stacking.append(window)
+        else:
+            self.stacking.insert(0, window)
+
+        w = self.windows[window]
+        idx = self.stacking.index(window)
+        self._structure_event(window, 'xconfigure', X.ConfigureNotify,
+                              x=w.x, y=w.y, width=w.width, height=w.height,
+                              above=self.stacking[idx - 1] if idx else 0)
+        self.set_property(ROOT, '_NET_CLIENT_LIST_STACKING', self.stacking, 'WINDOW')
+
+    def focus(self, window):
+        """Move input focus and update _NET_ACTIVE_WINDOW"""
+        window = int(window)
+        old, self.active = self.active, window
+        if old in self.windows and self.windows[old].event_mask & X.FocusChangeMask:
+            self._event('xfocus', X.FocusOut, window=old)
+        if window in self.windows and self.windows[window].event_mask & X.FocusChangeMask:
+            self._event('xfocus', X.FocusIn, window=window)
+        self.set_property(ROOT, '_NET_ACTIVE_WINDOW', [window], 'WINDOW')
+
+    def set_desktop(self, desktop):
+        self.set_property(ROOT, '_NET_CURRENT_DESKTOP', [desktop])
+
+    def press(self, keydef, state=0, wm=None):
+        """Press and release keys like orcsome key definition, e.g.
+        ``Win+x c``
+
+        Key events are delivered only if keyboard or the key is grabbed.
+        Like X server passive grabs are searched from root down to focused
+        window. ``state`` is added to modifiers (e.g. to emulate Num Lock). With
+        ``wm`` events are dispatched after each key, so grabs made by
+        handlers apply to the next one. Return number of delivered presses.
+        """
+        delivered = 0
+        for k in keydef.split():
+            parts = k.split('+')
+            modmask = state
+            for m in parts[:-1]:
+                modmask |= MODIFICATORS[m]
+            code = self.keycodes[self.keysym(parts[-1])]
+
+            if self.keyboard_grab:
+                window = self.keyboard_grab
+            else:
+                window = self._key_grab_window(code, modmask)
+                if window is None:
+                    continue
+
+            for type in (X.KeyPress, X.KeyRelease):
+                self._event('xkey', type, window=window, root=ROOT,
+                            state=modmask, keycode=code, same_screen=True)
+            delivered += 1
+            if wm:
+                self.dispatch(wm)
+        return delivered
+
+    def _key_grab_window(self, code, modmask):
+        for window in (ROOT, self.active):
+            if ((window, code, modmask) in self.key_grabs
+                    or (window, code, X.AnyModifier) in self.key_grabs):
+                return window
+
+    # EWMH client messages
+
+    def _net_active_window(self, window, data):
+        self.focus(window)
+        if window in self.stacking:
+            self.restack(window)
+
+    def _net_close_window(self, window, data):
+        self.destroy_window(window)
+
+    def _net_current_desktop(self, window, data):
+        self.set_desktop(data[0])
+
+    def _net_wm_desktop(self, window, data):
+        self.set_property(window, '_NET_WM_DESKTOP', [data[0]])
+
+    def _net_wm_state(self, window, data):
+        action = data[0]
+        hidden = self.intern('_NET_WM_STATE_HIDDEN')
+        state = list(self.get_property(window, '_NET_WM_STATE') or [])
+        for atom in data[1:3]:
+            if not atom:
+                continue
+            if action == 1 or (action == 2 and atom not in state):
+                if atom not in state:
+                    state.append(atom)
+                    if atom == hidden:
+                        self.unmap_window(window)
+            elif atom in state:
+                state.remove(atom)
+                if atom == hidden:
+                    self.map_window(window)
+
+        self.set_property(window, '_NET_WM_STATE', state, 'ATOM')
+
+    def _net_moveresize_window(self, window, data):
+        values = {name: value for (flag, name), value
+                  in zip(MOVERESIZE_FLAGS, data[1:]) if data[0] & flag}
+        self.move_resize(window, **values)
+
+    # Patched xlib functions, names without x_ prefix
+
+    def x_DefaultRootWindow(self, display):
+        return ROOT
+
+    def x_XFlush(self, display):
+        self.flushes += 1
+        return 1
+
+    def x_XSync(self, display, discard):
+        self.round_trips += 1
+        return 1
+
+    def x_XPending(self, display):
+        return len(self.queue)
+
+    def x_XQLength(self, display):
+        return len(self.queue)
+
+    def x_XNextEvent(self, display, event):
+        X.ffi.memmove(event, self.queue.popleft(), EVENT_SIZE)
+        return 0
+
+    def x_XSelectInput(self, display, window, mask):
+        if window in self.windows:
+            self.windows[window].event_mask = mask
+        return 1
+
+    def x_XSendEvent(self, display, window, propagate, mask, event):
+        event = X.ffi.cast('XClientMessageEvent *', event)
+        if event.type != X.ClientMessage:
+            return 1
+
+        name = self.atom_names.get(event.message_type)
+        data = list(event.data.l)
+        self.client_messages.append((event.window, name, data))
+
+        handler = self.message_handlers.get(name)
+        if handler and event.window in self.windows:
+            handler(event.window, data)
+        return 1
+
+    def x_XConfigureWindow(self, display, window, mask, changes):
+        if window not in self.windows:
+            return 1
+
+        if mask & X.CWStackMode and window in self.stacking:
+            self.restack(window, changes.stack_mode == X.Above)
+
+        values = {}
+        for flag, name in ((X.CWX, 'x'), (X.CWY, 'y'), (X.CWWidth, 'width'),
+                           (X.CWHeight, 'height')):
+            if mask & flag:
+                values[name] = getattr(changes, name)
+        if values:
+            self.move_resize(window, **values)
+        return 1
+
+    def x_XGrabKey(self, display, code, modmask, window, owner, pmode, kmode):
+        self.key_grabs.add((window, code, modmask))
+        return 1
+
+    def x_XUngrabKey(self, display, code, modmask, window):
+        if code == X.AnyKey and modmask == X.AnyModifier:
+            self.key_grabs = set(r for r in self.key_grabs if r[0] != window)
+        else:
+            self.key_grabs.discard((window, code, modmask))
+        return 1
+
+    def x_XGrabKeyboard(self, display, window, owner, pmode, kmode, time):
+        self.round_trips += 1
+        if self.keyboard_grab:
+            return AlreadyGrabbed
+        self.keyboard_grab = window
+        return GrabSuccess
+
+    def x_XUngrabKeyboard(self, display, time):
+        self.keyboard_grab = None
+        return 1
+
+    def x_XGrabPointer(self, display, window, owner, mask, pmode, kmode,
+                       confine, cursor, time):
+        self.round_trips += 1
+        if self.pointer_grab:
+            return AlreadyGrabbed
+        self.pointer_grab = window
+        return GrabSuccess
+
+    def x_XUngrabPointer(self, display, time):
+        self.pointer_grab = None
+        return 1
+
+    def x_get_window_property(self, display, window, property, type=0,
+                              split=False, size=None):
+        self.round_trips += 1
+        w = self.windows.get(window)
+        prop = w and w.props.get(property)
+        if not prop or (type and type != prop[0]):
+            return None
+
+        _, fmt, value = prop
+        if fmt == 32:
+            return array('L', value)
+
+        value = value.rstrip(b'\x00')
+        return value.split(b'\x00') if split else value
+
+    def x_request_window_property(self, display, window, property, type=0,
+                                  split=False, size=None):
+        return X.Cookie(self.x_get_window_property(display, window, property,
+                                                   type, split))
+
+    def x_set_window_property(self, display, window, property, type, fmt, values):
+        if window in self.windows:
+            self._set_property(window, property, type, fmt, values)
+
+    def x_get_geometry(self, display, window):
+        self.round_trips += 1
+        w = self.windows.get(window)
+        if not w:
+            return 0, 0, 0, 0
+        return w.x, w.y, w.width, w.height
+
+    def x_request_geometry(self, display, window):
+        return X.Cookie(self.x_get_geometry(display, window))
+
+    def x_get_root_position(self, display, window):
+        self.round_trips += 1
+        x = y = 0
+        w = self.windows.get(window)
+        while w and w.id != ROOT:
+            x += w.x
+            y += w.y
+            w = self.windows.get(w.parent)
+        return x, y
+
+    def x_is_mapped(self, display, window):
+        self.round_trips += 1
+        w = self.windows.get(window)
+        return bool(w and w.mapped)
+
+    def x_get_keycode_range(self, display):
+        return 8, 8 + len(self.keysyms) - 1
+
+    def x_get_keyboard_mapping(self, display, first, count):
+        self.round_trips += 1
+        return [(self.keysyms[code - 8], ) for code in range(first, first + count)]
+
+    def x_get_modifier_mapping(self, display):
+        self.round_trips += 1
+        return [list(r) for r in self.modifiers]
+
+    def x_get_kbd_group(self, display):
+        self.round_trips += 1
+        return self.kbd_group
+
+    def x_set_kbd_group(self, display, group):
+        self.kbd_group = group
@@ -0,0 +1,218 @@
+from . import xlib as X
+
+
+class Chord(dict):
+    """Node of multi-key binding trie
+
+    Maps ``(modmask, keycode)`` of the next key to a handler or to a
+    nested chord. The root node is stored in ``key_handlers`` under the
+    first key, so only it is grabbed and dispatch stays one dict lookup
+    per key press.
+    """
+    def __init__(self):
+        dict.__init__(self)
+        self.keydefs = {}
+
+    def add(self, keys, func, keydef):
+        """Bind ``func`` to ``keys`` sequence relative to this node
+
+        Return list of ``(node, key)`` pairs on the path to handler.
+        """
+        node = self
+        trail = []
+        for key in keys[:-1]:
+            trail.append((node, key))
+            child = node.get(key)
+            if type(child) is not Chord:
+                child = node[key] = Chord()
+            node = child
+
+        key = keys[-1]
+        node[key] = func
+        node.keydefs[key] = keydef
+        trail.append((node, key))
+        return trail
+
+    @staticmethod
+    def remove(trail, func):
+        """Remove handler bound by :meth:`add` and prune empty nodes"""
+        node, key = trail[-1]
+        if node.get(key) is func:
+            del node[key]
+            node.keydefs.pop(key, None)
+
+        for node, key in reversed(trail[:-1]):
+            if node.get(key) == {}:
+                del node[key]
+
+
+class KeyBinding(object):
+    """Key binding as defined in config
+
+    Keeps keysyms so binding can be moved to new keycodes after keyboard
+    mapping change.
+    """
+    __slots__ = ('window', 'keydef', 'syms', 'func', 'keys', 'handler', 'trail')
+
+    def __init__(self, window, keydef, syms, func):
+        self.window = window
+        self.keydef = keydef
+        self.syms = syms
+        self.func = func
+        self.keys = None
+        self.handler = None
+        self.trail = None
+
+
+class Keymap(object):
+    """Keysym to keycode cache
+
+    Built from a single ``XGetKeyboardMapping`` request. Lookup follows
+    ``XKeysymToKeycode``: the lowest keycode having keysym in the earliest
+    column wins.
+    """
+    def __init__(self, dpy):
+        self.dpy = dpy
+        self.syms = {}
+        self.codes = {}
+        self.min_code, self.max_code = X.get_keycode_range(dpy)
+        self.update(self.min_code, self.max_code - self.min_code + 1)
+
+    def update(self, first, count):
+        """Refetch ``count`` keycodes starting from ``first``"""
+        mapping = X.get_keyboard_mapping(self.dpy, first, count)
+        for code, syms in enumerate(mapping, first):
+            self.syms[code] = syms
+
+        codes = {}
+        columns = max(len(r) for r in self.syms.values()) if self.syms else 0
+        order = sorted(self.syms)
+        for col in range(columns):
+            for code in order:
+                syms = self.syms[code]
+                if col < len(syms) and syms[col] and syms[col] not in codes:
+                    codes[syms[col]] = code
+        self.codes = codes
+
+    def keycode(self, sym):
+        return self.codes.get(sym)
+
+
+def lock_mask(modmap, keycodes):
+    """Return mask of modifiers bound to any of ``keycodes``
+
+    :param modmap: result of :func:`orcsome.xlib.get_modifier_mapping`
+    """
+    mask = 0
+    for i, codes in enumerate(modmap):
+        if keycodes.intersection(codes):
+            mask |= 1 << i
+    return mask
+
+
+def submasks(mask):
+    """Return all combinations of ``mask`` bits including 0"""
+    result = [0]
+    bit = 1
+    while bit <= mask:
+        if mask & bit:
+            result += [r | bit for r in result]
+        bit <<= 1
+    return result
+
+
+class GrabTable(object):
+    """Reference counted passive key grabs
+
+    Each ``(window, keycode, modmask)`` is grabbed once with all
+    combinations of ignored modifiers no matter how many bindings use it.
+    Changes are queued and sent to server by :meth:`flush`, a grab
+    released before flush costs no requests at all.
+    """
+    def __init__(self, dpy, ignored_mask=0):
+        self.dpy = dpy
+        self.ignored_masks = submasks(ignored_mask)
+        self.grabs = {}
+        self._pending = {}
+        # window -> keys present in grabs or pending
+        self._keys = {}
+
+    def grab(self, window, code, modmask):
+        key = window, code, modmask
+        count = self.grabs.get(key, 0)
+        self.grabs[key] = count + 1
+        if not count:
+            self._keys.setdefault(window, set()).add(key)
+            if self._pending.get(key) is False:
+                del self._pending[key]
+            else:
+                self._pending[key] = True
+
+    def ungrab(self, window, code, modmask):
+        key = window, code, modmask
+        count = self.grabs.get(key)
+        if not count:
+            return
+
+        if count > 1:
+            self.grabs[key] = count - 1
+            return
+
+        del self.grabs[key]
+        if self._pending.get(key):
+            del self._pending[key]
+            self._unindex(key)
+        else:
+            self._pending[key] = False
+
+    def _unindex(self, key):
+        keys = self._keys[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._keys[key[0]]
+
+    def windows(self):
+        return set(r[0] for r in self.grabs)
+
+    def forget_window(self, window):
+        """Drop grabs of destroyed window without any requests"""
+        for key in self._keys.pop(window, ()):
+            self.grabs.pop(key, None)
+            self._pending.pop(key, None)
+
+    def clear(self):
+        self.grabs.clear()
+        self._pending.clear()
+        self._keys.clear()
+
+    def set_ignored_mask(self, mask):
+        """Change ignored modifiers regrabbing all active grabs"""
+        masks = submasks(mask)
+        if masks == self.ignored_masks:
+            return
+
+        self.flush()
+        for key in self.grabs:
+            self._send(key, False)
+        self.ignored_masks = masks
+        for key in self.grabs:
+            self._send(key, True)
+
+    def flush(self):
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        for key, grab in pending.items():
+            self._send(key, grab)
+            if not grab:
+                self._unindex(key)
+
+    def _send(self, key, grab):
+        window, code, modmask = key
+        for imask in self.ignored_masks:
+            if grab:
+                X.XGrabKey(self.dpy, code, modmask | imask, window, True,
+                           X.GrabModeAsync, X.GrabModeAsync)
+            else:
+                X.XUngrabKey(self.dpy, code, modmask | imask, window)
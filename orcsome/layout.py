@@ -0,0 +1,66 @@
+"""Tiling layouts for :meth:`orcsome.wm.WM.apply_layout`
+
+Layout is a function ``layout(count, area, **options)`` returning a list
+of ``count`` ``(x, y, width, height)`` rectangles inside ``area`` which
+is ``(x, y, width, height)`` too. Any function with this signature can
+be passed to ``apply_layout``.
+"""
+
+
+def split(start, size, count):
+    """Split ``size`` into ``count`` integer parts, return (offset, size) list"""
+    result = []
+    for i in range(count):
+        a = start + size * i // count
+        b = start + size * (i + 1) // count
+        result.append((a, b - a))
+    return result
+
+
+def columns(count, area):
+    """Equal width columns"""
+    x, y, w, h = area
+    return [(cx, y, cw, h) for cx, cw in split(x, w, count)]
+
+
+def rows(count, area):
+    """Equal height rows"""
+    x, y, w, h = area
+    return [(x, cy, w, ch) for cy, ch in split(y, h, count)]
+
+
+def grid(count, area):
+    """Nearly square grid, the last row is stretched if incomplete"""
+    if not count:
+        return []
+
+    x, y, w, h = area
+    cols = 1
+    while cols * cols < count:
+        cols += 1
+    nrows = (count + cols - 1) // cols
+
+    result = []
+    for i, (ry, rh) in enumerate(split(y, h, nrows)):
+        n = min(cols, count - i * cols)
+        result.extend((cx, ry, cw, rh) for cx, cw in split(x, w, n))
+    return result
+
+
+def master_stack(count, area, ratio=0.6, masters=1):
+    """Master windows on the left, the rest stacked on the right"""
+    if count <= masters:
+        return rows(count, area)
+
+    x, y, w, h = area
+    mw = int(w * ratio)
+    return (rows(masters, (x, y, mw, h))
+            + rows(count - masters, (x + mw, y, w - mw, h)))
+
+
+LAYOUTS = {
+    'columns': columns,
+    'rows': rows,
+    'grid': grid,
+    'master_stack': master_stack,
+}
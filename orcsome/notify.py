@@ -1,11 +1,48 @@
+import logging
 from subprocess import Popen, PIPE
 
+logger = logging.getLogger(__name__)
+
 default_appname = 'orcsome'
 
+DEST = 'org.freedesktop.Notifications'
+PATH = '/org/freedesktop/Notifications'
+IFACE = 'org.freedesktop.Notifications'
+
+_connection = None
+
+
+def get_connection():
+    """Return session bus connection attached to orcsome loop
+
+    Connection is shared and reopened after failures. Returns None
+    if there is no event loop or bus is not available, notifications
+    are sent with gdbus in this case.
+    """
+    global _connection
+    if _connection is not None and not _connection.closed:
+        return _connection
+
+    import orcsome
+    loop = getattr(orcsome.get_wm(), 'loop', None)
+    if loop is None:
+        return None
 
-def notify(summary, body, timeout=-1, urgency=1, appname=None):
+    from .dbus import Connection
+    try:
+        _connection = Connection()
+    except Exception as e:
+        logger.error('Can not connect to session bus: %s', e)
+        _connection = None
+        return None
+
+    _connection.attach(loop)
+    return _connection
+
+
+def notify(summary, body, timeout=-1, urgency=1, appname=None, callback=None):
     n = Notification(summary, body, timeout, urgency, appname or default_appname)
-    n.show()
+    n.show(callback)
     return n
 
 
@@ -17,10 +54,64 @@ class Notification(object):
         self.urgency = urgency
         self.appname = appname
         self.replace_id = 0
-
-    def show(self):
+        self.callback = None
+        self._pending = False
+        self._resend = False
+        self._close = False
+
+    def show(self, callback=None):
+        """Show or update notification
+
+        Request is sent asynchronously. ``callback(notification)`` is
+        called when server replied and ``replace_id`` is known.
+        """
+        if callback:
+            self.callback = callback
+
+        conn = get_connection()
+        if conn is None:
+            self._show_gdbus()
+            if self.callback:
+                self.callback(self)
+            return
+
+        # Without replace_id an update would create a new notification
+        if self._pending:
+            self._resend = True
+            return
+
+        hints = {}
+        if self.urgency != 1:
+            hints['urgency'] = ('y', self.urgency)
+
+        self._pending = True
+        conn.call(DEST, PATH, IFACE, 'Notify', 'susssasa{sv}i',
+                  (self.appname, self.replace_id, '', self.summary, self.body,
+                   [], hints, self._timeout()), self._on_reply)
+
+    def _on_reply(self, args, error):
+        self._pending = False
+        if error:
+            logger.error('Notify failed: %s: %s', *error)
+        else:
+            self.replace_id = args[0]
+            if self.callback:
+                self.callback(self)
+
+        if self._resend:
+            self._resend = False
+            self.show()
+        elif self._close:
+            self._close = False
+            self.close()
+
+    def _timeout(self):
         timeout = int(self.timeout * 1000)
         if timeout < 0: timeout = -1
+        return timeout
+
+    def _show_gdbus(self):
+        timeout = self._timeout()
 
         urgency = '{}'
         if self.urgency != 1:
@@ -65,6 +156,15 @@ class Notification(object):
         self.show()
 
     def close(self):
+        conn = get_connection()
+        if conn is None:
+            self._close_gdbus()
+        elif self._pending:
+            self._close = True
+        elif self.replace_id:
+            conn.call(DEST, PATH, IFACE, 'CloseNotification', 'u', (self.replace_id, ))
+
+    def _close_gdbus(self):
         cmd = [
             'gdbus',
             'call',
@@ -0,0 +1,174 @@
+import os
+import errno
+import fcntl
+import shlex
+import logging
+
+from . import ev
+
+logger = logging.getLogger(__name__)
+
+SHELL_CHARS = frozenset('|&;<>()$`\\"\'*?[]#~=%{}\n')
+
+# Started processes must stay referenced until their watchers are stopped
+_running = set()
+
+
+def split_command(cmd):
+    """Return argv for ``cmd``
+
+    Plain commands are executed directly, ones using shell syntax
+    go through ``$SHELL -c``.
+    """
+    if isinstance(cmd, (list, tuple)):
+        return list(cmd)
+
+    if SHELL_CHARS.intersection(cmd):
+        return [os.environ.get('SHELL', '/bin/sh'), '-c', cmd]
+
+    return shlex.split(cmd)
+
+
+def set_nonblocking(fd):
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+
+def exit_code(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+class Process(object):
+    """Spawned child process
+
+    Child is reaped by libev child watcher, so event loop never waits
+    for it.
+
+    .. attribute:: pid
+
+    .. attribute:: returncode
+
+       Exit code, negative signal number if child was killed or
+       None while it is running.
+
+    .. attribute:: output
+
+       Captured stdout (bytes) or None if capture was not requested.
+       Complete when ``on_exit`` is called.
+    """
+    def __init__(self, loop, argv, on_exit=None, capture=False):
+        self.loop = loop
+        self.argv = argv
+        self.on_exit = on_exit
+        self.returncode = None
+        self.output = None
+        self._chunks = None
+        self._reader = None
+
+        rfd = wfd = None
+        if capture:
+            rfd, wfd = os.pipe()
+            self._chunks = []
+
+        try:
+            self.pid = self._spawn(argv, wfd, rfd)
+        except Exception:
+            if capture:
+                os.close(rfd)
+            raise
+        finally:
+            if capture:
+                os.close(wfd)
+
+        if capture:
+            set_nonblocking(rfd)
+            self._fd = rfd
+            self._reader = ev.IOWatcher(self._read, rfd, ev.EV_READ)
+            self._reader.start(loop)
+
+        self._child = ev.ChildWatcher(self._exited, self.pid)
+        self._child.start(loop)
+        _running.add(self)
+
+    def _spawn(self, argv, wfd, rfd):
+        if hasattr(os, 'posix_spawnp'):
+            actions = []
+            if wfd is not None:
+                actions = [(os.POSIX_SPAWN_DUP2, wfd, 1),
+                           (os.POSIX_SPAWN_CLOSE, wfd),
+                           (os.POSIX_SPAWN_CLOSE, rfd)]
+            return os.posix_spawnp(argv[0], argv, os.environ,
+                                   file_actions=actions, setsid=True)
+
+        pid = os.fork()
+        if pid:
+            return pid
+
+        try:
+            os.setsid()
+            if wfd is not None:
+                os.dup2(wfd, 1)
+            os.execvp(argv[0], argv)
+        finally:
+            os._exit(255)
+
+    @property
+    def running(self):
+        return self.returncode is None
+
+    def _read(self, loop, watcher, events):
+        try:
+            data = os.read(self._fd, 65536)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            raise
+
+        if data:
+            self._chunks.append(data)
+        else:
+            self._reader.stop(self.loop)
+            self._reader = None
+            os.close(self._fd)
+            self.output = b''.join(self._chunks)
+            self._chunks = None
+            self._finish()
+
+    def _exited(self, loop, watcher, events):
+        self._child.stop(self.loop)
+        self.returncode = exit_code(self._child.status)
+        self._finish()
+
+    def _finish(self):
+        if self.returncode is None or self._reader is not None:
+            return
+
+        _running.discard(self)
+        if self.on_exit:
+            try:
+                self.on_exit(self)
+            except Exception:
+                logger.exception('Error in exit callback of %s', self.argv)
+
+    def kill(self, sig=15):
+        if self.running:
+            os.kill(self.pid, sig)
+
+
+def spawn(loop, cmd, on_exit=None, capture=False):
+    """Start ``cmd`` without blocking the loop
+
+    :param cmd: command string or argv list
+    :param on_exit: ``on_exit(process)`` callback called after child
+       exit (and stdout EOF if captured)
+    :param capture: collect child stdout into ``process.output``
+
+    Return :class:`Process` or None if command can't be started.
+    """
+    try:
+        return Process(loop, split_command(cmd), on_exit, capture)
+    except OSError:
+        logger.exception('Failed to spawn %s', cmd)
+        return None
@@ -0,0 +1,441 @@
+"""X event recording and offline replay
+
+:class:`Recorder` writes a compact binary log of X events received by
+:class:`orcsome.wm.WM` together with replies to requests made by handlers.
+:class:`ReplayDisplay` serves the log back through patched
+:mod:`orcsome.xlib` functions, so a session from a real desktop can be
+replayed without X server: deterministically, as fast as handlers run and
+under a profiler::
+
+   orcsome --record session.log
+   python -m bench replay session.log --profile
+
+Log starts with :data:`MAGIC` followed by records: :data:`HEADER`
+(kind, seconds since start, payload size) and payload.
+"""
+import os
+import struct
+import pickle
+from collections import deque
+
+try:
+    from time import perf_counter
+except ImportError:
+    from time import time as perf_counter
+
+from . import ev, xlib as X
+from .utils import bstr, nstr
+
+MAGIC = b'ORCSREC1'
+HEADER = struct.Struct('<BdI')
+COUNT = struct.Struct('<I')
+
+#: Record kinds
+ATOMS = 1    # pickled list of (name, atom)
+PENDING = 2  # XPending result, marks queue drains
+EVENT = 3    # raw XEvent with trailing zeros stripped
+REPLY = 4    # pickled (function, key, value)
+
+EVENT_SIZE = X.ffi.sizeof('XEvent')
+
+#: Xlib functions working without server connection
+CLIENT_SIDE = ('XStringToKeysym', 'XKeysymToString', 'XGetErrorText')
+
+
+# Window wrappers carry WM reference so keys are made of plain ints
+
+def _property_key(window, property, type=0, split=False, size=None):
+    return int(window), int(property), int(type), bool(split)
+
+
+def _window_key(window):
+    return int(window),
+
+
+def _mapping_key(first, count):
+    return first, count
+
+
+def _no_key(*args):
+    return ()
+
+
+#: Functions replies of which are recorded, mapped to functions making
+#: a lookup key from call arguments except display
+REPLIES = {
+    'get_window_property': _property_key,
+    'get_geometry': _window_key,
+    'get_root_position': _window_key,
+    'is_mapped': _window_key,
+    'get_keycode_range': _no_key,
+    'get_keyboard_mapping': _mapping_key,
+    'get_modifier_mapping': _no_key,
+    'get_kbd_group': _no_key,
+    'DefaultRootWindow': _no_key,
+    'XGrabKeyboard': _no_key,
+    'XGrabPointer': _no_key,
+}
+
+#: Asynchronous requests and functions their replies are recorded as
+REQUESTS = {
+    'request_window_property': 'get_window_property',
+    'request_geometry': 'get_geometry',
+}
+
+#: Replay values for requests missing in log
+DEFAULTS = {
+    'get_geometry': (0, 0, 0, 0),
+    'get_root_position': (0, 0),
+    'is_mapped': False,
+    'get_keycode_range': (8, 8),
+    'get_keyboard_mapping': [],
+    'get_modifier_mapping': [[] for _ in range(8)],
+    'get_kbd_group': 0,
+    'DefaultRootWindow': 1,
+    'XGrabKeyboard': 0,
+    'XGrabPointer': 0,
+}
+
+
+def read_log(path):
+    """Yield (kind, time, payload) records of log file"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError('{} is not an orcsome event log'.format(path))
+
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                break
+
+            kind, t, size = HEADER.unpack(header)
+            yield kind, t, f.read(size)
+
+
+class RecordedCookie(object):
+    __slots__ = ('cookie', 'recorder', 'name', 'key')
+
+    def __init__(self, cookie, recorder, name, key):
+        self.cookie = cookie
+        self.recorder = recorder
+        self.name = name
+        self.key = key
+
+    def reply(self):
+        value = self.cookie.reply()
+        self.recorder.dump(REPLY, (self.name, self.key, value))
+        return value
+
+
+class Recorder(object):
+    """Writes events and replies passing through :mod:`orcsome.xlib`
+
+    Must be installed before WM is created and after request backend is
+    selected, so startup requests are recorded too.
+    """
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.start = perf_counter()
+        self._saved = {}
+
+    def write(self, kind, payload):
+        self.file.write(HEADER.pack(kind, perf_counter() - self.start, len(payload)))
+        self.file.write(payload)
+
+    def dump(self, kind, value):
+        self.write(kind, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+    def install(self):
+        funcs = {name: self._reply_wrapper(name, key)
+                 for name, key in REPLIES.items()}
+
+        # Xlib requests are made through get_* functions recorded above
+        if X.backend != 'xlib':
+            for name, reply_name in REQUESTS.items():
+                funcs[name] = self._request_wrapper(name, reply_name)
+
+        funcs.update(XPending=self._pending, XNextEvent=self._next_event,
+                     XInternAtom=self._intern_atom, XInternAtoms=self._intern_atoms,
+                     XGetAtomNames=self._get_atom_names)
+
+        for name, func in funcs.items():
+            self._saved[name] = getattr(X, name)
+            setattr(X, name, func)
+
+    def uninstall(self):
+        for name, func in self._saved.items():
+            setattr(X, name, func)
+        self._saved.clear()
+
+    def close(self):
+        self.uninstall()
+        self.file.close()
+
+    def _reply_wrapper(self, name, keyfunc):
+        func = getattr(X, name)
+        def wrapper(display, *args, **kwargs):
+            result = func(display, *args, **kwargs)
+            self.dump(REPLY, (name, keyfunc(*args, **kwargs), result))
+            return result
+        return wrapper
+
+    def _request_wrapper(self, name, reply_name):
+        func = getattr(X, name)
+        keyfunc = REPLIES[reply_name]
+        def wrapper(display, *args, **kwargs):
+            return RecordedCookie(func(display, *args, **kwargs), self,
+                                  reply_name, keyfunc(*args, **kwargs))
+        return wrapper
+
+    def _pending(self, display):
+        result = self._saved['XPending'](display)
+        self.write(PENDING, COUNT.pack(result))
+        return result
+
+    def _next_event(self, display, event):
+        result = self._saved['XNextEvent'](display, event)
+        self.write(EVENT, X.ffi.buffer(event)[:].rstrip(b'\x00'))
+        return result
+
+    def _intern_atom(self, display, name, only_if_exists):
+        atom = self._saved['XInternAtom'](display, name, only_if_exists)
+        if atom:
+            self.dump(ATOMS, [(nstr(name), atom)])
+        return atom
+
+    def _intern_atoms(self, display, names, count, only_if_exists, atoms):
+        result = self._saved['XInternAtoms'](display, names, count,
+                                             only_if_exists, atoms)
+        self.dump(ATOMS, [(nstr(X.ffi.string(names[i])), atoms[i])
+                          for i in range(count) if atoms[i]])
+        return result
+
+    def _get_atom_names(self, display, atoms, count, names):
+        result = self._saved['XGetAtomNames'](display, atoms, count, names)
+        if result:
+            self.dump(ATOMS, [(nstr(X.ffi.string(names[i])), atoms[i])
+                              for i in range(count)])
+        return result
+
+
+class StubDisplay(object):
+    """Base of displays replacing :mod:`orcsome.xlib` functions
+
+    While installed every Xlib function talking to server is a no-op
+    unless the display has ``x_<name>`` method for it. Atoms are interned
+    in memory, ``round_trips`` counts requests waiting for reply.
+    """
+    def __init__(self, atoms=None):
+        self.atoms = dict(atoms or {})
+        self.atom_names = {v: k for k, v in self.atoms.items()}
+        self._next_atom = max(self.atom_names or [0]) + 1
+        self.round_trips = 0
+
+        self._strings = []
+        self._pipe = None
+        self._saved = {}
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, *exc):
+        self.uninstall()
+
+    def functions(self):
+        """Return replacements of :mod:`orcsome.xlib` functions by name"""
+        funcs = {name: self._noop for name in dir(X.lib)
+                 if callable(getattr(X.lib, name)) and name not in CLIENT_SIDE}
+
+        for name in dir(self):
+            if name.startswith('x_'):
+                funcs[name[2:]] = getattr(self, name)
+        return funcs
+
+    def install(self):
+        """Replace :mod:`orcsome.xlib` functions with this display"""
+        for name, func in self.functions().items():
+            self._saved[name] = getattr(X, name)
+            setattr(X, name, func)
+
+    def uninstall(self):
+        for name, func in self._saved.items():
+            setattr(X, name, func)
+        self._saved.clear()
+
+        if self._pipe:
+            for fd in self._pipe:
+                os.close(fd)
+            self._pipe = None
+
+    def intern(self, name, only_if_exists=False):
+        try:
+            return self.atoms[name]
+        except KeyError:
+            pass
+
+        if only_if_exists:
+            return 0
+
+        atom = self.atoms[name] = self._next_atom
+        self.atom_names[atom] = name
+        self._next_atom += 1
+        return atom
+
+    # Patched xlib functions, names without x_ prefix
+
+    def _noop(self, *args):
+        return 0
+
+    def x_XOpenDisplay(self, name):
+        return X.ffi.cast('Display *', 1)
+
+    def x_ConnectionNumber(self, display):
+        # WM starts io watcher on it, the pipe is never readable
+        if not self._pipe:
+            self._pipe = os.pipe()
+        return self._pipe[0]
+
+    def x_XInternAtom(self, display, name, only_if_exists):
+        self.round_trips += 1
+        return self.intern(nstr(name), only_if_exists)
+
+    def x_XInternAtoms(self, display, names, count, only_if_exists, atoms):
+        self.round_trips += 1
+        for i in range(count):
+            atoms[i] = self.intern(nstr(X.ffi.string(names[i])), only_if_exists)
+        return 1
+
+    def x_XGetAtomNames(self, display, atoms, count, names):
+        self.round_trips += 1
+        if not all(atoms[i] in self.atom_names for i in range(count)):
+            return 0
+
+        for i in range(count):
+            s = X.ffi.new('char[]', bstr(self.atom_names[atoms[i]]))
+            self._strings.append(s)
+            names[i] = s
+        return 1
+
+
+class ReplayDisplay(StubDisplay):
+    """In-memory display serving recorded log
+
+    Xlib functions talking to server are replaced: requests without reply
+    become no-ops, replies and events come from the log. Replies are
+    matched by request arguments in recorded order, the last one is
+    repeated if handlers ask more often than during recording. Timers are
+    not fired.
+    """
+    def __init__(self, path):
+        StubDisplay.__init__(self)
+        self.pending = deque()
+        self.events = deque()
+        self.replies = {}
+        self.duration = 0.0
+
+        for kind, t, payload in read_log(path):
+            if kind == EVENT:
+                self.events.append(payload.ljust(EVENT_SIZE, b'\x00'))
+            elif kind == PENDING:
+                self.pending.append((t, COUNT.unpack(payload)[0]))
+            elif kind == REPLY:
+                name, key, value = pickle.loads(payload)
+                self.replies.setdefault((name, key), deque()).append(value)
+            elif kind == ATOMS:
+                for name, atom in pickle.loads(payload):
+                    self.atoms[name] = atom
+                    self.atom_names[atom] = name
+            self.duration = t
+
+        self.time = 0.0
+        self.events_replayed = 0
+        self._next_atom = max(self.atom_names or [0]) + 1
+
+    def functions(self):
+        funcs = StubDisplay.functions(self)
+        for name in REPLIES:
+            funcs[name] = self._reply_func(name)
+        return funcs
+
+    def feed(self, wm):
+        """Dispatch all recorded events through ``wm`` event callback"""
+        while self.pending:
+            wm._xevent_cb(wm.loop, wm.xevent_watcher, ev.EV_READ)
+
+    def reply(self, name, key):
+        values = self.replies.get((name, key))
+        if not values:
+            return DEFAULTS.get(name)
+
+        return values.popleft() if len(values) > 1 else values[0]
+
+    def _reply_func(self, name):
+        keyfunc = REPLIES[name]
+        def func(display, *args, **kwargs):
+            return self.reply(name, keyfunc(*args, **kwargs))
+        return func
+
+    def x_request_window_property(self, display, *args, **kwargs):
+        return X.Cookie(self.reply('get_window_property',
+                                   _property_key(*args, **kwargs)))
+
+    def x_request_geometry(self, display, window):
+        return X.Cookie(self.reply('get_geometry', _window_key(window)))
+
+    def x_XPending(self, display):
+        if not self.pending:
+            return 0
+
+        self.time, count = self.pending.popleft()
+        return count
+
+    def x_XNextEvent(self, display, event):
+        X.ffi.memmove(event, self.events.popleft(), EVENT_SIZE)
+        self.events_replayed += 1
+        return 0
+
+
+def replay(path, config=None, coalesce=False, profile=None):
+    """Replay log through a fresh WM and return timing summary
+
+    :param config: orcsome config to load before replay
+    :param coalesce: replay with event coalescing
+    :param profile: ``cProfile.Profile`` to run replay under
+    """
+    from .wm import WM
+    from .actions import Actions
+    from .run import exec_config
+    import orcsome
+
+    display = ReplayDisplay(path)
+    display.install()
+    try:
+        loop = ev.Loop()
+        wm = WM(loop)
+        wm.mix(Actions)
+        wm.coalesce_events = coalesce
+        orcsome._wm = wm
+        if config:
+            with wm.batch():
+                exec_config(wm, config)
+        wm.init()
+
+        start = perf_counter()
+        if profile:
+            profile.runcall(display.feed, wm)
+        else:
+            display.feed(wm)
+        elapsed = perf_counter() - start
+
+        wm.stop(True)
+    finally:
+        display.uninstall()
+
+    return {
+        'events': display.events_replayed,
+        'dispatched': wm.events_dispatched,
+        'recorded_sec': display.duration,
+        'replay_sec': elapsed,
+    }
@@ -0,0 +1,184 @@
+import re
+from operator import attrgetter
+
+from .utils import match_string, ntype
+
+INDEXED_KEYS = ('cls', 'name', 'role')
+REGEX_KEYS = ('cls', 'name', 'role', 'title')
+REGEX_CHARS = frozenset('.^$*+?{}[]\\|()')
+
+get_seq = attrgetter('seq')
+
+
+def is_literal(pattern):
+    return type(pattern) is ntype and not REGEX_CHARS.intersection(pattern)
+
+
+def merge_patterns(patterns):
+    """Return regex having a group per pattern, set if the pattern matches
+
+    Each pattern is an optional lookahead at the start of value, so one
+    ``match`` call tells all matching patterns.
+    """
+    return re.compile(''.join('(?:(?=({})))?'.format(p) for p in patterns))
+
+
+class Rule(object):
+    __slots__ = ('seq', 'func', 'matchers', 'rest', 'ignore_startup', 'removed')
+
+    def __init__(self, seq, func, matchers, ignore_startup):
+        self.seq = seq
+        self.func = func
+        self.matchers = matchers
+        self.rest = matchers
+        self.ignore_startup = ignore_startup
+        self.removed = False
+
+
+class RuleIndex(object):
+    """Dispatch index of on_create/on_manage handlers
+
+    Matchers are kept as data. Each rule is indexed by one of its
+    matchers:
+
+    * literal ``cls``/``name``/``role`` values go to hash buckets.
+      Matching uses ``re.match`` so a literal is a prefix match and
+      buckets are probed with value prefixes of known literal lengths.
+    * regexes of a key are merged into a single one (see
+      :func:`merge_patterns`), patterns with own groups or ones failing
+      to merge are matched separately.
+    * rules without string matchers are always candidates.
+
+    Only candidates check their remaining matchers. Window properties are
+    cached on :class:`~orcsome.wrappers.Window` so each is fetched once.
+    """
+    def __init__(self):
+        self.rules = []
+        self._seq = 0
+        self._index = None
+
+    def add(self, func, matchers, ignore_startup=False):
+        self._seq += 1
+        rule = Rule(self._seq, func, matchers, ignore_startup)
+        self.rules.append(rule)
+        self._index = None
+        return rule
+
+    def remove(self, rule):
+        rule.removed = True
+        self.rules.remove(rule)
+        self._index = None
+
+    def discard(self, rules):
+        """Remove several rules at once"""
+        rules = set(rules)
+        for rule in rules:
+            rule.removed = True
+        self.rules[:] = [r for r in self.rules if r not in rules]
+        self._index = None
+
+    def clear(self):
+        for rule in self.rules:
+            rule.removed = True
+        self.rules[:] = []
+        self._index = None
+
+    def __contains__(self, func):
+        return any(r.func == func for r in self.rules)
+
+    def __len__(self):
+        return len(self.rules)
+
+    @property
+    def keys(self):
+        """Matcher names used by any rule"""
+        result = set()
+        for r in self.rules:
+            result.update(r.matchers)
+        return result
+
+    def _build(self):
+        always = []
+        literals = {}
+        regexes = {}
+        for rule in self.rules:
+            m = rule.matchers
+            rule.rest = m
+            for key in INDEXED_KEYS:
+                if m.get(key) and is_literal(m[key]):
+                    literals.setdefault(key, {}).setdefault(m[key], []).append(rule)
+                    break
+            else:
+                for key in REGEX_KEYS:
+                    if m.get(key):
+                        regexes.setdefault(key, {}).setdefault(m[key], []).append(rule)
+                        break
+                else:
+                    always.append(rule)
+                    continue
+
+            rule.rest = dict(m)
+            del rule.rest[key]
+
+        literals = [(key, buckets, sorted(set(len(r) for r in buckets)))
+                    for key, buckets in literals.items()]
+
+        merged = []
+        single = []
+        for key, patterns in regexes.items():
+            simple = [p for p in patterns
+                      if type(p) is ntype and not re.compile(p).groups]
+            if len(simple) > 1:
+                try:
+                    merged.append((key, merge_patterns(simple),
+                                   [patterns[p] for p in simple]))
+                except re.error:
+                    simple = []
+            else:
+                simple = []
+
+            simple = set(simple)
+            single.extend((key, p, rules) for p, rules in patterns.items()
+                          if p not in simple)
+
+        self._index = always, literals, merged, single
+        return self._index
+
+    def match(self, window, startup=False):
+        """Return rules matching ``window`` in registration order
+
+        Rules with ``ignore_startup`` are skipped if ``startup`` is true.
+        """
+        always, literals, merged, single = self._index or self._build()
+
+        candidates = list(always)
+        for key, buckets, lengths in literals:
+            value = getattr(window, key)
+            if not value:
+                continue
+
+            for l in lengths:
+                if l > len(value):
+                    break
+
+                rules = buckets.get(value[:l])
+                if rules:
+                    candidates.extend(rules)
+
+        for key, regex, groups in merged:
+            value = getattr(window, key)
+            if value is None:
+                continue
+
+            for rules, g in zip(groups, regex.match(value).groups()):
+                if g is not None:
+                    candidates.extend(rules)
+
+        for key, pattern, rules in single:
+            if match_string(pattern, getattr(window, key)):
+                candidates.extend(rules)
+
+        candidates.sort(key=get_seq)
+        return [r for r in candidates
+                if not (startup and r.ignore_startup)
+                and (not r.rest or window.matches(**r.rest))]
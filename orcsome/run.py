@@ -1,11 +1,13 @@
+import re
 import sys
 import signal
 import os.path
 import logging
 import argparse
 import runpy
+from time import time
 
-from . import VERSION, ev
+from . import VERSION, ev, xlib
 from .wm import WM
 from .actions import Actions
 from .testwm import TestWM
@@ -13,18 +15,38 @@ from .testwm import TestWM
 logger = logging.getLogger(__name__)
 
 
-def load_config(wm, config):
+ATOM_NAME_REGEX = re.compile(r'''['"]((?:_|WM_)[A-Z][A-Z0-9_]*)['"]''')
+
+def find_config_atoms(config):
+    try:
+        with open(config) as f:
+            return ATOM_NAME_REGEX.findall(f.read())
+    except IOError:
+        return []
+
+
+def exec_config(wm, config):
     import orcsome
     orcsome._wm = wm
 
+    wm.atom.prefetch(find_config_atoms(config), only_if_exists=True)
+
     sys.path.insert(0, os.path.dirname(config))
+    loading, wm.loading_config = wm.loading_config, True
     try:
         runpy.run_path(config)
+    finally:
+        wm.loading_config = loading
+        sys.path.pop(0)
+
+
+def load_config(wm, config):
+    try:
+        with wm.batch():
+            exec_config(wm, config)
     except:
         logger.exception('Error on loading %s' % config)
         sys.exit(1)
-    finally:
-        sys.path.pop(0)
 
 
 def check_config(config):
@@ -54,6 +76,18 @@ def run():
         help='Path to log file (log to stdout by default)')
     parser.add_argument('--log-level', metavar='LOGLEVEL', default='INFO',
         help='log level, default is INFO')
+    parser.add_argument('--backend', choices=xlib.BACKENDS, default='xlib',
+        help='X request backend, default is xlib')
+    parser.add_argument('--ev-backend', choices=sorted(ev.BACKENDS), default='select',
+        help='libev backend, default is select')
+    parser.add_argument('--coalesce-events', action='store_true',
+        help='collapse redundant X events arriving together')
+    parser.add_argument('--stats', action='store_true',
+        help='collect handler timings, dumped to log on SIGUSR1')
+    parser.add_argument('--handler-budget', metavar='MS', type=float,
+        help='log handler calls longer than MS milliseconds (implies --stats)')
+    parser.add_argument('--record', metavar='FILE',
+        help='write received X events and replies to FILE for replay')
 
     config_dir = os.getenv('XDG_CONFIG_HOME', os.path.expanduser('~/.config'))
     default_rcfile = os.path.join(config_dir, 'orcsome', 'rc.py')
@@ -73,7 +107,15 @@ def run():
         "%(asctime)s %(name)s %(levelname)s: %(message)s"))
     root_logger.addHandler(handler)
 
-    loop = ev.Loop()
+    xlib.use_backend(args.backend)
+
+    recorder = None
+    if args.record:
+        from .record import Recorder
+        recorder = Recorder(args.record)
+        recorder.install()
+
+    loop = ev.Loop(args.ev_backend)
     wm = WM(loop)
     wm.mix(Actions)
 
@@ -84,15 +126,36 @@ def run():
     sigint = ev.SignalWatcher(stop, signal.SIGINT)
     sigint.start(loop)
 
-    def on_restart():
+    wm.coalesce_events = args.coalesce_events
+
+    if args.stats or args.handler_budget is not None:
+        budget = args.handler_budget
+        wm.enable_stats(budget / 1000.0 if budget is not None else None)
+
+    sigusr1 = ev.SignalWatcher(lambda l, w, e: wm.dump_stats(), signal.SIGUSR1)
+    sigusr1.start(loop)
+
+    def on_restart(incremental=False):
+        start = time()
+        if incremental:
+            logger.info('Reloading...')
+            if wm.reload_config(lambda: exec_config(wm, args.config)):
+                logger.info('Reloaded in %.1f ms', (time() - start) * 1000)
+            return
+
         if check_config(args.config):
             wm.stop()
             logger.info('Restarting...')
             load_config(wm, args.config)
             wm.init()
+            logger.info('Restarted in %.1f ms', (time() - start) * 1000)
 
     wm.restart_handler = on_restart
 
     load_config(wm, args.config)
     wm.init()
-    loop.run()
+    try:
+        loop.run()
+    finally:
+        if recorder:
+            recorder.close()
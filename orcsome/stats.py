@@ -0,0 +1,116 @@
+import logging
+
+try:
+    from time import perf_counter
+except ImportError:
+    from time import time as perf_counter
+
+logger = logging.getLogger(__name__)
+
+#: Histogram bucket ``i`` holds calls which took less than 2**i microseconds
+BUCKETS = 24
+
+
+def func_name(func):
+    name = getattr(func, '__qualname__', None) or getattr(func, '__name__', None)
+    if not name:
+        return repr(func)
+
+    module = getattr(func, '__module__', None)
+    return '{}.{}'.format(module, name) if module else name
+
+
+def format_binding(binding):
+    if isinstance(binding, dict):
+        return ', '.join('{}={!r}'.format(k, v) for k, v in sorted(binding.items()))
+    return '{}'.format(binding)
+
+
+class Record(object):
+    __slots__ = ('count', 'total', 'max', 'hist')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.hist = [0] * BUCKETS
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        self.hist[min(BUCKETS - 1, int(elapsed * 1e6).bit_length())] += 1
+
+    def percentile(self, p):
+        """Return upper bound of bucket holding ``p`` percentile in seconds"""
+        limit = self.count * p / 100.0
+        seen = 0
+        for i, n in enumerate(self.hist):
+            seen += n
+            if seen >= limit:
+                return (1 << i) / 1e6
+        return self.max
+
+
+class HandlerStats(object):
+    """Call counts and latency histograms of handlers
+
+    Records are keyed by handler kind (key, create, destroy, property,
+    timer, event), function qualname and binding (keydef, matchers,
+    atom name, ...). Calls longer than ``budget`` seconds are logged.
+    """
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.records = {}
+
+    def call(self, kind, binding, func, *args):
+        start = perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = perf_counter() - start
+            name = func_name(func)
+            if type(binding) is dict:
+                binding = format_binding(binding)
+
+            key = kind, name, binding
+            try:
+                record = self.records[key]
+            except KeyError:
+                record = self.records[key] = Record()
+
+            record.add(elapsed)
+            if self.budget is not None and elapsed > self.budget:
+                logger.warning('Slow %s handler %s [%s]: %.1f ms', kind, name,
+                               binding, elapsed * 1000)
+
+    def reset(self):
+        self.records.clear()
+
+    def report(self):
+        """Return list of per handler stats sorted by total time"""
+        result = []
+        for (kind, name, binding), r in self.records.items():
+            result.append({
+                'kind': kind,
+                'handler': name,
+                'binding': binding,
+                'count': r.count,
+                'total_ms': r.total * 1000,
+                'avg_us': r.total / r.count * 1e6,
+                'p50_us': r.percentile(50) * 1e6,
+                'p99_us': r.percentile(99) * 1e6,
+                'max_us': r.max * 1e6,
+                'histogram': r.hist,
+            })
+        result.sort(key=lambda r: r['total_ms'], reverse=True)
+        return result
+
+    def dump(self, log=logger.info):
+        log('Handler stats: %d handlers', len(self.records))
+        for r in self.report():
+            log('%8s %s [%s]: %d calls, total %.1f ms, avg %.0f us, '
+                'p50 < %.0f us, p99 < %.0f us, max %.0f us', r['kind'],
+                r['handler'], r['binding'], r['count'], r['total_ms'],
+                r['avg_us'], r['p50_us'], r['p99_us'], r['max_us'])
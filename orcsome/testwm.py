@@ -1,14 +1,25 @@
-from .utils import ActionCaller, Mixable
+from contextlib import contextmanager
+
+from . import ev
+from .utils import ActionCaller, Mixable, cached_property, ntype, utype
+from .layout import LAYOUTS
+from .stats import HandlerStats
 
 idfunc = lambda func: func
 
 
 class TestWM(Mixable):
+    loading_config = False
+
+    @cached_property
+    def loop(self):
+        return ev.Loop()
+
     def on_key(self, key):
-        assert isinstance(key, basestring), 'First argument to on_key must be string'
+        assert isinstance(key, (ntype, utype)), 'First argument to on_key must be string'
         return ActionCaller(self, idfunc)
 
-    def on_timer(self, period, start=True):
+    def on_timer(self, timeout, start=True, first_timeout=None, window=None):
         return ActionCaller(self, idfunc)
 
     def on_create(self, *args, **matchers):
@@ -40,7 +51,7 @@ class TestWM(Mixable):
         return ActionCaller(self, idfunc)
 
     def on_property_change(self, *args):
-        assert all(isinstance(r, basestring) for r in args)
+        assert all(isinstance(r, (ntype, utype)) for r in args)
         return ActionCaller(self, idfunc)
 
     def on_destroy(self, window):
@@ -54,3 +65,15 @@ class TestWM(Mixable):
 
     def close_window(self, window=None):
         pass
+
+    @contextmanager
+    def batch(self):
+        yield
+
+    def apply_layout(self, layout, windows=None, desktop=None, **options):
+        assert callable(layout) or layout in LAYOUTS, \
+            'Unknown layout {}, must be one of {}'.format(layout, sorted(LAYOUTS))
+        return []
+
+    def enable_stats(self, budget=None):
+        return HandlerStats(budget)
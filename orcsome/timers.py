@@ -0,0 +1,186 @@
+import logging
+from heapq import heappush, heappop, heapify
+
+try:
+    from time import monotonic
+except ImportError:
+    from time import time as monotonic
+
+from . import ev
+
+logger = logging.getLogger(__name__)
+
+
+class Timer(object):
+    """Cancellable timer handle
+
+    Mirrors libev timer semantics: ``after`` is the first timeout,
+    ``repeat`` is the period, zero ``repeat`` makes a one shot timer.
+    Due times are monotonic like libev timers, ``next_stop`` is the wall
+    clock due time used by :meth:`overdue`.
+    """
+    __slots__ = ('service', 'callback', 'after', 'repeat', 'when',
+                 'next_stop', 'active', 'seq')
+
+    def __init__(self, service, callback, after, repeat=0.0):
+        self.service = service
+        self.callback = callback
+        self.after = after
+        self.repeat = repeat
+        self.when = None
+        self.next_stop = None
+        self.active = False
+        self.seq = 0
+
+    def start(self, after=None, repeat=None):
+        """(Re)start timer, optionally changing ``after`` and ``repeat``"""
+        if after is not None:
+            self.after = after
+        if repeat is not None:
+            self.repeat = repeat
+
+        self.service.schedule(self, self.service.now() + self.after)
+
+    def stop(self):
+        if self.active:
+            self.service.unschedule(self)
+
+    def again(self):
+        """Restart with ``repeat`` timeout from now, stop one shot timer"""
+        if self.repeat:
+            self.service.schedule(self, self.service.now() + self.repeat)
+        else:
+            self.stop()
+
+    def remaining(self):
+        if self.when is None:
+            return 0.0
+        return self.when - self.service.now()
+
+    def overdue(self, timeout):
+        """Return True if timer was not fired ``timeout`` seconds after due time
+
+        Useful to detect suspend/resume.
+        """
+        return self.next_stop is not None and \
+            self.service.time() > self.next_stop + timeout
+
+    def cancel(self):
+        """Stop timer and release callback"""
+        self.stop()
+        self.callback = None
+
+
+class TimerService(object):
+    """Timers multiplexed on a single libev timer
+
+    Pending timers live in a binary heap ordered by due time. Stopped
+    timers are removed lazily, the heap is compacted when stale entries
+    prevail.
+
+    Due times are taken from a monotonic clock, so wall clock jumps do not
+    shift timers.
+    """
+    def __init__(self, loop):
+        self.loop = loop
+        self._heap = []
+        self._stale = 0
+        self._seq = 0
+        self._armed = None
+        self._firing = None
+        self._watcher = ev.TimerWatcher(self._expired, 0.0)
+
+    def now(self):
+        return monotonic()
+
+    def time(self):
+        """Wall clock time, the loop's cached ``ev_now``"""
+        return self.loop.now()
+
+    def __len__(self):
+        return len(self._heap) - self._stale
+
+    def add(self, callback, after, repeat=0.0, start=True):
+        timer = Timer(self, callback, after, repeat)
+        if start:
+            timer.start()
+        return timer
+
+    def schedule(self, timer, when):
+        if timer.seq:
+            self._stale += 1
+
+        now = self.now()
+        self._seq += 1
+        timer.seq = self._seq
+        timer.when = when
+        timer.next_stop = self.time() + (when - now)
+        timer.active = True
+        heappush(self._heap, (when, timer.seq, timer))
+        self._arm()
+
+    def unschedule(self, timer):
+        timer.active = False
+        if not timer.seq:
+            return
+
+        timer.seq = 0
+        self._stale += 1
+        if self._stale > 64 and self._stale * 2 > len(self._heap):
+            self._heap[:] = [r for r in self._heap if r[1] == r[2].seq]
+            heapify(self._heap)
+            self._stale = 0
+
+    def clear(self):
+        for _, seq, timer in self._heap:
+            if seq == timer.seq:
+                timer.active = False
+                timer.seq = 0
+        if self._firing:
+            self._firing.active = False
+        self._heap[:] = []
+        self._stale = 0
+        self._watcher.stop(self.loop)
+        self._armed = None
+
+    def _arm(self):
+        heap = self._heap
+        if not heap or heap[0][0] == self._armed:
+            return
+
+        self._armed = heap[0][0]
+        self._watcher.stop(self.loop)
+        self._watcher.start(self.loop, max(0.0, self._armed - self.now()))
+
+    def _expired(self, loop, watcher, events):
+        self._armed = None
+        now = self.now()
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            when, seq, timer = heappop(heap)
+            if seq != timer.seq:
+                self._stale -= 1
+                continue
+
+            # Timer stays active out of heap while callback runs, so
+            # ``overdue`` sees the fired due time and ``stop``/``again``
+            # from callback take effect.
+            timer.seq = 0
+            self._firing = timer
+            try:
+                if timer.callback(timer):
+                    timer.stop()
+            except Exception:
+                logger.exception('Error in timer %r', timer.callback)
+            self._firing = None
+
+            if timer.active and not timer.seq:
+                if timer.repeat:
+                    next_when = when + timer.repeat
+                    if next_when <= now:
+                        next_when = now + timer.repeat
+                    self.schedule(timer, next_when)
+                else:
+                    timer.active = False
+
+        self._arm()
@@ -1,5 +1,6 @@
 import os
 import re
+from collections import OrderedDict
 
 btype = type(b'')
 ntype = type('')
@@ -49,7 +50,96 @@ def match_string(pattern, data):
     return r.match(data)
 
 
+SIMPLE_TYPES = (int, float, bool, btype, utype, type(None))
+
+
+def code_signature(code):
+    consts = tuple(code_signature(r) if hasattr(r, 'co_code') else r
+                   for r in code.co_consts)
+    return code.co_name, code.co_code, consts, code.co_names
+
+
+def func_signature(func, depth=3):
+    """Return hashable description of function behaviour
+
+    Made of code, closure values and simple global values, so handlers
+    created by two runs of the same config compare equal. Unknown objects
+    are compared by identity, which makes signatures conservative.
+    """
+    method = getattr(func, '__func__', None)
+    if method is not None:
+        return 'method', id(func.__self__), func_signature(method, depth)
+
+    code = getattr(func, '__code__', None)
+    if code is None:
+        return 'object', id(func)
+
+    if depth <= 0:
+        return 'func', code_signature(code)
+
+    cells = []
+    for cell in func.__closure__ or ():
+        try:
+            value = cell.cell_contents
+        except ValueError:
+            value = None
+        cells.append(value_signature(value, depth - 1))
+
+    gvalues = func.__globals__
+    names = tuple((r, gvalues[r]) for r in code.co_names
+                  if r in gvalues and type(gvalues[r]) in SIMPLE_TYPES)
+
+    return 'func', code_signature(code), tuple(cells), names, \
+        value_signature(func.__defaults__, depth - 1)
+
+
+def value_signature(value, depth=3):
+    if type(value) in SIMPLE_TYPES:
+        return value
+    if type(value) in (tuple, list):
+        return type(value).__name__, tuple(value_signature(r, depth) for r in value)
+    if type(value) is dict:
+        return 'dict', tuple(sorted((repr(k), value_signature(v, depth))
+                                    for k, v in value.items()))
+    if callable(value):
+        return func_signature(value, depth)
+    return 'object', id(value)
+
+
+class MRU(object):
+    """Most recently used ordered set
+
+    :meth:`touch` and :meth:`discard` are O(1). Iteration goes from the
+    most recent item.
+    """
+    def __init__(self):
+        self._items = OrderedDict()
+
+    def touch(self, item):
+        self._items.pop(item, None)
+        self._items[item] = None
+
+    def discard(self, item):
+        self._items.pop(item, None)
+
+    def clear(self):
+        self._items.clear()
+
+    def __iter__(self):
+        return reversed(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item):
+        return item in self._items
+
+
 def spawn(cmd):
+    """Run shell command detached, blocks until intermediate child exits
+
+    Use :func:`orcsome.process.spawn` inside event loop.
+    """
     pid = os.fork()
     if pid != 0:
         os.waitpid(pid, 0)
@@ -88,7 +178,14 @@ class ActionCaller(object):
     def __getattr__(self, name):
         func = getattr(self.obj, name)
         def result(*args, **kwargs):
-            return self.decorator(lambda: func(*args, **kwargs))
+            # Action result is dropped: handler return values have
+            # meaning (timer stop) and actions may return handles.
+            def action():
+                func(*args, **kwargs)
+            action.__name__ = action.__qualname__ = name
+            # Stats report actions by config-level name
+            action.__module__ = None
+            return self.decorator(action)
 
         return result
 
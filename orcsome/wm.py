@@ -1,10 +1,18 @@
 import os
 import logging
+from time import time
+from array import array
+from contextlib import contextmanager
 
 from . import xlib as X, ev
-from .wrappers import Window
+from .wrappers import Window, PROPERTY_ATTRS, ATTR_REQUESTS
+from .rules import RuleIndex
+from .layout import LAYOUTS
+from .timers import TimerService
+from .keys import Chord, GrabTable, KeyBinding, Keymap, lock_mask
+from .stats import HandlerStats
 from .aliases import KEYS as KEY_ALIASES
-from .utils import Mixable, ActionCaller, bstr, nstr
+from .utils import Mixable, ActionCaller, MRU, bstr, nstr, func_signature
 
 logger = logging.getLogger(__name__)
 
@@ -19,10 +27,175 @@ MODIFICATORS = {
   'Super': X.Mod4Mask,
 }
 
-IGNORED_MOD_MASKS = (0, X.LockMask, X.Mod2Mask, X.LockMask | X.Mod2Mask)
+#: Lock keys whose modifiers are ignored in key bindings in addition to Lock
+LOCK_KEYS = ('Num_Lock', 'Scroll_Lock')
+
+
+EVENT_NAMES = {
+    X.KeyPress: 'KeyPress',
+    X.KeyRelease: 'KeyRelease',
+    X.CreateNotify: 'CreateNotify',
+    X.DestroyNotify: 'DestroyNotify',
+    X.FocusIn: 'FocusIn',
+    X.FocusOut: 'FocusOut',
+    X.PropertyNotify: 'PropertyNotify',
+    X.MappingNotify: 'MappingNotify',
+    X.ConfigureNotify: 'ConfigureNotify',
+    X.MapNotify: 'MapNotify',
+    X.UnmapNotify: 'UnmapNotify',
+}
+
+
+ROOT_EVENT_MASK = (X.SubstructureNotifyMask | X.StructureNotifyMask |
+                   X.PropertyChangeMask)
+
+
+class RestartException(Exception):
+    def __init__(self, incremental=False):
+        Exception.__init__(self)
+        self.incremental = incremental
+
+
+def merge_client_messages(messages, state_atom, pairs=()):
+    """Merge consecutive _NET_WM_STATE add/remove messages of a window
 
+    Atoms changed with the same action and source are packed two per
+    message, the last action for an atom wins. Atoms of ``pairs`` (e.g.
+    both maximization states) are kept in one message, so the window manager
+    applies them at once. Any other message, including messages for other windows
+    and state toggles, first sends pending state changes, so the order of
+    messages is kept.
+    """
+    result = []
+    pending = []
+    partner = {}
+    for a, b in pairs:
+        partner[a] = b
+        partner[b] = a
+
+    def send_pending():
+        if not pending:
+            return
+
+        window, states = pending.pop()
+        groups = {}
+        for atom, key in states.items():
+            groups.setdefault(key, []).append(atom)
+
+        for (action, source), atoms in groups.items():
+            chunks = []
+            single = None
+            paired = set()
+            for atom in atoms:
+                other = partner.get(atom)
+                if other in atoms:
+                    if atom not in paired:
+                        chunks.append([atom, other])
+                        paired.add(other)
+                elif single is None:
+                    single = [atom]
+                    chunks.append(single)
+                else:
+                    single.append(atom)
+                    single = None
+
+            for chunk in chunks:
+                pair = chunk + [0]
+                result.append((window, state_atom,
+                               [action, pair[0], pair[1], source, 0]))
+
+    for window, mtype, data in messages:
+        if mtype == state_atom and data[0] in (0, 1):
+            if pending and pending[0][0] != window:
+                send_pending()
+            if not pending:
+                pending.append((window, {}))
+
+            states = pending[0][1]
+            for atom in data[1:3]:
+                if atom:
+                    states.pop(atom, None)
+                    states[atom] = data[0], data[3]
+        else:
+            send_pending()
+            result.append((window, mtype, data))
+
+    send_pending()
+    return result
+
+
+def event_window(event):
+    t = event.type
+    if t == X.CreateNotify:
+        return event.xcreatewindow.window
+    elif t == X.DestroyNotify:
+        return event.xdestroywindow.window
+    elif t == X.ConfigureNotify:
+        return event.xconfigure.window
+    elif t == X.MapNotify:
+        return event.xmap.window
+    elif t == X.UnmapNotify:
+        return event.xunmap.window
+    return event.xany.window
+
+
+def coalesce(events):
+    """Return events worth dispatching from a single queue drain
+
+    * Only the last PropertyNotify for each (window, atom) is kept,
+      handlers see the latest property state anyway.
+    * A ConfigureNotify is dropped when the next event of its window is
+      another ConfigureNotify of the same kind (real or synthetic) and no
+      sibling was restacked above the window in between.
+    * Windows created and destroyed within the drain are dropped
+      together with all their events.
+    """
+    last_prop = {}
+    props = 0
+    configured = {}
+    replaced = set()
+    created = set()
+    dead = set()
+    for i, e in enumerate(events):
+        t = e.type
+        window = event_window(e)
+        if t == X.PropertyNotify:
+            last_prop[(window, e.xproperty.atom)] = i
+            props += 1
+        elif t == X.CreateNotify:
+            created.add(window)
+        elif t == X.DestroyNotify and window in created:
+            dead.add(window)
+
+        if t == X.ConfigureNotify:
+            # Sibling position is relative to the window, keep its geometry
+            configured.pop(e.xconfigure.above, None)
+            prev = configured.get(window)
+            if prev is not None and \
+                    events[prev].xconfigure.send_event == e.xconfigure.send_event:
+                replaced.add(prev)
+            configured[window] = i
+        else:
+            configured.pop(window, None)
 
-class RestartException(Exception): pass
+    if len(last_prop) == props and not dead and not replaced:
+        return events
+
+    result = []
+    for i, e in enumerate(events):
+        if dead and event_window(e) in dead:
+            continue
+
+        if i in replaced:
+            continue
+
+        if e.type == X.PropertyNotify \
+                and last_prop[(e.xproperty.window, e.xproperty.atom)] != i:
+            continue
+
+        result.append(e)
+
+    return result
 
 
 class WM(Mixable):
@@ -43,21 +216,60 @@ class WM(Mixable):
             X.FocusIn: self.handle_focus,
             X.FocusOut: self.handle_focus,
             X.PropertyNotify: self.handle_property,
+            X.MappingNotify: self.handle_mapping,
+            X.ConfigureNotify: self.handle_configure,
+            X.MapNotify: self.handle_map,
+            X.UnmapNotify: self.handle_unmap,
         }
         self._event = X.ffi.new('XEvent *')
+        self._event_pool = []
+        self._init_batch()
+
+        #: Collapse redundant events arriving in the same queue drain,
+        #: see :func:`coalesce`.
+        self.coalesce_events = False
+        self.events_received = 0
+        self.events_dispatched = 0
+        self.events_coalesced = 0
 
         self.key_handlers = {}
+        self.key_bindings = {}
         self.property_handlers = {}
-        self.create_handlers = []
+        self.create_handlers = RuleIndex()
         self.destroy_handlers = {}
+        self.window_cleanups = {}
         self.init_handlers = []
         self.deinit_handlers = []
-        self.timer_handlers = []
+
+        #: True while config module runs. Root keys, global property
+        #: handlers, rules and timers registered meanwhile belong to config
+        #: and are replaced by :meth:`reload_config`, ones made later by
+        #: handlers are kept.
+        self.loading_config = False
+        self.config_keys = []
+        self.config_props = []
+        self.config_rules = []
+        self.config_timers = []
 
         self.grab_keyboard_handler = None
         self.grab_pointer_handler = None
 
-        self.focus_history = []
+        #: Seconds to wait for the next key of a multi-key binding
+        self.chord_timeout = 2.0
+        self.chord = None
+        self._chord_window = None
+
+        #: (state, keycode) of key being handled, None outside key handlers
+        self.pressed_key = None
+
+        self.stats = None
+        self.keydefs = {}
+
+        #: Focused window ids, most recent first
+        self.focus_history = MRU()
+        self.windows = {}
+        self.root_props = {}
+        self.root_geometry = None
 
         self.dpy = X.XOpenDisplay(X.NULL)
         if self.dpy == X.NULL:
@@ -67,16 +279,46 @@ class WM(Mixable):
         self.root = X.DefaultRootWindow(self.dpy)
         self.atom = X.AtomCache(self.dpy)
 
+        # Root property mirror relies on PropertyNotify so root
+        # events must be selected before any property is read.
+        X.XSelectInput(self.dpy, self.root, ROOT_EVENT_MASK)
+        self.root_geometry = X.get_geometry(self.dpy, self.root)
+
         self.undecorated_atom_name = '_OB_WM_STATE_UNDECORATED'
         self.track_kbd_layout = False
 
+        self.atom.prefetch(X.KNOWN_ATOMS + (self.undecorated_atom_name,
+            '_ORCSOME_KBD_GROUP', '_ORCSOME_STATE', '_ORCSOME_SKIP_TASKBAR'))
+
+        self.property_attrs = {self.atom[name]: attrs
+                               for name, attrs in PROPERTY_ATTRS.items()}
+
         self.loop = loop
         self.xevent_watcher = ev.IOWatcher(self._xevent_cb, self.fd, ev.EV_READ)
         self.xevent_watcher.start(self.loop)
+        self.prepare_watcher = ev.PrepareWatcher(self._prepare_cb)
+        self.prepare_watcher.start(self.loop)
+        self._chord_timer = ev.TimerWatcher(self._chord_timeout_cb, self.chord_timeout)
+        self.timers = TimerService(self.loop)
+
+        self.keymap = Keymap(self.dpy)
+        self.grabs = GrabTable(self.dpy)
+        self.update_modifiers()
 
         self.restart_handler = None
 
     def window(self, window_id):
+        """Return window wrapper for ``window_id``
+
+        Managed clients are kept in registry for their whole life, so
+        cached properties survive between events and are invalidated
+        by PropertyNotify.
+        """
+        try:
+            return self.windows[window_id]
+        except KeyError:
+            pass
+
         window = Window(window_id)
         window.wm = self
         return window
@@ -84,14 +326,26 @@ class WM(Mixable):
     def emit(self, signal):
         os.write(self.wfifo, signal + '\n')
 
-    def keycode(self, key):
+    def keysym(self, key):
         sym = X.XStringToKeysym(bstr(KEY_ALIASES.get(key, key)))
-        if sym is X.NoSymbol:
-            return None
+        return sym or None
 
-        return X.XKeysymToKeycode(self.dpy, sym)
+    def keycode(self, key):
+        sym = self.keysym(key)
+        return sym and self.keymap.keycode(sym)
 
-    def parse_keydef(self, keydef):
+    def update_modifiers(self):
+        """Read modifier map to find modifier keys and ignored lock masks"""
+        modmap = X.get_modifier_mapping(self.dpy)
+        self.modifier_masks = {c: 1 << i for i, r in enumerate(modmap) for c in r}
+        self.modifier_keycodes = frozenset(self.modifier_masks)
+
+        locks = set(filter(None, (self.keycode(r) for r in LOCK_KEYS)))
+        self.ignored_mods = X.LockMask | lock_mask(modmap, locks)
+        self.grabs.set_ignored_mask(self.ignored_mods)
+
+    def parse_keysyms(self, keydef):
+        """Return list of ``(keysym, modmask)`` or None for invalid keydef"""
         keys = [r.strip() for r in keydef.split()]
         result = []
         for k in keys:
@@ -104,41 +358,144 @@ class WM(Mixable):
                 except KeyError:
                     return None
 
-            code = self.keycode(key)
-            if not code:
+            sym = self.keysym(key)
+            if not sym:
                 return None
 
-            result.append((code, modmask))
+            result.append((sym, modmask))
 
         return result
 
+    def parse_keydef(self, keydef):
+        syms = self.parse_keysyms(keydef)
+        if not syms:
+            return None
+
+        result = [(self.keymap.keycode(sym), modmask) for sym, modmask in syms]
+        if not all(code for code, _ in result):
+            return None
+
+        return result
+
+    def _binding_keys(self, binding):
+        keys = [(modmask, self.keymap.keycode(sym)) for sym, modmask in binding.syms]
+        if not all(code for _, code in keys):
+            return None
+        return keys
+
     def bind_key(self, window, keydef):
-        code_mmask_list = self.parse_keydef(keydef)
-        if not code_mmask_list:
+        syms = self.parse_keysyms(keydef)
+        if not syms:
             logger.error('Invalid key definition [%s]' % keydef)
             return ActionCaller(self, lambda func: func)
 
-        if len(code_mmask_list) == 1:
-            code, modmask = code_mmask_list[0]
+        def inner(func):
+            binding = KeyBinding(window, keydef, syms, func)
+            binding.keys = self._binding_keys(binding)
+            if binding.keys:
+                self._install_key(binding)
+            else:
+                logger.warning('Key [%s] is not on keyboard', keydef)
+
+            bindings = self.key_bindings.get(window)
+            if bindings is None:
+                bindings = self.key_bindings[window] = []
+                if window != self.root:
+                    self.add_window_cleanup(window, self._drop_window_keys)
+            bindings.append(binding)
+            if self.loading_config and window == self.root:
+                self.config_keys.append(binding)
 
-            def inner(func):
-                keys = []
-                for imask in IGNORED_MOD_MASKS:
-                    mask = modmask | imask
-                    X.XGrabKey(self.dpy, code, mask, window, True, X.GrabModeAsync, X.GrabModeAsync)
-                    self.key_handlers.setdefault(window, {})[(mask, code)] = func
-                    keys.append((mask, code))
+            def remove():
+                bindings = self.key_bindings.get(window)
+                if bindings and binding in bindings:
+                    bindings.remove(binding)
+                    self._uninstall_key(binding)
 
-                def remove():
-                    for k in keys:
-                        del self.key_handlers[window][k]
+            func.remove = remove
+            return func
 
-                func.remove = remove
-                return func
+        return ActionCaller(self, inner)
 
-            return ActionCaller(self, inner)
+    def _drop_window_keys(self, window):
+        self.key_bindings.pop(window, None)
+        if self.key_handlers.pop(window, None) is not None:
+            self.grabs.forget_window(window)
+
+    def _install_key(self, binding):
+        handlers = self.key_handlers.setdefault(binding.window, {})
+        key = binding.keys[0]
+        handler = binding.func
+        if len(binding.keys) > 1:
+            handler = handlers.get(key)
+            if type(handler) is not Chord:
+                handler = Chord()
+            binding.trail = handler.add(binding.keys[1:], binding.func, binding.keydef)
         else:
-            return ActionCaller(self, lambda func: func)
+            self.keydefs[key] = binding.keydef
+
+        if handlers.get(key) is None:
+            self.grabs.grab(binding.window, key[1], key[0])
+            self._grabs_changed()
+
+        handlers[key] = binding.handler = handler
+
+    def _uninstall_key(self, binding):
+        if binding.handler is None:
+            return
+
+        handler, binding.handler = binding.handler, None
+        if binding.trail:
+            Chord.remove(binding.trail, binding.func)
+            binding.trail = None
+            if handler:
+                return
+
+        handlers = self.key_handlers.get(binding.window)
+        key = binding.keys[0]
+        if handlers and handlers.get(key) is handler:
+            del handlers[key]
+            self.grabs.ungrab(binding.window, key[1], key[0])
+            self._grabs_changed()
+
+    def handle_mapping(self, event):
+        X.XRefreshKeyboardMapping(X.ffi.addressof(event, 'xmapping'))
+        event = event.xmapping
+        if event.request == X.MappingModifier:
+            self.update_modifiers()
+        elif event.request == X.MappingKeyboard:
+            self.keymap.update(event.first_keycode, event.count)
+            self.rebind_keys()
+            self.update_modifiers()
+
+    def rebind_keys(self):
+        """Move bindings to new keycodes after keyboard mapping change
+
+        Only bindings whose keycodes actually changed are regrabbed.
+        """
+        changed = []
+        for bindings in self.key_bindings.values():
+            for b in bindings:
+                keys = self._binding_keys(b)
+                if keys != b.keys:
+                    changed.append((b, keys))
+
+        if not changed:
+            return
+
+        logger.info('Keyboard mapping changed, rebinding %d keys', len(changed))
+        with self.batch():
+            for b, _ in changed:
+                self._uninstall_key(b)
+
+            for b, keys in changed:
+                b.keys = keys
+                if keys:
+                    self._install_key(b)
+
+    def _grabs_changed(self):
+        if not self._batch_depth:
+            self.grabs.flush()
 
     def on_key(self, *args):
         """Signal decorator to define hotkey
@@ -159,6 +516,14 @@ class WM(Mixable):
         Key defenition is a string in format ``[mod + ... +]keysym`` where ``mod`` is
         one of modificators [Alt, Shift, Control(Ctrl), Mod(Win)] and
         ``keysym`` is a key name.
+
+        Space separated keys define a chord::
+
+           wm.on_key('Win+x t')(
+               spawn('xterm'))
+
+        Only the first key is grabbed, the rest are read with keyboard grab
+        which is released after :attr:`chord_timeout` seconds of inactivity.
         """
 
         if isinstance(args[0], Window):
@@ -192,18 +557,12 @@ class WM(Mixable):
         See :meth:`is_match` for ``**matchers`` argument description.
         """
         def inner(func):
-            if matchers:
-                ofunc = func
-                func = lambda: self.event_window.matches(**matchers) and ofunc()
-
-            if ignore_startup:
-                oofunc = func
-                func = lambda: self.startup or oofunc()
-
-            self.create_handlers.append(func)
+            rule = self.create_handlers.add(func, matchers, ignore_startup)
+            if self.loading_config:
+                self.config_rules.append(rule)
 
             def remove():
-                self.create_handlers.remove(func)
+                self.create_handlers.remove(rule)
 
             func.remove = remove
             return func
@@ -228,6 +587,21 @@ class WM(Mixable):
 
         return ActionCaller(self, inner)
 
+    def add_window_cleanup(self, window, func, *args):
+        """Call ``func(window, *args)`` when ``window`` is destroyed
+
+        Per-window index lets destroy release everything bound to window
+        without scanning other windows' handlers.
+        """
+        self.window_cleanups.setdefault(window, []).append((func, args))
+
+    def _drop_property_handlers(self, window, atom):
+        whandlers = self.property_handlers.get(atom)
+        if whandlers is not None:
+            whandlers.pop(window, None)
+            if not whandlers:
+                del self.property_handlers[atom]
+
     def on_property_change(self, *args):
         """Signal decorator to handle window property change
 
@@ -262,8 +636,12 @@ class WM(Mixable):
 
             for p in props:
                 atom = self.atom[p]
-                self.property_handlers.setdefault(
-                    atom, {}).setdefault(window, []).append(func)
+                whandlers = self.property_handlers.setdefault(atom, {})
+                if window is not None and window not in whandlers:
+                    self.add_window_cleanup(window, self._drop_property_handlers, atom)
+                whandlers.setdefault(window, []).append(func)
+                if self.loading_config and window is None:
+                    self.config_props.append((atom, func))
 
             def remove():
                 for p in props:
@@ -275,54 +653,101 @@ class WM(Mixable):
 
         return ActionCaller(self, inner)
 
-    def on_timer(self, timeout, start=True, first_timeout=None):
+    def enable_stats(self, budget=None):
+        """Collect per handler call counts and latency histograms
+
+        :param budget: log handler calls longer than ``budget`` seconds
+        """
+        self.stats = HandlerStats(budget)
+        return self.stats
+
+    def dump_stats(self):
+        """Log collected handler stats"""
+        logger.info('Events: %d received, %d dispatched, %d coalesced',
+                    self.events_received, self.events_dispatched,
+                    self.events_coalesced)
+        if self.stats:
+            self.stats.dump()
+
+    def _call(self, kind, binding, func, *args):
+        if self.stats is None:
+            return func(*args)
+        return self.stats.call(kind, binding, func, *args)
+
+    def on_timer(self, timeout, start=True, first_timeout=None, window=None):
+        """Signal decorator to call function periodically
+
+        Function returning true value stops the timer. Decorated function
+        gets ``start``, ``stop``, ``again``, ``remaining`` and ``overdue``
+        methods of its :class:`~orcsome.timers.Timer` handle (also
+        available as ``func.timer``).
+
+        Timer bound to ``window`` is cancelled when window is destroyed.
+        """
         def inner(func):
-            def cb(l, w, e):
-                if func():
-                    timer.stop(self.loop)
-                else:
-                    timer.update_next_stop()
+            timer = self.timers.add(lambda timer: self._call('timer', timeout, func),
+                                    first_timeout or timeout, timeout, start)
+            func.timer = timer
+            func.start = timer.start
+            func.stop = timer.stop
+            func.again = timer.again
+            func.remaining = timer.remaining
+            func.overdue = timer.overdue
+
+            if window is not None:
+                self.add_window_cleanup(window, self._cancel_timer, timer)
+            elif self.loading_config:
+                self.config_timers.append(timer)
 
-            self.timer_handlers.append(func)
+            return func
 
-            timer = ev.TimerWatcher(cb, first_timeout or timeout, timeout)
-            func.start = lambda after=None, repeat=None: timer.start(self.loop, after, repeat)
-            func.stop = lambda: timer.stop(self.loop)
-            func.again = lambda: timer.again(self.loop)
-            func.remaining = lambda: timer.remaining(self.loop)
-            func.overdue = lambda timeout: timer.overdue(timeout)
+        return ActionCaller(self, inner)
 
-            if start:
-                func.start()
+    def _cancel_timer(self, window, timer):
+        timer.cancel()
 
-            return func
+    def get_root_property(self, name, type=None):
+        """Return root window property value
 
-        return ActionCaller(self, inner)
+        Values are mirrored in memory and dropped on root PropertyNotify,
+        so repeated reads of unchanged state do not touch X server.
+        Returned value is shared and must not be modified.
+        """
+        atom = self.atom[name]
+        cache = self.root_props
+        if cache is not None and atom in cache:
+            return cache[atom]
+
+        result = X.get_window_property(self.dpy, self.root, atom,
+            self.atom[type] if type else 0)
+
+        if cache is not None:
+            cache[atom] = result
+
+        return result
 
     def get_clients(self, ids=False):
         """Return wm client list"""
-        result = X.get_window_property(self.dpy, self.root,
-            self.atom['_NET_CLIENT_LIST'], self.atom['WINDOW']) or []
+        result = self.get_root_property('_NET_CLIENT_LIST', 'WINDOW') or []
 
-        if not ids:
-            result = [self.window(r) for r in result]
+        if ids:
+            return list(result)
 
-        return result
+        return [self.window(r) for r in result]
 
     def get_stacked_clients(self):
         """Return client list in stacked order.
 
         Most top window will be last in list. Can be useful to determine window visibility.
+        Kept in memory and updated from ConfigureNotify of top level clients.
         """
-        result = X.get_window_property(self.dpy, self.root,
-            self.atom['_NET_CLIENT_LIST_STACKING'], self.atom['WINDOW']) or []
+        result = self.get_root_property('_NET_CLIENT_LIST_STACKING', 'WINDOW') or []
         return [self.window(r) for r in result]
 
     @property
     def current_window(self):
         """Return currently active (with input focus) window"""
-        result = X.get_window_property(self.dpy, self.root,
-            self.atom['_NET_ACTIVE_WINDOW'], self.atom['WINDOW'])
+        result = self.get_root_property('_NET_ACTIVE_WINDOW', 'WINDOW')
 
         if result:
             return self.window(result[0])
@@ -333,8 +758,7 @@ class WM(Mixable):
 
         Counts from zero.
         """
-        return X.get_window_property(self.dpy, self.root,
-            self.atom['_NET_CURRENT_DESKTOP'])[0]
+        return self.get_root_property('_NET_CURRENT_DESKTOP')[0]
 
     def activate_desktop(self, num):
         """Activate desktop ``num``"""
@@ -344,20 +768,70 @@ class WM(Mixable):
         self._send_event(self.root, self.atom['_NET_CURRENT_DESKTOP'], [num])
         self._flush()
 
+    @contextmanager
+    def batch(self):
+        """Group several actions into one transaction
+
+        Client messages are queued, ``_NET_WM_STATE`` changes of a window
+        are merged into as few messages as possible and X buffer is
+        flushed once at the end::
+
+           with wm.batch():
+               wm.set_window_state(w, decorate=False, taskbar=False)
+               wm.moveresize_window(w, 0, 0, 800, 600)
+               wm.focus_window(w)
+
+        Handlers called from event dispatch already run in a batch.
+        Batches can be nested.
+        """
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.grabs.flush()
+                self._send_queued()
+                if self._batch_flush:
+                    self._batch_flush = False
+                    X.XFlush(self.dpy)
+
     def _send_event(self, window, mtype, data):
-        data = (data + ([0] * (5 - len(data))))[:5]
-        ev = X.ffi.new('XClientMessageEvent *', {
-            'type': X.ClientMessage,
-            'window': window,
-            'message_type': mtype,
-            'format': 32,
-            'data': {'l': data},
-        })
+        data = [int(r) for r in data[:5]]
+        data += [0] * (5 - len(data))
+        if self._batch_depth:
+            self._batch_queue.append((window, mtype, data))
+            self._batch_flush = True
+        else:
+            self._send_client_message(window, mtype, data)
+
+    def _send_client_message(self, window, mtype, data):
+        ev = self._client_message
+        ev.window = window
+        ev.message_type = mtype
+        ev.data.l = data
         X.XSendEvent(self.dpy, self.root, False, X.SubstructureRedirectMask,
             X.ffi.cast('XEvent *', ev))
 
+    def _send_queued(self):
+        """Send queued client messages
+
+        Called before direct X requests inside batch to keep request order.
+        """
+        if self._batch_queue:
+            queue, self._batch_queue = self._batch_queue, []
+            atom = self.atom
+            maximized = (atom['_NET_WM_STATE_MAXIMIZED_VERT'],
+                         atom['_NET_WM_STATE_MAXIMIZED_HORZ'])
+            for window, mtype, data in merge_client_messages(
+                    queue, atom['_NET_WM_STATE'], (maximized, )):
+                self._send_client_message(window, mtype, data)
+
     def _flush(self):
-        X.XFlush(self.dpy)
+        if self._batch_depth:
+            self._batch_flush = True
+        else:
+            X.XFlush(self.dpy)
 
     def find_clients(self, clients, **matchers):
         """Return matching clients list
@@ -379,42 +853,258 @@ class WM(Mixable):
         except IndexError:
             return None
 
-    def process_create_window(self, window):
+    def get_focus_history(self, **matchers):
+        """Return recently focused windows, most recent first
+
+        Matchers use window properties cached in registry, repeated calls
+        do not touch X server.
+
+        :param \*\*matchers: keyword arguments defined in :meth:`is_match`
+        """
+        windows = [self.window(r) for r in self.focus_history]
+        if matchers:
+            return self.find_clients(windows, **matchers)
+        return windows
+
+    def prefetch(self, windows, attrs):
+        """Fill cached ``attrs`` of ``windows``
+
+        All property requests are issued before any reply is collected.
+        """
+        requests = {}
+        for name in attrs:
+            if name in ATTR_REQUESTS:
+                requests.setdefault(ATTR_REQUESTS[name], []).append(name)
+
+        pending = []
+        for w in windows:
+            for key, names in requests.items():
+                if any(r in w.__dict__ for r in names):
+                    continue
+
+                prop, type, split = key
+                cookie = X.request_window_property(self.dpy, w, self.atom[prop],
+                    self.atom[type] if type else 0, split)
+                pending.append((w, key, cookie))
+
+        for w, key, cookie in pending:
+            w.__dict__.setdefault('_replies', {})[key] = cookie.reply()
+
+    def select_client_input(self, window):
         X.XSelectInput(self.dpy, window, X.StructureNotifyMask |
                        X.PropertyChangeMask | X.FocusChangeMask)
 
+    def process_create_window(self, window, select=True):
+        if select:
+            self.select_client_input(window)
+
+        self.windows[window] = window
         self.event_window = window
-        for handler in self.create_handlers:
-            handler()
+        for rule in self.create_handlers.match(window, self.startup):
+            if not rule.removed:
+                self._call('create', rule.matchers, rule.func)
 
     def init(self):
-        X.XSelectInput(self.dpy, self.root, X.SubstructureNotifyMask)
+        X.XSelectInput(self.dpy, self.root, ROOT_EVENT_MASK)
 
         for h in self.init_handlers:
             h()
 
         self.startup = True
-        for c in self.get_clients():
-            self.process_create_window(c)
+        start = time()
+        clients = self.get_clients()
+
+        # Input must be selected before properties are read, otherwise
+        # changes in between would not invalidate cached values.
+        for c in clients:
+            self.select_client_input(c)
+
+        self.prefetch(clients, self.create_handlers.keys)
+        for c in clients:
+            self.process_create_window(c, False)
 
         X.XSync(self.dpy, False)
+        logger.info('Startup scan of %d clients took %.1f ms',
+                    len(clients), (time() - start) * 1000)
 
         X.XSetErrorHandler(error_handler)
 
+    def reload_config(self, load):
+        """Apply new config without full restart
+
+        ``load`` executes config and raises on error, in which case the
+        current config stays intact. New bindings are registered on top of
+        live ones and then the old ones are released, so grab table sends
+        requests only for changed root keys. Timers with unchanged
+        handlers keep their schedule, only new on_manage rules are run on
+        existing clients. Handlers and timers made at runtime by rules
+        stay as is. Deinit handlers of the old config and init handlers of
+        the new one are always called since they own config module state.
+
+        Return True on success.
+        """
+        old = (self.config_keys, self.config_props, self.config_rules,
+               self.config_timers)
+        self.config_keys, self.config_props = [], []
+        self.config_rules, self.config_timers = [], []
+        old_init, self.init_handlers = self.init_handlers, []
+        old_deinit, self.deinit_handlers = self.deinit_handlers, []
+
+        with self.batch():
+            self.loading_config = True
+            try:
+                load()
+            except Exception:
+                logger.exception('Config reload failed, keeping current config')
+                self._rollback_reload(*old)
+                self.init_handlers = old_init
+                self.deinit_handlers = old_deinit
+                return False
+            finally:
+                self.loading_config = False
+
+            old_keys, old_props, old_rules, old_timers = old
+            self._drop_config(old_keys, old_props, old_rules)
+            self._transfer_timers(old_timers)
+
+            for h in old_deinit:
+                try:
+                    h()
+                except Exception:
+                    logger.exception('Shutdown error')
+
+            for h in self.init_handlers:
+                h()
+
+            rule_key = lambda r: (func_signature(r.func), repr(sorted(r.matchers.items())),
+                                  r.ignore_startup)
+            old_sigs = set(rule_key(r) for r in old_rules)
+            new_rules = [r for r in self.config_rules
+                         if not r.ignore_startup and rule_key(r) not in old_sigs]
+            if new_rules:
+                self._run_rules(new_rules)
+
+        return True
+
+    def _drop_config(self, keys, props, rules):
+        dropped = set(keys)
+        bindings = self.key_bindings.get(self.root, [])
+        bindings[:] = [b for b in bindings if b not in dropped]
+        for b in keys:
+            self._uninstall_key(b)
+
+        for atom, func in props:
+            handlers = self.property_handlers.get(atom, {}).get(None)
+            if handlers and func in handlers:
+                handlers.remove(func)
+
+        self.create_handlers.discard(rules)
+
+    def _rollback_reload(self, old_keys, old_props, old_rules, old_timers):
+        self._drop_config(self.config_keys, self.config_props, self.config_rules)
+        for b in old_keys:
+            if b.keys:
+                self._install_key(b)
+
+        for t in self.config_timers:
+            t.cancel()
+
+        self.config_keys, self.config_props = old_keys, old_props
+        self.config_rules, self.config_timers = old_rules, old_timers
+
+    def _transfer_timers(self, old_timers):
+        old = {}
+        for t in old_timers:
+            old.setdefault(func_signature(t.callback), []).append(t)
+
+        for t in self.config_timers:
+            same = old.get(func_signature(t.callback))
+            if same:
+                prev = same.pop(0)
+                if prev.active:
+                    self.timers.schedule(t, prev.when)
+                else:
+                    t.stop()
+                t.next_stop = prev.next_stop
+
+        for t in old_timers:
+            t.cancel()
+
+    def _run_rules(self, rules):
+        clients = self.get_clients()
+        keys = set()
+        for r in rules:
+            keys.update(r.matchers)
+        self.prefetch(clients, keys)
+
+        self.startup = True
+        for c in clients:
+            self.event_window = c
+            for rule in rules:
+                if not rule.removed and c.matches(**rule.matchers):
+                    self._call('create', rule.matchers, rule.func)
+
     def handle_keypress(self, event):
         event = event.xkey
         logger.debug('Keypress {} {}'.format(event.state, event.keycode))
         if self.grab_keyboard_handler:
             self.grab_keyboard_handler(True, event.state, event.keycode)
         else:
+            key = event.state & ~self.ignored_mods, event.keycode
             try:
-                handler = self.key_handlers[event.window][(event.state, event.keycode)]
+                handler = self.key_handlers[event.window][key]
             except KeyError:
                 pass
             else:
                 self.event = event
                 self.event_window = self.window(event.window)
-                handler()
+                if type(handler) is Chord:
+                    self._start_chord(handler)
+                else:
+                    self._call_key(self.keydefs.get(key), handler,
+                                   (event.state, event.keycode))
+
+    def _call_key(self, keydef, handler, key):
+        self.pressed_key = key
+        try:
+            self._call('key', keydef, handler)
+        finally:
+            self.pressed_key = None
+
+    def _start_chord(self, node):
+        if self.grab_keyboard(self._chord_key):
+            self.chord = node
+            self._chord_window = self.event_window
+            self._chord_timer.start(self.loop, self.chord_timeout)
+
+    def _end_chord(self):
+        self._chord_timer.stop(self.loop)
+        self.chord = self._chord_window = None
+        self.ungrab_keyboard()
+        self._flush()
+
+    def _chord_key(self, is_press, state, code):
+        if not is_press or code in self.modifier_keycodes:
+            return
+
+        node = self.chord
+        key = state & ~self.ignored_mods, code
+        handler = node.get(key)
+        if type(handler) is Chord:
+            self.chord = handler
+            self._chord_timer.stop(self.loop)
+            self._chord_timer.start(self.loop, self.chord_timeout)
+            return
+
+        window = self._chord_window
+        self._end_chord()
+        if handler:
+            self.event_window = window
+            self._call_key(node.keydefs.get(key), handler, (state, code))
+
+    def _chord_timeout_cb(self, loop, watcher, events):
+        logger.debug('Chord timeout')
+        self._end_chord()
 
     def handle_keyrelease(self, event):
         event = event.xkey
@@ -437,34 +1127,98 @@ class WM(Mixable):
             self.event = event
             self.event_window = self.window(event.window)
             for h in handlers:
-                h()
+                self._call('destroy', None, h)
         finally:
             self._clean_window_data(event.window)
 
     def handle_property(self, event):
         event = event.xproperty
         atom = event.atom
+        is_root = event.window == self.root
+        if is_root:
+            self.root_props.pop(atom, None)
+        elif atom in self.property_attrs and event.window in self.windows:
+            self.windows[event.window].invalidate(self.property_attrs[atom])
+
         if event.state == 0 and atom in self.property_handlers:
             wphandlers = self.property_handlers[atom]
             self.event_window = self.window(event.window)
             self.event = event
+            name = self.atom.get_name(atom) if self.stats else None
             if event.window in wphandlers:
                 for h in wphandlers[event.window]:
-                    h()
+                    self._call('property', name, h)
 
-            if None in wphandlers:
+            # Global handlers are meant for clients only
+            if None in wphandlers and not is_root:
                 for h in wphandlers[None]:
-                    h()
+                    self._call('property', name, h)
+
+    def handle_configure(self, event):
+        event = event.xconfigure
+        window = event.window
+        if window == self.root:
+            self.root_geometry = event.x, event.y, event.width, event.height
+            return
+
+        # Only siblings of top level windows share stacking order of
+        # client list.
+        if event.event == self.root and not event.send_event:
+            self._restack_client(window, event.above)
+
+        window = self.windows.get(window)
+        if window is None:
+            return
+
+        # Synthetic events carry root coordinates, real ones are
+        # relative to parent as XGetGeometry result.
+        if event.send_event:
+            window.root_position = event.x, event.y
+            if 'geometry' in window.__dict__:
+                x, y, _, _ = window.geometry
+                window.geometry = x, y, event.width, event.height
+        else:
+            window.geometry = event.x, event.y, event.width, event.height
+            if event.event == self.root:
+                window.root_position = event.x, event.y
+            else:
+                window.__dict__.pop('root_position', None)
+
+    def _restack_client(self, window, above):
+        """Place window right above ``above`` sibling in cached client stack
+
+        Stack is dropped to be refetched if sibling is not a client.
+        """
+        atom = self.atom['_NET_CLIENT_LIST_STACKING']
+        stack = self.root_props.get(atom)
+        if not stack or window not in stack:
+            return
+
+        stack = [r for r in stack if r != window]
+        if not above:
+            stack.insert(0, window)
+        elif above in stack:
+            stack.insert(stack.index(above) + 1, window)
+        else:
+            del self.root_props[atom]
+            return
+
+        self.root_props[atom] = array('L', stack)
+
+    def handle_map(self, event):
+        window = self.windows.get(event.xmap.window)
+        if window is not None:
+            window.mapped = True
+
+    def handle_unmap(self, event):
+        window = self.windows.get(event.xunmap.window)
+        if window is not None:
+            window.mapped = False
 
     def handle_focus(self, event):
         event = event.xfocus
         if event.type == X.FocusIn:
-            try:
-                self.focus_history.remove(event.window)
-            except ValueError:
-                pass
-
-            self.focus_history.append(event.window)
+            self.focus_history.touch(event.window)
             if event.mode in (0, 3) and self.track_kbd_layout:
                 prop = X.get_window_property(self.dpy, event.window, self.atom['_ORCSOME_KBD_GROUP'])
                 if prop:
@@ -476,48 +1230,98 @@ class WM(Mixable):
                 X.set_window_property(self.dpy, event.window, self.atom['_ORCSOME_KBD_GROUP'],
                                       self.atom['CARDINAL'], 32, [X.get_kbd_group(self.dpy)])
 
+    def _dispatch(self, event):
+        """Call event handler, return False if event processing must stop"""
+        try:
+            h = self.handlers[event.type]
+        except KeyError:
+            return True
+
+        try:
+            if self.stats is None:
+                h(event)
+            else:
+                self.stats.call('event', EVENT_NAMES.get(event.type), h, event)
+        except RestartException as e:
+            if self.restart_handler:
+                self.restart_handler(e.incremental)
+                return False
+        except:
+            logger.exception('Boo')
+
+        return True
+
+    def _prepare_cb(self, loop, watcher, events):
+        # Requests made outside of _xevent_cb (timers, signals, spawn
+        # callbacks) may read events into Xlib queue leaving the socket
+        # quiet, so they are dispatched here. Buffered requests are
+        # flushed before the loop blocks.
+        if X.XQLength(self.dpy):
+            self._xevent_cb(loop, watcher, events)
+        X.XFlush(self.dpy)
+
+    def _init_batch(self):
+        self._batch_depth = 0
+        self._batch_queue = []
+        self._batch_flush = False
+        self._client_message = X.ffi.new('XClientMessageEvent *', {
+            'type': X.ClientMessage, 'format': 32})
+
     def _xevent_cb(self, loop, watcher, events):
+        with self.batch():
+            if self.coalesce_events:
+                self._xevent_coalesced()
+            else:
+                self._xevent_drain()
+
+    def _xevent_drain(self):
         event = self._event
         while True:
             i = X.XPending(self.dpy)
             if not i: break
 
+            self.events_received += i
+            self.events_dispatched += i
             while i > 0:
                 X.XNextEvent(self.dpy, event)
                 i -= 1
 
-                try:
-                    h = self.handlers[event.type]
-                except KeyError:
-                    continue
+                if not self._dispatch(event):
+                    return
 
-                try:
-                    h(event)
-                except RestartException:
-                    if self.restart_handler:
-                        self.restart_handler()
-                        return
-                except:
-                    logger.exception('Boo')
+    def _xevent_coalesced(self):
+        pool = self._event_pool
+        while True:
+            n = X.XPending(self.dpy)
+            if not n: break
 
-    def _clean_window_data(self, window):
-        if window in self.key_handlers:
-            del self.key_handlers[window]
+            while len(pool) < n:
+                pool.append(X.ffi.new('XEvent *'))
 
-        if window in self.destroy_handlers:
-            self.destroy_handlers[window]
+            batch = pool[:n]
+            for event in batch:
+                X.XNextEvent(self.dpy, event)
 
-        try:
-            self.focus_history.remove(window)
-        except ValueError:
-            pass
+            batch = coalesce(batch)
+            self.events_received += n
+            self.events_dispatched += len(batch)
+            self.events_coalesced += n - len(batch)
 
-        for atom, whandlers in list(self.property_handlers.items()):
-            if window in whandlers:
-                del whandlers[window]
+            for event in batch:
+                if not self._dispatch(event):
+                    return
 
-            if not self.property_handlers[atom]:
-                del self.property_handlers[atom]
+    def _clean_window_data(self, window):
+        self.windows.pop(window, None)
+
+        self.destroy_handlers.pop(window, None)
+        self.focus_history.discard(window)
+
+        for func, args in self.window_cleanups.pop(window, ()):
+            try:
+                func(window, *args)
+            except Exception:
+                logger.exception('Error in cleanup of window %s', window)
 
     def focus_window(self, window):
         """Activate window"""
@@ -527,18 +1331,21 @@ class WM(Mixable):
     def focus_and_raise(self, window):
         """Activate window desktop, set input focus and raise it"""
         self.activate_window_desktop(window)
+        self._send_queued()
         X.XConfigureWindow(self.dpy, window, X.CWStackMode,
             X.ffi.new('XWindowChanges *', {'stack_mode': X.Above}))
         self.focus_window(window)
 
     def place_window_above(self, window):
         """Float up window in wm stack"""
+        self._send_queued()
         X.XConfigureWindow(self.dpy, window, X.CWStackMode,
             X.ffi.new('XWindowChanges *', {'stack_mode': X.Above}))
         self._flush()
 
     def place_window_below(self, window):
         """Float down window in wm stack"""
+        self._send_queued()
         X.XConfigureWindow(self.dpy, window, X.CWStackMode,
             X.ffi.new('XWindowChanges *', {'stack_mode': X.Below}))
         self._flush()
@@ -577,6 +1384,7 @@ class WM(Mixable):
 
         if otaskbar is not None:
             params = [] if otaskbar else [self.atom['_ORCSOME_SKIP_TASKBAR']]
+            self._send_queued()
             X.set_window_property(self.dpy, window, self.atom['_ORCSOME_STATE'],
                 self.atom['ATOM'], 32, params)
 
@@ -590,16 +1398,24 @@ class WM(Mixable):
     def get_window_geometry(self, window):
         """Get window geometry
 
-        Returns window geometry without decorations"""
-        root_ret = X.ffi.new('Window *')
-        x = X.ffi.new('int *')
-        y = X.ffi.new('int *')
-        w = X.ffi.new('unsigned int *')
-        h = X.ffi.new('unsigned int *')
-        border_width = X.ffi.new('unsigned int *')
-        depth = X.ffi.new('unsigned int *')
-        X.XGetGeometry(self.dpy, window, root_ret, x, y, w, h, border_width, depth)
-        return x[0], y[0], w[0], h[0]
+        Returns window geometry without decorations. Values of managed
+        windows and root are kept from ConfigureNotify events."""
+        if window == self.root and self.root_geometry is not None:
+            return self.root_geometry
+
+        return self.window(window).geometry
+
+    def is_mapped(self, window):
+        """Return True if window is mapped"""
+        return self.window(window).mapped
+
+    def is_visible(self, window):
+        """Return True if window is mapped and not hidden (minimized)
+
+        Answered from event-maintained cache for managed windows.
+        """
+        window = self.window(window)
+        return window.mapped and not window.hidden
 
     def get_screen_size(self):
         """Get size of screen (root window)"""
@@ -609,8 +1425,7 @@ class WM(Mixable):
         """Get workarea geometery
 
         :param desktop: Desktop for working area receiving. If None then current_desktop is using"""
-        result = X.get_window_property(self.dpy, self.root,
-                                       self.atom['_NET_WORKAREA'], self.atom['CARDINAL'])
+        result = self.get_root_property('_NET_WORKAREA', 'CARDINAL')
         if desktop is None:
             desktop = self.current_desktop
         return result[4*desktop:4*desktop+4]
@@ -642,6 +1457,56 @@ class WM(Mixable):
         self._send_event(window, self.atom['_NET_MOVERESIZE_WINDOW'], list(params))
         self._flush()
 
+    def apply_layout(self, layout, windows=None, desktop=None, **options):
+        """Tile windows of a desktop in one transaction
+
+        :param layout: layout function or name from
+           :data:`orcsome.layout.LAYOUTS` (master_stack, grid, columns, rows)
+        :param windows: windows to place, by default not hidden clients of
+           ``desktop`` in creation order
+        :param desktop: desktop to use workarea of, current one by default
+        :param \*\*options: passed to layout function, e.g. ``ratio``
+
+        Workarea and window geometry come from cache and all move-resize
+        requests are sent with a single flush. Windows already placed at
+        target rectangle (in root coordinates, frame extents added) are
+        skipped. Return list of moved windows.
+        """
+        if desktop is None:
+            desktop = self.current_desktop
+
+        if windows is None:
+            windows = [r for r in self.get_clients()
+                       if r.desktop == desktop and not r.hidden]
+
+        func = LAYOUTS[layout] if isinstance(layout, str) else layout
+        rects = func(len(windows), tuple(self.get_workarea(desktop)), **options)
+
+        windows = [self.window(r) for r in windows]
+        self.prefetch(windows, ('frame_extents', ))
+        pending = [(w, X.request_geometry(self.dpy, w)) for w in windows
+                   if 'geometry' not in w.__dict__]
+        for w, cookie in pending:
+            w.geometry = cookie.reply()
+
+        moved = []
+        with self.batch():
+            for window, (x, y, width, height) in zip(windows, rects):
+                rect = x, y, max(1, width), max(1, height)
+                # Frame is placed at target position (NorthWest gravity)
+                left, _, top, _ = window.frame_extents
+                if tuple(window.root_position) == (x + left, y + top) and \
+                        tuple(window.geometry[2:]) == rect[2:]:
+                    continue
+
+                self._send_event(window, self.atom['_NET_MOVERESIZE_WINDOW'],
+                                 [0x2f00] + list(rect))
+                moved.append(window)
+
+            self._flush()
+
+        return moved
+
     def close_window(self, window=None):
         """Send request to wm to close window"""
         window = window or self.current_window
@@ -659,19 +1524,26 @@ class WM(Mixable):
 
     def stop(self, is_exit=False):
         self.key_handlers.clear()
+        self.key_bindings.clear()
         self.property_handlers.clear()
-        self.create_handlers[:] = []
+        self.create_handlers.clear()
         self.destroy_handlers.clear()
-        self.focus_history[:] = []
+        self.window_cleanups.clear()
+        self.focus_history.clear()
+
+        if self.chord is not None:
+            self._end_chord()
 
         if not is_exit:
-            X.XUngrabKey(self.dpy, X.AnyKey, X.AnyModifier, self.root)
-            for window in self.get_clients():
+            for window in self.grabs.windows():
                 X.XUngrabKey(self.dpy, X.AnyKey, X.AnyModifier, window)
+        self.grabs.clear()
 
-        for h in self.timer_handlers:
-            h.stop()
-        self.timer_handlers[:] = []
+        self.timers.clear()
+        self.config_keys[:] = []
+        self.config_props[:] = []
+        self.config_rules[:] = []
+        self.config_timers[:] = []
 
         for h in self.deinit_handlers:
             try:
@@ -749,6 +1621,11 @@ class ImmediateWM(WM):
         self.root = X.DefaultRootWindow(self.dpy)
         self.atom = X.AtomCache(self.dpy)
         self.undecorated_atom_name = '_OB_WM_STATE_UNDECORATED'
+        self.windows = {}
+        self.root_props = None
+        self.root_geometry = None
+        self.grabs = GrabTable(self.dpy)
+        self._init_batch()
 
 
 @X.ffi.callback('XErrorHandler')
@@ -1,6 +1,31 @@
 from . utils import cached_property, match_string, nstr
 from . import xlib as X
 
+#: Cached window attributes which depend on a property value.
+#: Used to invalidate only affected attributes on PropertyNotify.
+PROPERTY_ATTRS = {
+    '_NET_WM_DESKTOP': ('desktop', ),
+    '_NET_FRAME_EXTENTS': ('frame_extents', ),
+    'WM_WINDOW_ROLE': ('role', ),
+    'WM_CLASS': ('name', 'cls'),
+    '_NET_WM_NAME': ('title', ),
+    '_NET_WM_STATE': ('state', 'state_names', 'maximized_vert',
+                      'maximized_horz', 'decorated', 'urgent', 'fullscreen',
+                      'hidden'),
+}
+
+
+#: Property requests (name, type, split) needed to compute cached attributes
+ATTR_REQUESTS = {
+    'desktop': ('_NET_WM_DESKTOP', None, False),
+    'frame_extents': ('_NET_FRAME_EXTENTS', 'CARDINAL', False),
+    'role': ('WM_WINDOW_ROLE', 'STRING', False),
+    'name': ('WM_CLASS', 'STRING', True),
+    'cls': ('WM_CLASS', 'STRING', True),
+    'title': ('_NET_WM_NAME', 'UTF8_STRING', False),
+    'state': ('_NET_WM_STATE', 'ATOM', False),
+}
+
 
 class Window(int):
     @cached_property
@@ -91,7 +116,27 @@ class Window(int):
         """Return _NET_WM_STATE"""
         return self.get_property('_NET_WM_STATE', 'ATOM') or []
 
+    @cached_property
+    def state_names(self):
+        """Return _NET_WM_STATE atom names"""
+        return self.wm.atom.get_names(self.state)
+
+    def invalidate(self, attrs):
+        """Drop cached values of given attributes"""
+        d = self.__dict__
+        replies = d.get('_replies')
+        for name in attrs:
+            d.pop(name, None)
+            if replies and name in ATTR_REQUESTS:
+                replies.pop(ATTR_REQUESTS[name], None)
+
     def get_property(self, property, type=None, **kwargs):
+        replies = self.__dict__.get('_replies')
+        if replies:
+            key = property, type, kwargs.get('split', False)
+            if key in replies:
+                return replies.pop(key)
+
         atom = self.wm.atom
         return X.get_window_property(self.wm.dpy, self, atom[property],
             atom[type] if type else 0, **kwargs)
@@ -115,3 +160,39 @@ class Window(int):
     @cached_property
     def fullscreen(self):
         return self.wm.atom['_NET_WM_STATE_FULLSCREEN'] in self.state
+
+    @cached_property
+    def hidden(self):
+        return self.wm.atom['_NET_WM_STATE_HIDDEN'] in self.state
+
+    @cached_property
+    def geometry(self):
+        """Return (x, y, width, height) without decorations
+
+        x and y are relative to parent (wm frame). Updated from
+        ConfigureNotify events for managed windows.
+        """
+        return X.get_geometry(self.wm.dpy, self)
+
+    @cached_property
+    def frame_extents(self):
+        """Return (left, right, top, bottom) wm decoration sizes"""
+        return tuple(self.get_property('_NET_FRAME_EXTENTS', 'CARDINAL') or
+                     (0, 0, 0, 0))
+
+    @cached_property
+    def root_position(self):
+        """Return (x, y) of window origin in root coordinates
+
+        Updated from synthetic ConfigureNotify events a reparenting wm
+        sends on frame moves.
+        """
+        return X.get_root_position(self.wm.dpy, self)
+
+    @cached_property
+    def mapped(self):
+        """Return True if window is mapped
+
+        Updated from MapNotify/UnmapNotify events for managed windows.
+        """
+        return X.is_mapped(self.wm.dpy, self)
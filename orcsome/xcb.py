@@ -0,0 +1,112 @@
+from array import array
+
+from ._xcb import ffi, lib
+from . import xlib as X
+
+NULL = ffi.NULL
+
+ITEM32 = 'I' if array('I').itemsize == 4 else 'L'
+MAX_LENGTH = 0xffffff
+
+_connections = {}
+_error = ffi.new('xcb_generic_error_t **')
+
+
+def get_connection(display):
+    key = int(X.ffi.cast('uintptr_t', display))
+    try:
+        return _connections[key]
+    except KeyError:
+        pass
+
+    conn = _connections[key] = lib.XGetXCBConnection(ffi.cast('Display *', key))
+    return conn
+
+
+class Cookie(object):
+    """Pending xcb request
+
+    Reply is read on first :meth:`reply` call. Cookies dropped without
+    reading discard their reply.
+    """
+    __slots__ = ('conn', 'cookie', 'value')
+
+    def __init__(self, conn, cookie):
+        self.conn = conn
+        self.cookie = cookie
+
+    def reply(self):
+        if self.cookie is not None:
+            reply = self._reply(self.conn, self.cookie, _error)
+            self.cookie = None
+            if reply == NULL:
+                lib.free(_error[0])
+                self.value = None
+            else:
+                try:
+                    self.value = self.unpack(reply)
+                finally:
+                    lib.free(reply)
+
+        return self.value
+
+    def __del__(self):
+        if self.cookie is not None:
+            lib.xcb_discard_reply(self.conn, self.cookie.sequence)
+
+
+class PropertyCookie(Cookie):
+    __slots__ = ('type', 'split')
+    _reply = staticmethod(lib.xcb_get_property_reply)
+
+    def unpack(self, reply):
+        fmt = reply.format
+        if not fmt or (self.type and reply.type != self.type):
+            return None
+
+        data = ffi.buffer(lib.xcb_get_property_value(reply),
+                          lib.xcb_get_property_value_length(reply))
+        if fmt == 32:
+            # Same item type as xlib backend returns
+            items = array(ITEM32)
+            (getattr(items, 'frombytes', None) or items.fromstring)(data[:])
+            return array('L', items)
+        elif fmt == 8:
+            data = data[:].rstrip(b'\x00')
+            if self.split:
+                data = data.split(b'\x00')
+            return data
+        else:
+            raise Exception('Unknown format {}'.format(fmt))
+
+
+class GeometryCookie(Cookie):
+    __slots__ = ()
+    _reply = staticmethod(lib.xcb_get_geometry_reply)
+
+    def unpack(self, reply):
+        return reply.x, reply.y, reply.width, reply.height
+
+
+def request_window_property(display, window, property, type=0, split=False,
+                            size=MAX_LENGTH):
+    conn = get_connection(display)
+    cookie = PropertyCookie(conn, lib.xcb_get_property(conn, 0, window, property,
+                                                       type, 0, size))
+    cookie.type = type
+    cookie.split = split
+    return cookie
+
+
+def get_window_property(display, window, property, type=0, split=False,
+                        size=MAX_LENGTH):
+    return request_window_property(display, window, property, type, split, size).reply()
+
+
+def request_geometry(display, window):
+    conn = get_connection(display)
+    return GeometryCookie(conn, lib.xcb_get_geometry(conn, window))
+
+
+def get_geometry(display, window):
+    return request_geometry(display, window).reply() or (0, 0, 0, 0)
@@ -0,0 +1,67 @@
+import cffi
+
+ffi = cffi.FFI()
+
+ffi.set_source('orcsome._xcb', """
+#include <stdlib.h>
+#include <X11/Xlib.h>
+#include <X11/Xlib-xcb.h>
+#include <xcb/xcb.h>
+""", libraries=['X11-xcb', 'xcb', 'X11'])
+
+ffi.cdef("""
+    typedef ... Display;
+    typedef ... xcb_connection_t;
+
+    typedef struct {
+        unsigned int sequence;
+    } xcb_get_property_cookie_t;
+
+    typedef struct {
+        unsigned int sequence;
+    } xcb_get_geometry_cookie_t;
+
+    typedef struct {
+        uint8_t response_type;
+        uint8_t error_code;
+        ...;
+    } xcb_generic_error_t;
+
+    typedef struct {
+        uint8_t format;
+        uint32_t type;
+        uint32_t bytes_after;
+        uint32_t value_len;
+        ...;
+    } xcb_get_property_reply_t;
+
+    typedef struct {
+        int16_t x;
+        int16_t y;
+        uint16_t width;
+        uint16_t height;
+        uint16_t border_width;
+        ...;
+    } xcb_get_geometry_reply_t;
+
+    xcb_connection_t *XGetXCBConnection(Display *dpy);
+    int xcb_flush(xcb_connection_t *c);
+    void xcb_discard_reply(xcb_connection_t *c, unsigned int sequence);
+
+    xcb_get_property_cookie_t xcb_get_property(xcb_connection_t *c,
+        uint8_t _delete, uint32_t window, uint32_t property, uint32_t type,
+        uint32_t long_offset, uint32_t long_length);
+    xcb_get_property_reply_t *xcb_get_property_reply(xcb_connection_t *c,
+        xcb_get_property_cookie_t cookie, xcb_generic_error_t **e);
+    void *xcb_get_property_value(const xcb_get_property_reply_t *R);
+    int xcb_get_property_value_length(const xcb_get_property_reply_t *R);
+
+    xcb_get_geometry_cookie_t xcb_get_geometry(xcb_connection_t *c, uint32_t drawable);
+    xcb_get_geometry_reply_t *xcb_get_geometry_reply(xcb_connection_t *c,
+        xcb_get_geometry_cookie_t cookie, xcb_generic_error_t **e);
+
+    void free(void *ptr);
+""")
+
+if __name__ == "__main__":
+    ffi.compile(verbose=True)
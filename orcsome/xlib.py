@@ -1,17 +1,44 @@
 from array import array
 from ._xlib import ffi, lib
-from .utils import bstr, btype
+from .utils import bstr, nstr
 
 NULL = ffi.NULL
 globals().update(lib.__dict__)
 
 NONE = 0
 
+#: ICCCM and EWMH atoms interned in a single batch on startup
+KNOWN_ATOMS = (
+    'ATOM', 'CARDINAL', 'STRING', 'WINDOW', 'UTF8_STRING',
+    'WM_CLASS', 'WM_NAME', 'WM_WINDOW_ROLE', 'WM_STATE', 'WM_PROTOCOLS',
+    'WM_DELETE_WINDOW', 'WM_TRANSIENT_FOR', 'WM_CLIENT_LEADER',
+    '_NET_SUPPORTED', '_NET_CLIENT_LIST', '_NET_CLIENT_LIST_STACKING',
+    '_NET_NUMBER_OF_DESKTOPS', '_NET_DESKTOP_GEOMETRY', '_NET_DESKTOP_VIEWPORT',
+    '_NET_CURRENT_DESKTOP', '_NET_DESKTOP_NAMES', '_NET_ACTIVE_WINDOW',
+    '_NET_WORKAREA', '_NET_SUPPORTING_WM_CHECK', '_NET_SHOWING_DESKTOP',
+    '_NET_CLOSE_WINDOW', '_NET_MOVERESIZE_WINDOW', '_NET_WM_MOVERESIZE',
+    '_NET_RESTACK_WINDOW', '_NET_WM_NAME', '_NET_WM_VISIBLE_NAME',
+    '_NET_WM_ICON_NAME', '_NET_WM_DESKTOP', '_NET_WM_WINDOW_TYPE',
+    '_NET_WM_STATE', '_NET_WM_ALLOWED_ACTIONS', '_NET_WM_STRUT',
+    '_NET_WM_STRUT_PARTIAL', '_NET_WM_PID', '_NET_WM_USER_TIME',
+    '_NET_FRAME_EXTENTS', '_NET_WM_STATE_MODAL', '_NET_WM_STATE_STICKY',
+    '_NET_WM_STATE_MAXIMIZED_VERT', '_NET_WM_STATE_MAXIMIZED_HORZ',
+    '_NET_WM_STATE_SHADED', '_NET_WM_STATE_SKIP_TASKBAR',
+    '_NET_WM_STATE_SKIP_PAGER', '_NET_WM_STATE_HIDDEN',
+    '_NET_WM_STATE_FULLSCREEN', '_NET_WM_STATE_ABOVE', '_NET_WM_STATE_BELOW',
+    '_NET_WM_STATE_DEMANDS_ATTENTION', '_NET_WM_WINDOW_TYPE_DESKTOP',
+    '_NET_WM_WINDOW_TYPE_DOCK', '_NET_WM_WINDOW_TYPE_TOOLBAR',
+    '_NET_WM_WINDOW_TYPE_MENU', '_NET_WM_WINDOW_TYPE_UTILITY',
+    '_NET_WM_WINDOW_TYPE_SPLASH', '_NET_WM_WINDOW_TYPE_DIALOG',
+    '_NET_WM_WINDOW_TYPE_NORMAL',
+)
+
 
 class AtomCache(object):
     def __init__(self, dpy):
         self.dpy = dpy
         self._cache = {}
+        self._names = {}
 
     def __getitem__(self, name):
         try:
@@ -20,57 +47,200 @@ class AtomCache(object):
             pass
 
         atom = self._cache[name] = XInternAtom(self.dpy, bstr(name), False)
+        self._names[atom] = name
         return atom
 
+    def prefetch(self, names, only_if_exists=False):
+        """Intern all unknown ``names`` with a single request
+
+        With ``only_if_exists`` names missing on server are not created
+        and not cached.
+        """
+        names = [r for r in set(names) if r not in self._cache]
+        if not names:
+            return
+
+        cnames = [ffi.new('char[]', bstr(r)) for r in names]
+        atoms = ffi.new('Atom[]', len(names))
+        XInternAtoms(self.dpy, ffi.new('char*[]', cnames), len(names),
+            only_if_exists, atoms)
+
+        for name, atom in zip(names, atoms):
+            if atom:
+                self._cache[name] = atom
+                self._names[atom] = name
+
+    def get_name(self, atom):
+        """Return atom name, None for unknown or zero atom"""
+        if atom not in self._names:
+            self.resolve((atom, ))
+
+        return self._names.get(atom)
+
+    def get_names(self, atoms):
+        """Return names for atom list fetching unknown ones at once"""
+        self.resolve(atoms)
+        return [self._names.get(r) for r in atoms]
+
+    def resolve(self, atoms):
+        """Fetch names of unknown ``atoms`` with a single request"""
+        atoms = [r for r in set(atoms) if r and r not in self._names]
+        if not atoms:
+            return
+
+        names = ffi.new('char*[]', len(atoms))
+        if not XGetAtomNames(self.dpy, ffi.new('Atom[]', atoms), len(atoms), names):
+            return
+
+        for atom, name in zip(atoms, names):
+            self._names[atom] = nstr(ffi.string(name))
+            self._cache.setdefault(self._names[atom], atom)
+            XFree(name)
+
 
 ITEM_SIZE = array('L').itemsize
 
-def get_window_property(display, window, property, type=0, split=False, size=50):
-    type_return = ffi.new('Atom *')
-    fmt_return = ffi.new('int *')
-    nitems_return = ffi.new('unsigned long *')
-    bytes_after = ffi.new('unsigned long *')
-    data = ffi.new('unsigned char **')
-    XGetWindowProperty(display, window, property, 0, size, False, type,
-        type_return, fmt_return, nitems_return, bytes_after, data)
-
-    fmt = fmt_return[0]
-    bafter = bytes_after[0]
-    result = b''
-    if fmt == 32:
-        result += btype(ffi.buffer(data[0], nitems_return[0]*ITEM_SIZE))
-    elif fmt == 8:
-        result += btype(ffi.buffer(data[0], nitems_return[0]))
-    elif not fmt:
+#: Initial request length in 32-bit units for properties of unknown size
+DEFAULT_LENGTH = 64
+MAX_LENGTH = 0xffffff
+
+
+class PropertyContext(object):
+    """Reusable XGetWindowProperty out-parameters of a display
+
+    Also remembers property lengths per atom, so properties longer than
+    :data:`DEFAULT_LENGTH` take a single request after the first read.
+    """
+    __slots__ = ('type', 'format', 'nitems', 'bytes_after', 'data', 'sizes')
+
+    def __init__(self):
+        self.type = ffi.new('Atom *')
+        self.format = ffi.new('int *')
+        self.nitems = ffi.new('unsigned long *')
+        self.bytes_after = ffi.new('unsigned long *')
+        self.data = ffi.new('unsigned char **')
+        self.sizes = {}
+
+
+_contexts = {}
+
+def get_property_context(display):
+    try:
+        return _contexts[display]
+    except KeyError:
+        pass
+
+    ctx = _contexts[display] = PropertyContext()
+    return ctx
+
+
+def get_window_property(display, window, property, type=0, split=False, size=None):
+    """Return property value
+
+    32-bit properties are returned as ``array('L')``, 8-bit ones as bytes
+    (list of bytes with ``split``), None for missing property or property
+    of other ``type``. Data is copied once from Xlib buffer. At most
+    ``size`` 32-bit units are read if it is given.
+    """
+    ctx = get_property_context(display)
+    length = size or ctx.sizes.get(property, DEFAULT_LENGTH)
+    data = ctx.data
+    XGetWindowProperty(display, window, property, 0, length, False, type,
+        ctx.type, ctx.format, ctx.nitems, ctx.bytes_after, data)
+
+    if type and ctx.type[0] != type:
+        # Property of other type has no data, bytes_after holds its
+        # length which must not be learned.
+        XFree(data[0])
         return None
-    else:
-        raise Exception('Unknown format {}'.format(fmt))
 
-    if bafter:
+    bafter = ctx.bytes_after[0]
+    if bafter and ctx.format[0] and not size and length < MAX_LENGTH:
+        # Property is larger than expected, refetch it whole and
+        # remember its size for the next time.
         XFree(data[0])
-        XGetWindowProperty(display, window, property, size, bafter / 4 + 1,
-            False, type, type_return, fmt_return, nitems_return, bytes_after, data)
-        fmt = fmt_return[0]
+        length = min(MAX_LENGTH, length + (bafter + 3) // 4)
+        ctx.sizes[property] = length
+        XGetWindowProperty(display, window, property, 0, length, False, type,
+            ctx.type, ctx.format, ctx.nitems, ctx.bytes_after, data)
+
+    fmt = ctx.format[0]
+    if not fmt:
+        return None
+
+    try:
         if fmt == 32:
-            result += btype(ffi.buffer(data[0], nitems_return[0]*ITEM_SIZE))
+            result = array('L')
+            (getattr(result, 'frombytes', None) or result.fromstring)(
+                ffi.buffer(data[0], ctx.nitems[0] * ITEM_SIZE))
         elif fmt == 8:
-            result += btype(ffi.buffer(data[0], nitems_return[0]))
+            result = ffi.buffer(data[0], ctx.nitems[0])[:].rstrip(b'\x00')
+            if split:
+                result = result.split(b'\x00')
         else:
             raise Exception('Unknown format {}'.format(fmt))
+    finally:
+        XFree(data[0])
 
-    if fmt_return[0] == 32:
-        result = array('L', result)
-    elif fmt_return[0] == 8:
-        result = result.rstrip(b'\x00')
-        if split:
-            result = result.split(b'\x00')
-    else:
-        raise Exception('Unknown format {}'.format(fmt_return[0]))
-
-    XFree(data[0])
     return result
 
 
+class Cookie(object):
+    """Pending request
+
+    Xlib has no asynchronous replies so the value is fetched when cookie
+    is created. Callers still issue all requests first and collect
+    replies later so the xcb backend can pipeline them.
+    """
+    __slots__ = ('value', )
+
+    def __init__(self, value):
+        self.value = value
+
+    def reply(self):
+        return self.value
+
+
+def request_window_property(display, window, property, type=0, split=False):
+    return Cookie(get_window_property(display, window, property, type, split))
+
+
+_geometry_out = None
+
+def get_geometry(display, window):
+    """Return (x, y, width, height), x and y are relative to parent"""
+    global _geometry_out
+    if _geometry_out is None:
+        _geometry_out = (ffi.new('Window *'), ffi.new('int *'), ffi.new('int *'),
+                         ffi.new('unsigned int *'), ffi.new('unsigned int *'),
+                         ffi.new('unsigned int *'), ffi.new('unsigned int *'))
+
+    out = _geometry_out
+    if not XGetGeometry(display, window, *out):
+        return 0, 0, 0, 0
+    return out[1][0], out[2][0], out[3][0], out[4][0]
+
+
+def get_root_position(display, window):
+    """Return (x, y) of window origin in root coordinates"""
+    out = ffi.new('int[2]')
+    if not XTranslateCoordinates(display, window, DefaultRootWindow(display),
+            0, 0, out, out + 1, ffi.new('Window *')):
+        return 0, 0
+    return out[0], out[1]
+
+
+def is_mapped(display, window):
+    attrs = ffi.new('XWindowAttributes *')
+    if not XGetWindowAttributes(display, window, attrs):
+        return False
+    return attrs.map_state != IsUnmapped
+
+
+def request_geometry(display, window):
+    return Cookie(get_geometry(display, window))
+
+
 def set_window_property(display, window, property, type, fmt, values):
     if fmt == 32:
         if values:
@@ -86,6 +256,36 @@ def set_window_property(display, window, property, type, fmt, values):
         data, len(values))
 
 
+def get_keycode_range(display):
+    min_code = ffi.new('int *')
+    max_code = ffi.new('int *')
+    XDisplayKeycodes(display, min_code, max_code)
+    return min_code[0], max_code[0]
+
+
+def get_keyboard_mapping(display, first, count):
+    """Return keysym tuples for ``count`` keycodes starting from ``first``"""
+    per_code = ffi.new('int *')
+    syms = XGetKeyboardMapping(display, first, count, per_code)
+    if syms == NULL:
+        return []
+
+    n = per_code[0]
+    result = [tuple(syms[i*n:(i+1)*n]) for i in range(count)]
+    XFree(syms)
+    return result
+
+
+def get_modifier_mapping(display):
+    """Return list of keycode lists for 8 modifiers (Shift ... Mod5)"""
+    modmap = XGetModifierMapping(display)
+    n = modmap.max_keypermod
+    result = [[c for c in modmap.modifiermap[i*n:(i+1)*n] if c]
+              for i in range(8)]
+    XFreeModifiermap(modmap)
+    return result
+
+
 def get_kbd_group(display):
     state = ffi.new('XkbStateRec *')
     XkbGetState(display, XkbUseCoreKbd, state)
@@ -95,3 +295,33 @@ def get_kbd_group(display):
 def set_kbd_group(display, group):
     XkbLockGroup(display, XkbUseCoreKbd, group)
     XFlush(display)
+
+
+BACKENDS = ('xlib', 'xcb')
+BACKEND_FUNCS = ('get_window_property', 'request_window_property',
+                 'get_geometry', 'request_geometry')
+
+backend = 'xlib'
+_xlib_funcs = {r: globals()[r] for r in BACKEND_FUNCS}
+
+
+def use_backend(name):
+    """Select implementation of property and geometry requests
+
+    ``xcb`` sends requests through libxcb on the same connection and
+    returns real cookies, so many requests can be in flight before any
+    reply is awaited. ``xlib`` does a round trip per request.
+    """
+    global backend
+    if name == 'xcb':
+        try:
+            from . import xcb
+        except ImportError:
+            raise ValueError('xcb backend is not built, X11-xcb headers are required')
+        globals().update((r, getattr(xcb, r)) for r in BACKEND_FUNCS)
+    elif name == 'xlib':
+        globals().update(_xlib_funcs)
+    else:
+        raise ValueError('Unknown backend {}'.format(name))
+
+    backend = name
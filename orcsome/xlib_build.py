@@ -12,6 +12,7 @@ ffi.set_source('orcsome._xlib', """
 """, libraries=['X11', 'Xss', 'Xext'])
 
 ffi.cdef("""
+    static const long KeyPressMask;
     static const long StructureNotifyMask;
     static const long SubstructureNotifyMask;
     static const long SubstructureRedirectMask;
@@ -28,6 +29,18 @@ ffi.cdef("""
     static const int FocusOut;
     static const int PropertyNotify;
     static const int ClientMessage;
+    static const int MappingNotify;
+    static const int ConfigureNotify;
+    static const int MapNotify;
+    static const int UnmapNotify;
+
+    static const int IsUnmapped;
+    static const int IsUnviewable;
+    static const int IsViewable;
+
+    static const int MappingModifier;
+    static const int MappingKeyboard;
+    static const int MappingPointer;
 
     static const int CWX;
     static const int CWY;
@@ -62,6 +75,8 @@ ffi.cdef("""
 
     static const int XkbUseCoreKbd;
 
+    static const int RevertToPointerRoot;
+
 
     typedef int Bool;
     typedef int Status;
@@ -75,6 +90,11 @@ ffi.cdef("""
     typedef unsigned char KeyCode;
     typedef ... Display;
 
+    typedef struct {
+            int max_keypermod;      /* This server's max number of keys per modifier */
+            KeyCode *modifiermap;   /* An 8 by max_keypermod array of the modifiers */
+    } XModifierKeymap;
+
     typedef struct {
             int type;
             unsigned long serial;	/* # of last request processed by server */
@@ -163,6 +183,52 @@ ffi.cdef("""
             int state;		/* NewValue, Deleted */
     } XPropertyEvent;
 
+    typedef struct {
+            int type;
+            unsigned long serial;	/* # of last request processed by server */
+            Bool send_event;	/* true if this came from a SendEvent request */
+            Display *display;	/* Display the event was read from */
+            Window event;
+            Window window;
+            int x, y;
+            int width, height;
+            int border_width;
+            Window above;
+            Bool override_redirect;
+    } XConfigureEvent;
+
+    typedef struct {
+            int type;
+            unsigned long serial;	/* # of last request processed by server */
+            Bool send_event;	/* true if this came from a SendEvent request */
+            Display *display;	/* Display the event was read from */
+            Window event;
+            Window window;
+            Bool override_redirect;	/* boolean, is override set... */
+    } XMapEvent;
+
+    typedef struct {
+            int type;
+            unsigned long serial;	/* # of last request processed by server */
+            Bool send_event;	/* true if this came from a SendEvent request */
+            Display *display;	/* Display the event was read from */
+            Window event;
+            Window window;
+            Bool from_configure;
+    } XUnmapEvent;
+
+    typedef struct {
+            int type;
+            unsigned long serial;	/* # of last request processed by server */
+            Bool send_event;	/* true if this came from a SendEvent request */
+            Display *display;	/* Display the event was read from */
+            Window window;		/* unused */
+            int request;		/* one of MappingModifier, MappingKeyboard,
+                                   MappingPointer */
+            int first_keycode;	/* first keycode */
+            int count;		/* defines range of change w. first_keycode*/
+    } XMappingEvent;
+
     typedef union {
         int type;
         XAnyEvent xany;
@@ -171,6 +237,10 @@ ffi.cdef("""
         XDestroyWindowEvent xdestroywindow;
         XFocusChangeEvent xfocus;
         XPropertyEvent xproperty;
+        XMappingEvent xmapping;
+        XConfigureEvent xconfigure;
+        XMapEvent xmap;
+        XUnmapEvent xunmap;
         ...;
     } XEvent;
 
@@ -210,8 +280,13 @@ ffi.cdef("""
     int XCloseDisplay(Display *display);
     int XFree(void *data);
     Atom XInternAtom(Display *display, char *atom_name, Bool only_if_exists);
+    Status XInternAtoms(Display *display, char **names, int count,
+        Bool only_if_exists, Atom *atoms_return);
+    Status XGetAtomNames(Display *display, Atom *atoms, int count, char **names_return);
 
     int XPending(Display *display);
+    int XQLength(Display *display);
+    unsigned long XNextRequest(Display *display);
     int XNextEvent(Display *display, XEvent *event_return);
     int XSelectInput(Display *display, Window w, long event_mask);
     int XFlush(Display *display);
@@ -220,6 +295,21 @@ ffi.cdef("""
 
     KeySym XStringToKeysym(char *string);
     KeyCode XKeysymToKeycode(Display *display, KeySym keysym);
+    typedef struct {
+        int x, y;
+        int width, height;
+        int border_width;
+        int map_state;
+        ...;
+    } XWindowAttributes;
+    Status XGetWindowAttributes(Display *display, Window w, XWindowAttributes *window_attributes_return);
+
+    int XDisplayKeycodes(Display *display, int *min_keycodes_return, int *max_keycodes_return);
+    KeySym *XGetKeyboardMapping(Display *display, KeyCode first_keycode,
+        int keycode_count, int *keysyms_per_keycode_return);
+    int XRefreshKeyboardMapping(XMappingEvent *event_map);
+    XModifierKeymap *XGetModifierMapping(Display *display);
+    int XFreeModifiermap(XModifierKeymap *modmap);
 
     int XGrabKey(Display *display, int keycode, unsigned int modifiers,
         Window grab_window, Bool owner_events, int pointer_mode, int keyboard_mode);
@@ -243,9 +333,18 @@ ffi.cdef("""
     int XConfigureWindow(Display *display, Window w, unsigned int value_mask,
         XWindowChanges *changes);
 
+    Window XCreateSimpleWindow(Display *display, Window parent, int x, int y,
+        unsigned int width, unsigned int height, unsigned int border_width,
+        unsigned long border, unsigned long background);
+    int XDestroyWindow(Display *display, Window w);
+    int XMapWindow(Display *display, Window w);
+    int XSetInputFocus(Display *display, Window focus, int revert_to, Time time);
+
     Status XGetGeometry(Display *display, Drawable d, Window *root_return,
         int *x_return, int *y_return, unsigned int *width_return,
         unsigned int *height_return, unsigned int *border_width_return, unsigned int *depth_return);
+    Bool XTranslateCoordinates(Display *display, Window src_w, Window dest_w,
+        int src_x, int src_y, int *dest_x_return, int *dest_y_return, Window *child_return);
 
     Status XScreenSaverQueryInfo(Display *dpy, Drawable drawable, XScreenSaverInfo *saver_info);
 
@@ -1,7 +1,26 @@
+import os
+import subprocess
 from setuptools import setup, find_packages
 
 import orcsome
 
+
+def has_xcb():
+    """xcb backend is optional, ORCSOME_XCB=0/1 overrides detection"""
+    force = os.environ.get('ORCSOME_XCB')
+    if force is not None:
+        return force == '1'
+
+    try:
+        return subprocess.call(['pkg-config', '--exists', 'x11-xcb', 'xcb']) == 0
+    except OSError:
+        return False
+
+
+cffi_modules = ["orcsome/ev_build.py:ffi", "orcsome/xlib_build.py:ffi"]
+if has_xcb():
+    cffi_modules.append("orcsome/xcb_build.py:ffi")
+
 setup(
     name     = 'orcsome',
     version  = orcsome.VERSION,
@@ -10,8 +29,8 @@ setup(
     description = 'Scripting extension for NETWM compliant window managers',
     long_description = open('README.rst').read(),
     zip_safe = False,
-    packages = find_packages(exclude=('tests', )),
-    cffi_modules=["orcsome/ev_build.py:ffi", "orcsome/xlib_build.py:ffi"],
+    packages = find_packages(exclude=('tests', 'bench')),
+    cffi_modules=cffi_modules,
     setup_requires=["cffi>=1.0.0"],
     install_requires = ['cffi>=1.0.0'],
     include_package_data = True,
@@ -0,0 +1,104 @@
+import pytest
+
+pytest.importorskip('orcsome._xlib')
+
+from orcsome import xlib as X
+from orcsome.run import find_config_atoms
+from orcsome.utils import bstr, nstr
+
+
+class Server(object):
+    """Atom table of X server counting requests"""
+    def __init__(self, names=()):
+        self.atoms = {}
+        self.requests = []
+        self._strings = []
+        for name in names:
+            self.intern(name)
+
+    def intern(self, name):
+        return self.atoms.setdefault(name, len(self.atoms) + 100)
+
+    def install(self, monkeypatch):
+        monkeypatch.setattr(X, 'XInternAtom', self.intern_atom)
+        monkeypatch.setattr(X, 'XInternAtoms', self.intern_atoms)
+        monkeypatch.setattr(X, 'XGetAtomNames', self.get_atom_names)
+        monkeypatch.setattr(X, 'XFree', lambda data: 1)
+
+    def intern_atom(self, dpy, name, only_if_exists):
+        self.requests.append('XInternAtom')
+        return self.intern(nstr(name))
+
+    def intern_atoms(self, dpy, names, count, only_if_exists, atoms):
+        self.requests.append('XInternAtoms')
+        for i in range(count):
+            name = nstr(X.ffi.string(names[i]))
+            if only_if_exists and name not in self.atoms:
+                atoms[i] = 0
+            else:
+                atoms[i] = self.intern(name)
+        return 1
+
+    def get_atom_names(self, dpy, atoms, count, names):
+        self.requests.append('XGetAtomNames')
+        byatom = dict((v, k) for k, v in self.atoms.items())
+        if not all(atoms[i] in byatom for i in range(count)):
+            return 0
+        for i in range(count):
+            s = X.ffi.new('char[]', bstr(byatom[atoms[i]]))
+            self._strings.append(s)
+            names[i] = s
+        return 1
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = Server(['WM_NAME'])
+    server.install(monkeypatch)
+    return server
+
+
+def test_prefetch_interns_in_one_request(server):
+    cache = X.AtomCache(X.NULL)
+    cache.prefetch(X.KNOWN_ATOMS)
+    assert server.requests == ['XInternAtoms']
+
+    for name in X.KNOWN_ATOMS:
+        assert cache[name] == server.atoms[name]
+    cache.prefetch(X.KNOWN_ATOMS)
+    assert server.requests == ['XInternAtoms']
+
+    assert cache['_NEW_ATOM'] == server.atoms['_NEW_ATOM']
+    assert server.requests == ['XInternAtoms', 'XInternAtom']
+
+
+def test_prefetch_only_existing(server):
+    cache = X.AtomCache(X.NULL)
+    cache.prefetch(['WM_NAME', '_MISSING'], only_if_exists=True)
+    assert '_MISSING' not in server.atoms
+    assert cache.get_name(server.atoms['WM_NAME']) == 'WM_NAME'
+    assert server.requests == ['XInternAtoms']
+
+
+def test_reverse_lookup_batches_unknown_atoms(server):
+    a, b = server.intern('A'), server.intern('B')
+    cache = X.AtomCache(X.NULL)
+
+    assert cache.get_names([a, b, 0, a]) == ['A', 'B', None, 'A']
+    assert server.requests == ['XGetAtomNames']
+
+    assert cache.get_name(b) == 'B'
+    assert cache['A'] == a
+    assert server.requests == ['XGetAtomNames']
+
+    assert cache.get_name(12345) is None
+
+
+def test_find_config_atoms(tmpdir):
+    config = tmpdir.join('rc.py')
+    config.write('wm.get_root_property("_NET_WORKAREA")\n'
+                 "wm.on_property_change('WM_NAME', '_MY_ATOM')\n"
+                 "print('_lower', 'NOT_ATOM')\n")
+    assert sorted(find_config_atoms(str(config))) == [
+        'WM_NAME', '_MY_ATOM', '_NET_WORKAREA']
+    assert find_config_atoms(str(tmpdir.join('missing.py'))) == []
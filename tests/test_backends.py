@@ -0,0 +1,59 @@
+import shutil
+
+import pytest
+
+pytest.importorskip('orcsome._xlib')
+pytest.importorskip('orcsome._xcb')
+
+from orcsome import xlib as X
+if not shutil.which('Xvfb'):
+    pytest.skip('Xvfb is required', allow_module_level=True)
+
+from bench.xvfb import Xvfb
+from bench.clients import ClientGenerator
+from bench.property import CASES
+
+
+@pytest.fixture
+def gen():
+    with Xvfb():
+        gen = ClientGenerator()
+        try:
+            yield gen
+        finally:
+            gen.close()
+
+
+def fetch(dpy, atom, window):
+    result = []
+    for name, _, _, _ in CASES + [('_ORCSOME_MISSING', None, None, None)]:
+        result.append(X.get_window_property(dpy, window, atom[name]))
+        result.append(X.request_window_property(dpy, window, atom[name],
+                                                split=True).reply())
+    result.append(X.get_geometry(dpy, window))
+    result.append(X.request_geometry(dpy, window).reply())
+    return result
+
+
+def test_backends_return_same_values(gen):
+    window = gen.create('test', 'Test', 'title')
+    for name, type, fmt, value in CASES:
+        X.set_window_property(gen.dpy, window, gen.atom[name], gen.atom[type],
+                              fmt, value)
+    gen.sync()
+
+    dpy = X.XOpenDisplay(X.NULL)
+    atom = X.AtomCache(dpy)
+    try:
+        results = {}
+        for backend in X.BACKENDS:
+            X.use_backend(backend)
+            results[backend] = fetch(dpy, atom, window)
+    finally:
+        X.use_backend('xlib')
+        X.XCloseDisplay(dpy)
+
+    for a, b in zip(results['xlib'], results['xcb']):
+        assert type(a) is type(b)
+        assert getattr(a, 'typecode', None) == getattr(b, 'typecode', None)
+        assert a == b
@@ -0,0 +1,60 @@
+import pytest
+
+pytest.importorskip('orcsome._xlib')
+
+from orcsome.wm import merge_client_messages
+
+STATE, ACTIVE = 1, 2
+VMAX, HMAX, ABOVE, STICKY, SKIP = 10, 11, 12, 13, 14
+A, B = 100, 101
+REMOVE, ADD, TOGGLE = 0, 1, 2
+
+
+def state(window, action, first, second=0, source=2):
+    return window, STATE, [action, first, second, source, 0]
+
+
+def merge(messages):
+    return merge_client_messages(messages, STATE, ((VMAX, HMAX), ))
+
+
+def test_merge_same_action():
+    result = merge([state(A, ADD, ABOVE), state(A, ADD, STICKY),
+                    state(A, ADD, SKIP)])
+    assert result == [state(A, ADD, ABOVE, STICKY), state(A, ADD, SKIP)]
+
+
+def test_last_action_wins():
+    result = merge([state(A, ADD, ABOVE), state(A, REMOVE, ABOVE)])
+    assert result == [state(A, REMOVE, ABOVE)]
+
+
+def test_maximize_pair_stays_in_one_message():
+    result = merge([state(A, ADD, ABOVE), state(A, ADD, VMAX),
+                    state(A, ADD, HMAX)])
+    assert result == [state(A, ADD, ABOVE), state(A, ADD, VMAX, HMAX)]
+
+    result = merge([state(A, ADD, HMAX), state(A, ADD, ABOVE),
+                    state(A, ADD, STICKY), state(A, ADD, VMAX)])
+    assert result == [state(A, ADD, HMAX, VMAX), state(A, ADD, ABOVE, STICKY)]
+
+
+def test_pair_with_different_actions_is_not_joined():
+    result = merge([state(A, ADD, VMAX), state(A, REMOVE, HMAX)])
+    assert result == [state(A, ADD, VMAX), state(A, REMOVE, HMAX)]
+
+
+def test_order_across_windows_is_kept():
+    messages = [state(A, ADD, ABOVE), state(B, ADD, ABOVE),
+                state(A, ADD, STICKY)]
+    assert merge(messages) == messages
+
+    activate = (B, ACTIVE, [2, 0, 0, 0, 0])
+    messages = [state(A, ADD, ABOVE), activate, state(A, ADD, STICKY)]
+    assert merge(messages) == messages
+
+
+def test_toggle_flushes_pending():
+    messages = [state(A, ADD, ABOVE), state(A, TOGGLE, STICKY),
+                state(A, ADD, SKIP)]
+    assert merge(messages) == messages
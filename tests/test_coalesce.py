@@ -0,0 +1,72 @@
+import pytest
+
+pytest.importorskip('orcsome._xlib')
+
+from orcsome import xlib as X
+from orcsome.wm import coalesce
+
+ROOT = 1
+A, B = 10, 11
+NAME, TITLE = 100, 101
+
+
+def event(member, type, **fields):
+    e = X.ffi.new('XEvent *')
+    data = getattr(e, member)
+    data.type = type
+    for name, value in fields.items():
+        setattr(data, name, value)
+    return e[0]
+
+
+def prop(window, atom):
+    return event('xproperty', X.PropertyNotify, window=window, atom=atom)
+
+
+def configure(window, x=0, above=0, send_event=False):
+    return event('xconfigure', X.ConfigureNotify, event=ROOT, window=window,
+                 x=x, above=above, send_event=send_event)
+
+
+def check(events, kept):
+    result = coalesce(events)
+    assert [events.index(r) for r in result] == kept
+
+
+def test_nothing_to_drop():
+    events = [prop(A, NAME), prop(A, TITLE), prop(B, NAME), configure(A)]
+    assert coalesce(events) is events
+
+
+def test_repeated_property_keeps_last():
+    check([prop(A, NAME), prop(B, NAME), prop(A, TITLE), prop(A, NAME)],
+          [1, 2, 3])
+
+
+def test_repeated_configure_keeps_last():
+    check([configure(A, 1), configure(B, 1), configure(A, 2), configure(A, 3)],
+          [1, 3])
+
+
+def test_configure_kinds_are_not_merged():
+    check([configure(A, 1), configure(A, 2, send_event=True), configure(A, 3)],
+          [0, 1, 2])
+
+
+def test_configure_kept_for_dependent_events():
+    # property handler may read geometry of A
+    check([configure(A, 1), prop(A, NAME), configure(A, 2)], [0, 1, 2])
+
+    # B is restacked relative to A's position at that moment
+    check([configure(A, 1), configure(B, above=A), configure(A, 2)], [0, 1, 2])
+
+
+def test_created_and_destroyed_window_dropped():
+    events = [
+        event('xcreatewindow', X.CreateNotify, parent=ROOT, window=A),
+        event('xmap', X.MapNotify, event=ROOT, window=A),
+        prop(B, NAME),
+        configure(A),
+        event('xdestroywindow', X.DestroyNotify, event=ROOT, window=A),
+    ]
+    check(events, [2])
@@ -0,0 +1,153 @@
+import select
+import socket
+import threading
+
+import pytest
+
+from orcsome import dbus
+
+ev = pytest.importorskip('orcsome.ev')
+
+
+class Bus(threading.Thread):
+    """Session bus stand-in on the other end of a socketpair
+
+    Accepts any EXTERNAL auth, answers Hello, replies error to ``Fail``,
+    never answers ``Hang`` and echoes arguments of other calls.
+    """
+    def __init__(self, sock):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.sock = sock
+        self.calls = []
+
+    def read_until(self, buf, marker):
+        while marker not in buf:
+            data = self.sock.recv(4096)
+            if not data:
+                raise EOFError
+            buf += data
+        return buf.split(marker, 1)
+
+    def run(self):
+        try:
+            line, buf = self.read_until(b'', b'\r\n')
+            assert line.startswith(b'\x00AUTH EXTERNAL ')
+            self.sock.sendall(b'OK 0123456789abcdef\r\n')
+            _, buf = self.read_until(buf, b'BEGIN\r\n')
+
+            buf = bytearray(buf)
+            while True:
+                size = dbus.message_size(buf)
+                if size is None or size > len(buf):
+                    data = self.sock.recv(4096)
+                    if not data:
+                        return
+                    buf.extend(data)
+                    continue
+
+                self.reply(*dbus.parse_message(bytes(buf[:size])))
+                del buf[:size]
+        except (EOFError, socket.error):
+            pass
+
+    def reply(self, mtype, flags, serial, fields, args):
+        member = fields[dbus.F_MEMBER]
+        self.calls.append((member, args))
+        if flags & dbus.NO_REPLY_EXPECTED or member == 'Hang':
+            return
+
+        reply_fields = [(dbus.F_REPLY_SERIAL, ('u', serial))]
+        if member == 'Hello':
+            msg = dbus.build_message(dbus.METHOD_RETURN, 1, reply_fields, 's', [':1.7'])
+        elif member == 'Fail':
+            reply_fields.append((dbus.F_ERROR_NAME, ('s', 'test.Error')))
+            msg = dbus.build_message(dbus.ERROR, 1, reply_fields, 's', ['failed'])
+        else:
+            msg = dbus.build_message(dbus.METHOD_RETURN, 1, reply_fields,
+                                     fields.get(dbus.F_SIGNATURE, ''), args)
+        self.sock.sendall(msg)
+
+
+@pytest.fixture
+def bus():
+    client, server = socket.socketpair()
+    bus = Bus(server)
+    bus.start()
+    conn = dbus.Connection(sock=client)
+    yield conn, bus
+    conn.close()
+    server.close()
+
+
+def read_replies(conn):
+    while conn.pending:
+        select.select([conn.sock], [], [], 1)
+        conn._on_read(conn.loop, None, 0)
+
+
+def test_hello_and_sync_call(bus):
+    conn, server = bus
+    assert conn.unique_name == ':1.7'
+
+    args = ['text', 42, [1, 2], {'k': ('s', 'v')}, (1, 'a')]
+    assert conn.call_sync('dest', '/path', 'iface', 'Echo', 'suaia{sv}(is)', args) == args
+    assert server.calls[-1] == ('Echo', args)
+
+
+def test_async_calls_and_errors(bus):
+    conn, server = bus
+    conn.attach(ev.Loop())
+
+    replies = []
+    conn.call('dest', '/path', 'iface', 'Echo', 'su', ['a', 1],
+              lambda args, error: replies.append((args, error)))
+    conn.call('dest', '/path', 'iface', 'Fail',
+              callback=lambda args, error: replies.append((args, error)))
+    read_replies(conn)
+
+    assert replies == [(['a', 1], None), (['failed'], ('test.Error', 'failed'))]
+
+
+def test_write_error_closes_connection(bus):
+    conn, server = bus
+    conn.attach(ev.Loop())
+    server.sock.shutdown(socket.SHUT_RDWR)
+    server.join(1)
+
+    replies = []
+    conn.call('dest', '/path', 'iface', 'Echo', 's', ['a'],
+              lambda args, error: replies.append(error))
+
+    assert conn.closed
+    assert replies == [dbus.DISCONNECTED]
+    with pytest.raises(dbus.DBusError):
+        conn.call('dest', '/path', 'iface', 'Echo')
+
+
+def test_strings_accept_bytes_and_text():
+    fields = lambda: [(dbus.F_MEMBER, ('s', 'Notify'))]
+    text = dbus.build_message(dbus.METHOD_CALL, 1, fields(), 'ss',
+                              [u'caf\xe9', 'ascii'])
+    data = dbus.build_message(dbus.METHOD_CALL, 1, fields(), 'ss',
+                              [u'caf\xe9'.encode('utf-8'), b'ascii'])
+    assert text == data
+    assert dbus.parse_message(data)[-1] == [u'caf\xe9', 'ascii']
+
+
+def test_malformed_reply_closes_connection(bus):
+    conn, server = bus
+    conn.attach(ev.Loop())
+
+    replies = []
+    conn.call('dest', '/path', 'iface', 'Hang',
+              callback=lambda args, error: replies.append(error))
+
+    # body is shorter than its signature
+    server.sock.sendall(dbus.build_message(
+        dbus.METHOD_RETURN, 1, [(dbus.F_REPLY_SERIAL, ('u', 999))], 'u', []))
+    while not conn.closed:
+        select.select([conn.sock], [], [], 1)
+        conn._on_read(conn.loop, None, 0)
+
+    assert replies == [dbus.DISCONNECTED]
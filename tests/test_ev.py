@@ -0,0 +1,105 @@
+import os
+import threading
+
+import pytest
+
+pytest.importorskip('orcsome._ev')
+
+from orcsome import ev
+
+
+@pytest.fixture
+def loop():
+    return ev.Loop()
+
+
+def test_backend_selection():
+    assert ev.Loop('select').backend == 'select'
+    assert ev.Loop('auto').backend in ev.BACKENDS
+
+    supported = ev.ev_supported_backends()
+    missing = [name for name, flags in ev.BACKENDS.items()
+               if flags and not flags & supported]
+    if not missing:
+        pytest.skip('every libev backend is supported')
+
+    with pytest.raises(ValueError):
+        ev.Loop(missing[0])
+
+
+def test_prepare_check_idle(loop):
+    calls = []
+
+    def prepare(l, w, e):
+        calls.append('prepare')
+
+    def check(l, w, e):
+        calls.append('check')
+
+    def idle(l, w, e):
+        calls.append('idle')
+        loop.break_()
+
+    watchers = [ev.PrepareWatcher(prepare), ev.CheckWatcher(check),
+                ev.IdleWatcher(idle)]
+    for w in watchers:
+        w.start(loop)
+    try:
+        loop.run()
+    finally:
+        for w in watchers:
+            w.stop(loop)
+
+    assert calls[:3] == ['prepare', 'check', 'idle']
+
+
+def test_async_wakes_loop_from_thread(loop):
+    woken = []
+
+    def wakeup(l, w, e):
+        woken.append(True)
+        loop.break_()
+
+    watcher = ev.AsyncWatcher(wakeup)
+    watcher.start(loop)
+    # guards against hang if wakeup is lost
+    timeout = ev.TimerWatcher(lambda l, w, e: loop.break_(), 5)
+    timeout.start(loop)
+
+    thread = threading.Thread(target=watcher.send, args=(loop, ))
+    thread.start()
+    try:
+        loop.run()
+    finally:
+        thread.join()
+        watcher.stop(loop)
+        timeout.stop(loop)
+
+    assert woken == [True]
+
+
+def test_child_status(loop):
+    pid = os.fork()
+    if not pid:
+        os._exit(3)
+
+    result = []
+
+    def exited(l, w, e):
+        result.append((watcher.pid, os.WEXITSTATUS(watcher.status)))
+        loop.break_()
+
+    watcher = ev.ChildWatcher(exited, pid)
+    watcher.start(loop)
+    try:
+        loop.run()
+    finally:
+        watcher.stop(loop)
+
+    assert result == [(pid, 3)]
+
+
+def test_now_update(loop):
+    before = loop.now()
+    loop.now_update()
+    assert loop.now() >= before
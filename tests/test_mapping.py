@@ -0,0 +1,67 @@
+import pytest
+
+pytest.importorskip('orcsome._xlib')
+
+from orcsome import xlib as X
+from orcsome.wm import WM
+
+
+class Keymap(object):
+    def __init__(self, calls):
+        self.calls = calls
+
+    def update(self, first, count):
+        self.calls.append(('update', first, count))
+
+
+class StubWM(object):
+    def __init__(self):
+        self.calls = []
+        self.keymap = Keymap(self.calls)
+
+    def rebind_keys(self):
+        self.calls.append('rebind')
+
+    def update_modifiers(self):
+        self.calls.append('modifiers')
+
+
+def mapping_event(request, first_keycode=0, count=0):
+    event = X.ffi.new('XEvent *')
+    event.xmapping.type = X.MappingNotify
+    event.xmapping.request = request
+    event.xmapping.first_keycode = first_keycode
+    event.xmapping.count = count
+    return event
+
+
+@pytest.fixture
+def refreshed(monkeypatch):
+    result = []
+
+    # cffi callback converts arguments like the real binding does
+    @X.ffi.callback('int(XMappingEvent *)')
+    def refresh(event):
+        result.append((event.request, event.first_keycode, event.count))
+        return 1
+
+    monkeypatch.setattr(X, 'XRefreshKeyboardMapping', refresh)
+    return result
+
+
+def handle_mapping(wm, event):
+    WM.__dict__['handle_mapping'](wm, event)
+
+
+def test_keyboard_mapping(refreshed):
+    wm = StubWM()
+    handle_mapping(wm, mapping_event(X.MappingKeyboard, 10, 5))
+    assert refreshed == [(X.MappingKeyboard, 10, 5)]
+    assert wm.calls == [('update', 10, 5), 'rebind', 'modifiers']
+
+
+def test_modifier_mapping(refreshed):
+    wm = StubWM()
+    handle_mapping(wm, mapping_event(X.MappingModifier))
+    assert refreshed == [(X.MappingModifier, 0, 0)]
+    assert wm.calls == ['modifiers']
@@ -0,0 +1,22 @@
+import os
+
+import pytest
+
+process = pytest.importorskip('orcsome.process')
+
+
+def open_fds():
+    return len(os.listdir('/proc/self/fd'))
+
+
+def test_split_command():
+    assert process.split_command('xterm -e top') == ['xterm', '-e', 'top']
+    assert process.split_command(['a b', 'c']) == ['a b', 'c']
+    assert process.split_command('ls | wc')[1:] == ['-c', 'ls | wc']
+
+
+def test_missing_command_is_logged_and_closes_pipe(caplog):
+    before = open_fds()
+    assert process.spawn(None, 'orcsome-no-such-command', capture=True) is None
+    assert open_fds() == before
+    assert 'Failed to spawn' in caplog.text
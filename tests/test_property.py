@@ -0,0 +1,89 @@
+import pytest
+
+pytest.importorskip('orcsome._xlib')
+
+from array import array
+
+from orcsome import xlib as X
+
+DPY = object()
+WIN = 1
+CARDINAL, STRING = 6, 31
+LONG, NAME = 100, 101
+
+
+class Server(object):
+    """XGetWindowProperty with X server semantics counting requests"""
+    def __init__(self):
+        self.props = {}
+        self.requests = []
+        self._buffers = []
+
+    def install(self, monkeypatch):
+        monkeypatch.setattr(X, 'XGetWindowProperty', self.get_property)
+        monkeypatch.setattr(X, 'XFree', lambda data: 1)
+        monkeypatch.setattr(X, '_contexts', {})
+
+    def get_property(self, dpy, window, property, offset, length, delete,
+                     req_type, type, format, nitems, bytes_after, data):
+        self.requests.append(length)
+        if property not in self.props:
+            type[0] = format[0] = nitems[0] = bytes_after[0] = 0
+            data[0] = X.NULL
+            return 0
+
+        ptype, fmt, value = self.props[property]
+        type[0] = ptype
+        format[0] = fmt
+        size = fmt // 8
+        if req_type and req_type != ptype:
+            nitems[0] = 0
+            bytes_after[0] = len(value)
+            buf = X.ffi.new('char[]', 1)
+        else:
+            chunk = value[offset * 4:(offset + length) * 4]
+            nitems[0] = len(chunk) // size
+            bytes_after[0] = len(value) - offset * 4 - len(chunk)
+            if fmt == 32:
+                chunk = array('L', array('I', chunk).tolist()).tobytes()
+            buf = X.ffi.new('char[]', chunk + b'\x00')
+
+        self._buffers.append(buf)
+        data[0] = X.ffi.cast('unsigned char *', buf)
+        return 0
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = Server()
+    server.install(monkeypatch)
+    server.props[LONG] = CARDINAL, 32, array('I', range(100)).tobytes()
+    server.props[NAME] = STRING, 8, b'name'
+    return server
+
+
+def test_long_property_size_is_learned(server):
+    assert list(X.get_window_property(DPY, WIN, LONG)) == list(range(100))
+    assert server.requests == [X.DEFAULT_LENGTH, 100]
+    assert list(X.get_window_property(DPY, WIN, LONG, CARDINAL)) == list(range(100))
+    assert server.requests == [X.DEFAULT_LENGTH, 100, 100]
+
+
+def test_type_mismatch_is_not_refetched(server):
+    assert X.get_window_property(DPY, WIN, LONG, STRING) is None
+    assert server.requests == [X.DEFAULT_LENGTH]
+    assert LONG not in X.get_property_context(DPY).sizes
+
+    assert X.get_window_property(DPY, WIN, NAME, CARDINAL) is None
+    assert X.get_window_property(DPY, WIN, NAME, STRING) == b'name'
+
+
+def test_explicit_size_is_honoured(server):
+    assert list(X.get_window_property(DPY, WIN, LONG, size=10)) == list(range(10))
+    assert server.requests == [10]
+    assert LONG not in X.get_property_context(DPY).sizes
+
+
+def test_missing_property(server):
+    assert X.get_window_property(DPY, WIN, 200) is None
+    assert X.get_window_property(DPY, WIN, 200, CARDINAL) is None
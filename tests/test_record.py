@@ -0,0 +1,72 @@
+import pickle
+
+import pytest
+
+pytest.importorskip('orcsome._xlib')
+
+from orcsome import ev, xlib as X
+from orcsome.wm import WM
+from orcsome.actions import Actions
+from orcsome.fakex import FakeDisplay
+from orcsome.record import (MAGIC, HEADER, COUNT, ATOMS, PENDING, REPLY,
+                            Recorder, ReplayDisplay, read_log, replay)
+
+
+def write_log(path, records):
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        for t, (kind, payload) in enumerate(records):
+            f.write(HEADER.pack(kind, t, len(payload)))
+            f.write(payload)
+
+
+def test_replay_display(tmpdir):
+    path = str(tmpdir.join('session.log'))
+    write_log(path, [
+        (ATOMS, pickle.dumps([('_NET_ACTIVE_WINDOW', 300)])),
+        (REPLY, pickle.dumps(('get_geometry', (5, ), (1, 2, 3, 4)))),
+        (PENDING, COUNT.pack(0)),
+    ])
+    assert [r[0] for r in read_log(path)] == [ATOMS, REPLY, PENDING]
+
+    saved = X.XOpenDisplay
+    with ReplayDisplay(path) as display:
+        assert display.duration == 2
+        assert X.XInternAtom(X.NULL, b'_NET_ACTIVE_WINDOW', True) == 300
+        assert X.XInternAtom(X.NULL, b'NEW_ATOM', True) == 0
+        assert X.XInternAtom(X.NULL, b'NEW_ATOM', False) == 301
+        assert X.get_geometry(X.NULL, 5) == (1, 2, 3, 4)
+        assert X.get_geometry(X.NULL, 6) == (0, 0, 0, 0)
+        assert X.XStringToKeysym(b'a') == ord('a')
+        assert X.XPending(X.NULL) == 0
+    assert X.XOpenDisplay is saved
+
+
+def test_read_log_rejects_other_files(tmpdir):
+    path = tmpdir.join('other.log')
+    path.write('garbage')
+    with pytest.raises(ValueError):
+        list(read_log(str(path)))
+
+
+def test_replay_recorded_session(tmpdir):
+    path = str(tmpdir.join('session.log'))
+    with FakeDisplay() as fake:
+        recorder = Recorder(path)
+        recorder.install()
+        wm = WM(ev.Loop())
+        wm.mix(Actions)
+        wm.init()
+
+        fake.create_windows(3, cls='Term')
+        fake.set_desktop(1)
+        fake.dispatch(wm)
+        dispatched = wm.events_dispatched
+
+        wm.stop(True)
+        recorder.close()
+
+    saved = X.XOpenDisplay
+    result = replay(path)
+    assert X.XOpenDisplay is saved
+    assert result['events'] == result['dispatched'] == dispatched > 0
@@ -0,0 +1,91 @@
+from orcsome.rules import RuleIndex
+from orcsome.utils import match_string
+
+
+class Window(object):
+    def __init__(self, cls=None, name=None, role=None, title=None, desktop=0):
+        self.desktop = desktop
+        self.cls = cls
+        self.name = name
+        self.role = role
+        self.title = title
+
+    def matches(self, **matchers):
+        for k, v in matchers.items():
+            value = getattr(self, k)
+            if not (value == v if k == 'desktop' else match_string(v, value)):
+                return False
+        return True
+
+
+def funcs(rules):
+    return [r.func for r in rules]
+
+
+def test_literal_is_prefix_match():
+    index = RuleIndex()
+    index.add('fire', {'cls': 'Fire'})
+    index.add('firefox', {'cls': 'Firefox'})
+    index.add('long', {'cls': 'FirefoxNightlyBuild'})
+
+    assert funcs(index.match(Window(cls='Firefox'))) == ['fire', 'firefox']
+    assert funcs(index.match(Window(cls='Fir'))) == []
+    assert funcs(index.match(Window(cls='XTerm'))) == []
+    assert funcs(index.match(Window())) == []
+
+
+def test_literal_checks_rest_matchers():
+    index = RuleIndex()
+    index.add('browser', {'cls': 'Firefox', 'role': 'browser'})
+
+    assert funcs(index.match(Window(cls='Firefox', role='browser'))) == ['browser']
+    assert funcs(index.match(Window(cls='Firefox', role='dialog'))) == []
+
+
+def test_mixed_literal_and_regex_rules():
+    index = RuleIndex()
+    index.add('literal', {'cls': 'XTerm'})
+    index.add('regex', {'cls': 'X.*m$'})
+    index.add('other', {'cls': 'Fire.*'})
+    index.add('title', {'title': '.*vim'})
+    index.add('always', {'desktop': 0})
+
+    assert funcs(index.match(Window(cls='XTerm', title='~ - vim'))) == [
+        'literal', 'regex', 'title', 'always']
+    assert funcs(index.match(Window(cls='Firefox'))) == ['other', 'always']
+
+
+def test_merged_regexes_report_every_match():
+    index = RuleIndex()
+    index.add('any', {'name': '.*'})
+    index.add('empty', {'name': 'x?'})
+    index.add('alt', {'name': 'a|b'})
+    index.add('group', {'name': '(ab)+$'})
+
+    assert funcs(index.match(Window(name='abab'))) == ['any', 'empty', 'alt', 'group']
+    assert funcs(index.match(Window(name='c'))) == ['any', 'empty']
+
+
+def test_order_by_seq():
+    index = RuleIndex()
+    index.add(1, {'name': 'term.*'})
+    index.add(2, {'cls': 'XTerm'})
+    index.add(3, {'desktop': 0})
+    index.add(4, {'cls': 'X'})
+    index.add(5, {'name': 'term'})
+
+    w = Window(cls='XTerm', name='terminal')
+    assert funcs(index.match(w)) == [1, 2, 3, 4, 5]
+
+    index.remove(index.rules[1])
+    assert funcs(index.match(w)) == [1, 3, 4, 5]
+
+
+def test_ignore_startup():
+    index = RuleIndex()
+    index.add('manage', {'cls': 'XTerm'})
+    index.add('create', {'cls': 'XTerm'}, ignore_startup=True)
+
+    w = Window(cls='XTerm')
+    assert funcs(index.match(w)) == ['manage', 'create']
+    assert funcs(index.match(w, startup=True)) == ['manage']
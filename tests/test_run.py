@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip('orcsome._xlib')
+
+from orcsome.run import check_config
+
+
+def write_config(tmpdir, source):
+    config = tmpdir.join('rc.py')
+    config.write('from orcsome import get_wm\nwm = get_wm()\n' + source)
+    return str(config)
+
+
+def test_check_config_accepts_timer_options(tmpdir):
+    config = write_config(tmpdir, '''
+@wm.on_timer(5, first_timeout=1)
+def tick():
+    pass
+
+wm.on_timer(10, False, window=None)(tick)
+''')
+    assert check_config(config)
+
+
+def test_check_config_reports_errors(tmpdir):
+    assert not check_config(write_config(tmpdir, 'wm.on_timer(5, period=1)'))
+
+
+def test_check_config_accepts_batch_layout_and_stats(tmpdir):
+    config = write_config(tmpdir, '''
+wm.enable_stats(0.01)
+
+@wm.on_key('Mod+t')
+def tile():
+    with wm.batch():
+        wm.apply_layout('master_stack', ratio=0.5)
+
+wm.on_key('Mod+Return').spawn('xterm')
+tile()
+assert wm.loop is wm.loop
+''')
+    assert check_config(config)
+
+
+def test_check_config_rejects_unknown_layout(tmpdir):
+    assert not check_config(write_config(tmpdir, 'wm.apply_layout("spiral")'))
@@ -0,0 +1,86 @@
+import logging
+
+from orcsome import stats
+from orcsome.stats import HandlerStats, func_name
+from orcsome.utils import ActionCaller
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Actions(object):
+    def spawn(self, cmd):
+        pass
+
+
+def handler():
+    pass
+
+
+def slow(clock, elapsed):
+    def func():
+        clock.now += elapsed
+    return func
+
+
+def test_func_name():
+    assert func_name(handler) == __name__ + '.handler'
+    action = ActionCaller(Actions(), lambda func: func).spawn('xterm')
+    assert func_name(action) == 'spawn'
+
+
+def test_records_accumulate(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(stats, 'perf_counter', clock)
+    s = HandlerStats()
+
+    func = slow(clock, 0.001)
+    for _ in range(3):
+        s.call('key', 'Win+x', func)
+    s.call('create', {'cls': 'Term', 'desktop': 1}, slow(clock, 0.004))
+
+    report = s.report()
+    assert [(r['kind'], r['binding'], r['count']) for r in report] == [
+        ('create', "cls='Term', desktop=1", 1), ('key', 'Win+x', 3)]
+
+    key = report[1]
+    assert abs(key['total_ms'] - 3) < 1e-6
+    assert abs(key['avg_us'] - 1000) < 1e-3
+    assert key['p50_us'] == 1024
+    assert sum(key['histogram']) == 3
+
+    s.reset()
+    assert s.report() == []
+
+
+def test_result_and_errors_pass_through(monkeypatch):
+    s = HandlerStats()
+    assert s.call('timer', 5, lambda: 42) == 42
+
+    def boom():
+        raise KeyError('boom')
+
+    try:
+        s.call('timer', 5, boom)
+    except KeyError:
+        pass
+    assert sum(r['count'] for r in s.report()) == 2
+
+
+def test_slow_calls_are_logged(monkeypatch, caplog):
+    clock = Clock()
+    monkeypatch.setattr(stats, 'perf_counter', clock)
+    s = HandlerStats(budget=0.01)
+
+    with caplog.at_level(logging.WARNING, 'orcsome.stats'):
+        s.call('key', 'Win+a', slow(clock, 0.005))
+        s.call('key', 'Win+b', slow(clock, 0.02))
+
+    messages = [r.getMessage() for r in caplog.records]
+    assert len(messages) == 1
+    assert 'Win+b' in messages[0] and '20.0 ms' in messages[0]
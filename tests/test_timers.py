@@ -0,0 +1,107 @@
+from orcsome import ev
+from orcsome.timers import TimerService
+
+
+def make_service(clock, wall=None):
+    wall = wall or [1000.0]
+    service = TimerService(ev.Loop())
+    service.now = lambda: clock[0]
+    service.time = lambda: clock[0] + wall[0]
+    return service
+
+
+def fire(service, clock, t):
+    clock[0] = t
+    service._expired(service.loop, None, 0)
+
+
+def test_start_with_zero_timeouts():
+    clock = [0.0]
+    service = make_service(clock)
+    calls = []
+    timer = service.add(lambda timer: calls.append(clock[0]), 5, 5)
+
+    timer.start(0, 0)
+    assert (timer.after, timer.repeat) == (0, 0)
+    fire(service, clock, 0.0)
+    fire(service, clock, 10.0)
+    assert calls == [0.0]
+    assert not timer.active
+
+
+def test_start_keeps_timeouts_by_default():
+    clock = [0.0]
+    service = make_service(clock)
+    calls = []
+    timer = service.add(lambda timer: calls.append(clock[0]), 2, 3, start=False)
+
+    timer.start()
+    fire(service, clock, 2.0)
+    fire(service, clock, 5.0)
+    assert calls == [2.0, 5.0]
+
+
+def test_late_wakeup_fires_once():
+    clock = [0.0]
+    service = make_service(clock)
+    calls = []
+    service.add(lambda timer: calls.append(clock[0]), 2, 2)
+
+    fire(service, clock, 2.5)
+    assert calls == [2.5]
+    fire(service, clock, 4.0)
+    assert calls == [2.5, 4.0]
+
+    fire(service, clock, 11.0)
+    assert calls == [2.5, 4.0, 11.0]
+    fire(service, clock, 12.0)
+    assert calls == [2.5, 4.0, 11.0]
+    fire(service, clock, 13.0)
+    assert calls == [2.5, 4.0, 11.0, 13.0]
+
+
+def test_overdue_in_callback():
+    clock = [0.0]
+    service = make_service(clock)
+    calls = []
+    service.add(lambda timer: calls.append(timer.overdue(1)), 2, 2)
+
+    fire(service, clock, 2.5)
+    fire(service, clock, 10.0)
+    fire(service, clock, 12.0)
+    assert calls == [False, True, False]
+
+
+def test_wall_clock_jump_does_not_shift_timers():
+    clock = [0.0]
+    wall = [1000.0]
+    service = make_service(clock, wall)
+    calls = []
+    timer = service.add(lambda timer: calls.append(clock[0]), 5)
+
+    wall[0] = -1000.0
+    assert timer.remaining() == 5
+    fire(service, clock, 5.0)
+    assert calls == [5.0]
+
+
+def test_stop_and_again_from_callback():
+    clock = [0.0]
+    service = make_service(clock)
+    calls = []
+
+    def callback(timer):
+        calls.append(clock[0])
+        if len(calls) == 1:
+            timer.again()
+        else:
+            timer.stop()
+
+    timer = service.add(callback, 1, 3)
+    fire(service, clock, 1.0)
+    assert timer.active and timer.when == 4.0
+    fire(service, clock, 4.0)
+    assert not timer.active
+    fire(service, clock, 7.0)
+    assert calls == [1.0, 4.0]
+    assert len(service) == 0
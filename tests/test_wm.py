@@ -0,0 +1,326 @@
+import pytest
+
+pytest.importorskip('orcsome._xlib')
+
+from orcsome import ev, xlib as X
+from orcsome.wm import WM
+from orcsome.actions import Actions
+from orcsome.fakex import FakeDisplay
+
+
+@pytest.fixture
+def fake():
+    with FakeDisplay() as fake:
+        yield fake
+
+
+@pytest.fixture
+def wm(fake):
+    wm = WM(ev.Loop())
+    wm.mix(Actions)
+    wm.init()
+    yield wm
+    wm.stop(True)
+
+
+def focus_windows(fake, wm, count):
+    windows = fake.create_windows(count)
+    fake.dispatch(wm)
+    for w in windows:
+        fake.focus(w)
+        fake.dispatch(wm)
+    return windows
+
+
+def test_focus_cycle_by_key(fake, wm):
+    a, b, c = focus_windows(fake, wm, 3)
+    wm.on_key('Alt+Tab').focus_cycle()
+
+    fake.press('Alt+Tab', wm=wm)
+    assert fake.keyboard_grab
+    assert fake.active == b
+
+    fake.press('Alt+Tab', wm=wm)
+    assert fake.active == a
+
+
+def test_focus_cycle_outside_key_handler(fake, wm):
+    a, b, c = focus_windows(fake, wm, 3)
+    wm.on_key('Alt+x')(lambda: None)
+    fake.press('Alt+x', wm=wm)
+
+    # stale key event must not start a cycle
+    wm.focus_cycle()
+    fake.dispatch(wm)
+    assert fake.keyboard_grab is None
+    assert fake.active == b
+
+
+def registry_sizes(wm):
+    grabs = wm.grabs
+    return (len(grabs.grabs), len(grabs._pending), len(grabs._keys),
+            len(wm.windows), len(wm.key_handlers), len(wm.key_bindings),
+            len(wm.window_cleanups), len(wm.property_handlers),
+            len(wm.destroy_handlers))
+
+
+def test_window_grabs_dropped_on_destroy(fake, wm):
+    @wm.on_create(cls='Term')
+    def bind():
+        wm.on_key(wm.event_window, 'Ctrl+d').close_window()
+        wm.on_key(wm.event_window, 'Ctrl+x c').close_window()
+
+    fake.dispatch(wm)
+    baseline = registry_sizes(wm)
+
+    for _ in range(5):
+        windows = fake.create_windows(3, cls='Term')
+        fake.dispatch(wm)
+        assert len(wm.grabs.grabs) == baseline[0] + 6
+
+        for w in windows:
+            fake.destroy_window(w)
+        fake.dispatch(wm)
+        assert registry_sizes(wm) == baseline
+
+
+def load_config(wm):
+    def load():
+        wm.on_key('Win+a')(lambda: None)
+
+        @wm.on_create(cls='Term')
+        def bind():
+            @wm.on_timer(60)
+            def runtime_timer():
+                pass
+
+        @wm.on_timer(10)
+        def config_timer():
+            pass
+    return load
+
+
+def test_reload_replaces_only_config_state(fake, wm):
+    assert wm.reload_config(load_config(wm))
+    fake.create_window(cls='Term')
+    fake.dispatch(wm)
+    wm.spawn_or_raise('true', on_create=lambda *args: None, cls='Other')
+    assert len(wm.timers) == 2
+    rules = len(wm.create_handlers)
+
+    for _ in range(3):
+        assert wm.reload_config(load_config(wm))
+
+    assert len(wm.config_timers) == 1
+    assert len(wm.timers) == 2
+    assert len(wm.create_handlers) == rules
+    assert wm.create_spawn_hook in wm.create_handlers
+    assert len(wm.key_bindings[wm.root]) == 1
+
+
+def test_failed_reload_keeps_config(fake, wm):
+    assert wm.reload_config(load_config(wm))
+    state = (list(wm.config_keys), list(wm.config_rules), list(wm.config_timers))
+
+    def broken():
+        load_config(wm)()
+        raise Exception('Boo')
+
+    assert not wm.reload_config(broken)
+    assert (wm.config_keys, wm.config_rules, wm.config_timers) == state
+    assert len(wm.timers) == 1
+    assert len(wm.create_handlers) == 1
+    assert fake.press('Win+a') == 1
+
+
+def test_apply_layout_skips_placed_windows(fake, wm):
+    a, b = fake.create_windows(2)
+    fake.dispatch(wm)
+
+    assert wm.apply_layout('columns') == [a, b]
+    fake.dispatch(wm)
+    assert wm.window(b).geometry == (960, 0, 960, 1080)
+    assert wm.apply_layout('columns') == []
+
+    # same size at other position must be moved back
+    fake.move_resize(a, x=10)
+    fake.dispatch(wm)
+    assert wm.apply_layout('columns') == [a]
+
+
+def test_root_key_dispatch(fake, wm):
+    pressed = []
+    wm.on_key('Win+Return')(lambda: pressed.append(wm.event_window))
+
+    assert fake.press('Win+Return', wm=wm) == 1
+    assert fake.press('Return', wm=wm) == 0
+    assert fake.press('Win+Return', state=X.Mod2Mask, wm=wm) == 1
+    assert pressed == [wm.root, wm.root]
+
+
+def test_chord_dispatch(fake, wm):
+    pressed = []
+    wm.on_key('Win+x t')(lambda: pressed.append('t'))
+    wm.on_key('Win+x Shift+t')(lambda: pressed.append('T'))
+
+    fake.press('Win+x t', wm=wm)
+    fake.press('Win+x Shift+t', wm=wm)
+    assert pressed == ['t', 'T']
+    assert fake.keyboard_grab is None
+
+    # unbound key ends chord
+    fake.press('Win+x q', wm=wm)
+    assert fake.keyboard_grab is None
+    assert fake.press('t', wm=wm) == 0
+    assert pressed == ['t', 'T']
+
+
+def test_window_key_dispatch(fake, wm):
+    @wm.on_create(cls='Term')
+    def bind():
+        wm.on_key(wm.event_window, 'Ctrl+d').close_window()
+
+    term = fake.create_window(cls='Term')
+    other = fake.create_window(cls='Other')
+    fake.dispatch(wm)
+
+    fake.focus(other)
+    assert fake.press('Ctrl+d', wm=wm) == 0
+
+    fake.focus(term)
+    assert fake.press('Ctrl+d', wm=wm) == 1
+    assert term not in fake.windows
+    assert not any(r[0] == term for r in fake.key_grabs)
+
+
+def test_root_grab_wins_over_window_grab(fake, wm):
+    pressed = []
+    term = fake.create_window(cls='Term')
+    fake.dispatch(wm)
+    fake.focus(term)
+
+    wm.on_key(wm.window(term), 'Ctrl+q')(lambda: pressed.append('window'))
+    wm.on_key('Ctrl+q')(lambda: pressed.append('root'))
+    fake.press('Ctrl+q', wm=wm)
+    assert pressed == ['root']
+
+
+def test_on_create_and_on_manage(fake):
+    existing = fake.create_window(cls='Term', notify=False)
+    wm = WM(ev.Loop())
+    wm.mix(Actions)
+
+    created, managed = [], []
+    wm.on_create(cls='Term')(lambda: created.append(wm.event_window))
+    wm.on_manage(cls='Term')(lambda: managed.append(wm.event_window))
+    wm.init()
+    try:
+        assert created == []
+        assert managed == [existing]
+
+        new = fake.create_window(cls='Term')
+        fake.create_window(cls='Other')
+        fake.dispatch(wm)
+        assert created == [new]
+        assert managed == [existing, new]
+    finally:
+        wm.stop(True)
+
+
+def test_property_change_invalidates_cache(fake, wm):
+    w = fake.create_window(cls='Term', name='old')
+    fake.dispatch(wm)
+    window = wm.window(w)
+    assert window.title == 'old'
+
+    changes = []
+    wm.on_property_change(window, '_NET_WM_NAME')(
+        lambda: changes.append(wm.event_window.title))
+
+    trips = fake.round_trips
+    assert window.title == 'old'
+    assert fake.round_trips == trips
+
+    fake.set_property(w, '_NET_WM_NAME', 'new')
+    fake.dispatch(wm)
+    assert changes == ['new']
+    assert window.title == 'new'
+
+
+def configure_notify(fake, window, event, **fields):
+    w = fake.windows[window]
+    values = dict(x=w.x, y=w.y, width=w.width, height=w.height)
+    values.update(fields)
+    fake._event('xconfigure', X.ConfigureNotify, event=event, window=window,
+                **values)
+
+
+def test_stacking_from_configure_notify(fake, wm):
+    a, b, c = fake.create_windows(3)
+    fake.dispatch(wm)
+    assert wm.get_stacked_clients() == [a, b, c]
+
+    round_trips = fake.round_trips
+    configure_notify(fake, a, fake.root, above=c)
+    configure_notify(fake, c, c, above=0)
+    fake.dispatch(wm)
+    assert wm.get_stacked_clients() == [b, c, a]
+
+    configure_notify(fake, c, fake.root, above=0)
+    fake.dispatch(wm)
+    assert wm.get_stacked_clients() == [c, b, a]
+    assert fake.round_trips == round_trips
+
+    # Sibling unknown to client list, stack is refetched
+    configure_notify(fake, b, fake.root, above=0x999)
+    fake.dispatch(wm)
+    assert wm.get_stacked_clients() == [a, b, c]
+    assert fake.round_trips == round_trips + 1
+
+    fake.restack(a, above=False)
+    fake.dispatch(wm)
+    assert wm.get_stacked_clients() == [a, b, c]
+    fake.restack(b)
+    fake.dispatch(wm)
+    assert wm.get_stacked_clients() == [a, c, b]
+
+
+def test_root_position_from_configure_notify(fake, wm):
+    a = fake.create_window(geometry=(10, 20, 300, 200))
+    fake.dispatch(wm)
+    window = wm.window(a)
+    assert window.root_position == (10, 20)
+    assert window.geometry == (10, 20, 300, 200)
+
+    # Synthetic events carry root coordinates of reparented window
+    configure_notify(fake, a, a, x=500, y=40, width=400, send_event=True)
+    fake.dispatch(wm)
+    round_trips = fake.round_trips
+    assert window.root_position == (500, 40)
+    assert window.geometry == (10, 20, 400, 200)
+    assert fake.round_trips == round_trips
+
+    fake.move_resize(a, x=30, y=60)
+    fake.dispatch(wm)
+    assert window.geometry == (30, 60, 300, 200)
+    assert window.root_position == (30, 60)
+    assert fake.round_trips == round_trips
+
+
+def test_apply_layout_of_reparented_windows(fake, wm):
+    a, b = [fake.create_window(frame=(2, 2, 20, 2)) for _ in range(2)]
+    fake.dispatch(wm)
+
+    assert wm.apply_layout('columns') == [a, b]
+    fake.dispatch(wm)
+    window = wm.window(b)
+    assert window.geometry == (2, 20, 960, 1080)
+    assert window.root_position == (962, 20)
+
+    round_trips = fake.round_trips
+    assert wm.apply_layout('columns') == []
+    assert fake.round_trips == round_trips
+
+    fake.move_resize(a, x=10)
+    fake.dispatch(wm)
+    assert wm.apply_layout('columns') == [a]